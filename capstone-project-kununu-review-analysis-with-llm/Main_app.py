@@ -1,15 +1,17 @@
 import streamlit as st
 import os
 import glob
-import json
+import re
 import sys
-import time
-import io
 from datetime import datetime
-from contextlib import redirect_stdout
 
-from scripts.word_cloud_generator import get_wordcloud_image
+sys.path.append('./scripts')
+
+from scripts.word_cloud_generator import get_wordcloud_images
 from scripts.tree_map_generator import get_treemap_figure
+from scripts.results_loader import load_results
+from scripts.reference_resolver import load_review_index_for_result
+from scripts.review_store import load_result_data, load_review_data
 
 st.set_page_config(
     page_title="Kununu Reviews Scraper & LLM Analyzer",
@@ -25,21 +27,41 @@ Master's Program Data Science – FH Kiel
 Capstone Project – Social Media Analytics
 """)
 
-sys.path.append('./scripts')
-
 
 try:
-    from scripts.kununu_scraper import get_all_reviews_for_url, extract_company_name_from_url, generate_filename
-    from scripts.llm_analyzer import (
-        extract_company_name_from_filename,
-        process_individual_prompts,
-        combine_json_responses,
-        get_current_date
+    from scripts.kununu_scraper import (
+        extract_company_name_from_url,
+        generate_filename,
+        FETCH_BACKENDS
+    )
+    from scripts.scrape_output import find_resumable_scrape
+    from scripts.html_parsers import DEFAULT_PARSER_BACKEND, find_installed_backends
+    from scripts.llm_analyzer import DEFAULT_MODEL_NAME
+    from scripts.background_jobs import BackgroundWorker
+    from scripts.review_batching import DEFAULT_BATCH_TOKEN_BUDGET
+    from scripts.review_encoding import DEFAULT_PROMPT_FORMAT, PROMPT_FORMATS, format_token_savings
+    from scripts.llm_scheduler import (
+        DEFAULT_MAX_WORKERS,
+        DEFAULT_REQUESTS_PER_MINUTE,
+        DEFAULT_TOKENS_PER_MINUTE
     )
 except ImportError as e:
     st.error(f"Error importing modules: {e}")
     st.error("Make sure kununu_scraper.py and llm_analyzer.py are in the 'scripts' folder")
 
+@st.cache_resource
+def get_background_worker():
+    # one worker per app server, shared by all sessions
+    return BackgroundWorker()
+
+def get_tracked_job_ids():
+    # kept in the URL, so the jobs of this tab survive a page refresh
+    job_ids = st.query_params.get("jobs", "")
+    return [int(job_id) for job_id in job_ids.split(",") if job_id.isdigit()]
+
+def track_job(job_id):
+    st.query_params["jobs"] = ",".join(str(i) for i in get_tracked_job_ids() + [job_id])
+
 def scraping_section():
     st.header("🔍 Web Scraping")
 
@@ -57,44 +79,65 @@ def scraping_section():
         help="Maximum number of reviews to collect"
     )
     
+    scraping_workers = st.number_input(
+        "Parallel browser workers:",
+        min_value=1,
+        max_value=8,
+        value=1,
+        help="Load several review pages at once; 1 follows the 'Mehr Bewertungen lesen' links page by page"
+    )
+    
+    fetch_backend = st.selectbox(
+        "Page loading:",
+        options=FETCH_BACKENDS,
+        help="'auto' downloads pages without a browser and only starts Chrome for pages that need JavaScript"
+    )
+    
+    parser_backends = find_installed_backends()
+    parser_backend = st.selectbox(
+        "HTML parser:",
+        options=parser_backends,
+        index=parser_backends.index(DEFAULT_PARSER_BACKEND),
+        help="All parsers give the same reviews; the default is the fastest one installed"
+    )
+    
+    resume_scrape = st.checkbox(
+        "Resume interrupted scrape",
+        value=False,
+        help="Continue the last streamed scrape of this company that did not finish"
+    )
+    
     if st.button("Start Scraping", type="primary"):
         if not url_input:
             st.warning("Please enter a valid URL")
             return
 
-        with st.spinner("Scraping reviews... This may take a while. Do not refresh page or switch to the 'Browse reviews' page."):
-            try:
-                data_dir = "./data"
-                os.makedirs(data_dir, exist_ok=True)
-                
-                company_name = extract_company_name_from_url(url_input)
-                filename = generate_filename(company_name)
-                save_path = os.path.join(data_dir, filename)
-                
-                st.info(f"Saving to: {save_path}")
-                
-                f = io.StringIO()
-                with redirect_stdout(f):
-                    result = get_all_reviews_for_url(
-                        url_input,
-                        save_path=save_path,
-                        max_reviews=max_reviews
-                    )
-                
-                output = f.getvalue()
-                if output:
-                    st.text_area("Scraping Messages:", value=output, height=200)
+        try:
+            data_dir = "./data"
+            os.makedirs(data_dir, exist_ok=True)
+            
+            company_name = extract_company_name_from_url(url_input)
+            save_path = find_resumable_scrape(company_name, data_dir) if resume_scrape else None
+            if resume_scrape and save_path is None:
+                st.info("No interrupted scrape found, starting a new one")
+            if save_path is None:
+                save_path = os.path.join(data_dir, generate_filename(company_name))
+            
+            job_id = get_background_worker().submit_scrape(
+                url_input,
+                company_name,
+                save_path,
+                max_reviews=max_reviews,
+                page_workers=scraping_workers,
+                fetch_backend=fetch_backend,
+                parser_backend=parser_backend
+            )
+            track_job(job_id)
+            st.success(f"Scraping started in the background (job {job_id}), saving to: {save_path}")
+            st.info("You can refresh the page or switch pages, the progress is shown under 'Jobs'")
                 
-                if result:
-                    num_reviews = len(list(result.values())[0]) if result else 0
-                    st.success(f"Successfully scraped {num_reviews} reviews!")
-                    st.success(f"File saved to: {save_path}")
-                else:
-                    st.error("No reviews were scraped")
-                    
-            except Exception as e:
-                st.error(f"Error during scraping: {str(e)}")
-                st.error("Make sure you have Chrome browser installed and the URL is valid")
+        except Exception as e:
+            st.error(f"Error starting the scraping job: {str(e)}")
 
 def file_selection_section():
     data_folder = "./data"
@@ -129,15 +172,14 @@ def file_selection_section():
         
         with st.expander("Preview file content"):
             try:
-                with open(selected_file_path, "r", encoding="utf-8") as f:
-                    preview_data = json.load(f)
-                    if isinstance(preview_data, dict):
-                        for url, reviews in preview_data.items():
-                            st.write(f"**URL:** {url}")
-                            st.write(f"**Number of reviews:** {len(reviews) if isinstance(reviews, list) else 'Unknown'}")
-                            if isinstance(reviews, list) and len(reviews) > 0:
-                                st.json(reviews[0])
-                            break
+                preview_data = load_review_data(selected_file_path)
+                if isinstance(preview_data, dict):
+                    for url, reviews in preview_data.items():
+                        st.write(f"**URL:** {url}")
+                        st.write(f"**Number of reviews:** {len(reviews) if isinstance(reviews, list) else 'Unknown'}")
+                        if isinstance(reviews, list) and len(reviews) > 0:
+                            st.json(reviews[0])
+                        break
             except Exception as e:
                 st.error(f"Error reading file: {e}")
     
@@ -198,10 +240,74 @@ def llm_analysis_section():
     with col2:
         model_name = st.text_input(
             "Model Name:",
-            value="gemini-2.5-flash-preview-05-20",
-            help="Enter the model name to use for analysis"
+            value=DEFAULT_MODEL_NAME,
+            help="Gemini model used for the analysis, e.g. a flash model for throughput or a pro model for quality"
         )
     
+    with st.expander("Rate limits"):
+        col3, col4, col5 = st.columns(3)
+        with col3:
+            max_workers = st.number_input(
+                "Parallel requests:",
+                min_value=1,
+                max_value=13,
+                value=DEFAULT_MAX_WORKERS,
+                help="Maximum number of prompts sent to the model at the same time"
+            )
+        with col4:
+            requests_per_minute = st.number_input(
+                "Requests per minute:",
+                min_value=1,
+                value=DEFAULT_REQUESTS_PER_MINUTE,
+                help="Request quota of your API key"
+            )
+        with col5:
+            tokens_per_minute = st.number_input(
+                "Tokens per minute:",
+                min_value=1000,
+                value=DEFAULT_TOKENS_PER_MINUTE,
+                step=10000,
+                help="Input token quota of your API key"
+            )
+        use_cache = st.checkbox(
+            "Reuse cached responses",
+            value=True,
+            help="Skip the model call when the same prompt, model and review file were already analyzed"
+        )
+        prompt_format = st.selectbox(
+            "Review format in prompts:",
+            options=PROMPT_FORMATS,
+            index=PROMPT_FORMATS.index(DEFAULT_PROMPT_FORMAT),
+            help="'compact' sends only the fields the prompts use, 'json' sends the raw scraped reviews"
+        )
+        prefilter = st.checkbox(
+            "Only send matching review sections to each prompt",
+            value=True,
+            help="Each prompt receives its own Kununu subcategory plus the free-text sections instead of the whole review"
+        )
+        use_batches = st.checkbox(
+            "Split large review files into batches",
+            value=False,
+            help="Analyze the reviews in token-limited batches and merge the points afterwards"
+        )
+        batch_token_budget = st.number_input(
+            "Tokens per batch:",
+            min_value=1000,
+            value=DEFAULT_BATCH_TOKEN_BUDGET,
+            step=5000,
+            disabled=not use_batches
+        )
+        semantic_merge = st.checkbox(
+            "Merge similar points of different batches with the LLM",
+            value=False,
+            disabled=not use_batches
+        )
+        stream = st.checkbox(
+            "Stream responses",
+            value=True,
+            help="Show the points while the model is still answering and retry as soon as an answer is clearly not valid JSON"
+        )
+
     st.write("") 
     st.write("") 
     st.write("**Select Analysis Categories:**")
@@ -248,6 +354,12 @@ def llm_analysis_section():
     st.write("") 
     st.write("") 
     selected_file_path = file_selection_section()
+    
+    incremental = st.checkbox(
+        "Only analyze new reviews",
+        value=False,
+        help="Send only reviews that are not part of the latest result of this company and merge the new points into it"
+    )
 
 
     if st.button("Start LLM Analysis", type="primary"):
@@ -267,96 +379,83 @@ def llm_analysis_section():
             return
                 
 
-        with st.spinner("Analyzing the reviews... This will take from several minutes to hours depending on the number of reviews and prompts. Do not refresh page or switch to the 'Browse reviews' page."):
-            run_llm_analysis(selected_file_path, api_key, selected_prompt_numbers)
-        
-def run_llm_analysis(selected_file_path, api_key, selected_prompts):
-    try:
-        with open(selected_file_path, "r", encoding="utf-8") as f:
-            input_data = json.load(f)
-        
-        company_name = extract_company_name_from_filename(selected_file_path)
-        current_date = get_current_date()
-        
-        os.makedirs("./responses", exist_ok=True)
-        os.makedirs("./results", exist_ok=True)
-        
-        total_prompts = len(selected_prompts)
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        message_placeholder = st.empty()
-        all_messages = []
-        
-        for i, prompt_num in enumerate(selected_prompts):
-            status_text.text(f"Processing prompt {prompt_num}... ({i+1}/{total_prompts})")
-            progress_bar.progress(i / total_prompts)
-            
-            f = io.StringIO()
-            with redirect_stdout(f):
-                result = process_individual_prompts(
-                    input_data,
-                    prompt_num,
-                    company_name,
-                    current_date,
-                    api_key
-                )
-            
-            prompt_output = f.getvalue()
-            if prompt_output:
-                all_messages.append(f"=== Prompt {prompt_num} ===\n{prompt_output}")
-            
-            combined_messages = "\n".join(all_messages)
-            message_placeholder.text_area(
-                "LLM Analysis Messages:",
-                value=combined_messages,
-                height=300
-            )
-            
-            progress_bar.progress((i + 1) / total_prompts)
+        try:
+            input_data = load_review_data(selected_file_path)
+            st.info(format_token_savings(input_data, selected_prompt_numbers, prompt_format, prefilter))
             
-            if result is None:
-                st.warning(f"Prompt {prompt_num} failed")
-            
-            if i < len(selected_prompts) - 1:
-                time.sleep(30)
-        
-        status_text.text("Combining responses...")
-        f = io.StringIO()
-        with redirect_stdout(f):
-            combine_json_responses(company_name, current_date, selected_prompts)
-        
-        combine_output = f.getvalue()
-        if combine_output:
-            all_messages.append(f"=== Combining Results ===\n{combine_output}")
-            combined_messages = "\n".join(all_messages)
-            message_placeholder.text_area(
-                "LLM Analysis Messages:",
-                value=combined_messages,
-                height=300
+            job_id = get_background_worker().submit_analysis(
+                selected_file_path,
+                api_key,
+                selected_prompt_numbers,
+                prompt_workers=max_workers,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                use_cache=use_cache,
+                incremental=incremental,
+                batch_token_budget=batch_token_budget if use_batches else None,
+                semantic_merge=semantic_merge and use_batches,
+                prompt_format=prompt_format,
+                prefilter=prefilter,
+                stream=stream,
+                model_name=model_name.strip() or DEFAULT_MODEL_NAME
             )
-        
-        status_text.text("Analysis completed!")
-        progress_bar.progress(1.0)
-        
-        st.success("LLM Analysis completed successfully!")
-        st.info("Results saved to the responses and results folders")
-        
-        results_file = f"./results/result_{company_name}_{current_date}.json"
-        if os.path.exists(results_file):
-            
+            track_job(job_id)
+            st.success(f"Analysis started in the background (job {job_id})")
+            st.info("This takes from several minutes to hours depending on the number of reviews and prompts. "
+                    "You can refresh the page or switch pages, the progress is shown under 'Jobs'")
+        except Exception as e:
+            st.error(f"Error starting the LLM analysis: {str(e)}")
+
+@st.fragment(run_every=3)
+def job_status_section():
+    job_ids = get_tracked_job_ids()
+    if not job_ids:
+        return
+    
+    st.header("⏳ Jobs")
+    worker = get_background_worker()
+    for job_id in reversed(job_ids):
+        jobs = worker.find_job_chain(job_id)
+        if jobs:
+            show_job_status(jobs)
+    
+    if st.button("Clear job list"):
+        del st.query_params["jobs"]
+        st.rerun()
+
+def show_job_status(jobs):
+    first_job, job = jobs[0], jobs[-1]
+    title = "Scraping" if first_job["stage"] == "scrape" else "Analysis"
+    label = f"{title} of {first_job['company']} (job {first_job['id']})"
+    
+    if job["status"] == "failed":
+        st.error(f"{label} failed during {job['stage']}: {job['error']}")
+    elif job["status"] == "pending":
+        if job["error"]:
+            st.warning(f"{label}: {job['stage']} will be retried after an error: {job['error']}")
+        else:
+            st.info(f"{label}: waiting for a free {job['stage']} worker...")
+    elif job["status"] == "running":
+        st.info(f"{label}: {job['stage']} running (attempt {job['attempts']}/{job['max_attempts']})")
+        progress_match = re.match(r"(\d+)/(\d+) prompts", job["progress"] or "")
+        if progress_match:
+            done, total = progress_match.groups()
+            st.progress(int(done) / int(total), text=job["progress"])
+    elif job["stage"] == "scrape":
+        st.success(f"{label}: scraped {job['result']['review_count']} reviews to {job['result']['input_file']}")
+    elif job["stage"] == "combine":
+        results_file = job["result"]["result_file"]
+        st.success(f"{label} completed, results saved to {results_file}")
+        if results_file and os.path.exists(results_file):
             with st.expander("Preview Results"):
                 try:
-                    with open(results_file, "r", encoding="utf-8") as rf:
-                        results_data = json.load(rf)
-                        st.json({"Number of categories analyzed": len(results_data.get("categories", []))})
-                        if results_data.get("categories"):
-                            st.write("**Sample category result:**")
-                            st.json(results_data["categories"][0] if results_data["categories"] else {})
+                    results_data = load_result_data(results_file)
+                    st.json({"Number of categories analyzed": len(results_data.get("categories", []))})
+                    if results_data.get("categories"):
+                        st.write("**Sample category result:**")
+                        st.json(results_data["categories"][0] if results_data["categories"] else {})
                 except Exception as e:
                     st.error(f"Error reading results file: {e}")
-                    
-    except Exception as e:
-        st.error(f"Error during LLM analysis: {str(e)}")
 
 def result_visualization_section():
     st.header("📊 Result Visualizations")
@@ -365,23 +464,32 @@ def result_visualization_section():
         return
 
     if st.button("Start Creating Visualizations", type="primary"):
-        with open(selected_file_path, "r", encoding="utf-8") as f:
-            results_data = json.load(f)
-        categories = results_data.get("categories", [])
-        for i, cat_dict in enumerate(categories):
-            category = list(cat_dict.keys())[0]
+        # parsed once per file version and shared by all charts below
+        results = load_results(selected_file_path)
+        if results is None:
+            st.error("Could not read the results file")
+            return
+        # review_id -> review of the scraped file, for the review snippets in the treemap hover
+        review_index = load_review_index_for_result(selected_file_path, results)
+        with st.spinner("Rendering word clouds..."):
+            wordclouds = get_wordcloud_images(
+                selected_file_path,
+                [(category, ("positive_points", "critical_points")) for category in results.categories],
+                results=results
+            )
+        for i, category in enumerate(results.categories):
             with st.expander(f"{category.replace('_', ' ').title()}", expanded=(i == 0)):
                 col1, col2 = st.columns(2)
                 with col1:
                     st.markdown("**Wordcloud – Positive Points**")
-                    img = get_wordcloud_image(selected_file_path, category, "positive_points")
+                    img = wordclouds.get((category, "positive_points"))
                     if img:
                         st.image(img, use_container_width=True)
                     else:
                         st.info("No wordcloud available.")
                 with col2:
                     st.markdown("**Wordcloud – Critical Points**")
-                    img = get_wordcloud_image(selected_file_path, category, "critical_points")
+                    img = wordclouds.get((category, "critical_points"))
                     if img:
                         st.image(img, use_container_width=True)
                     else:
@@ -393,14 +501,16 @@ def result_visualization_section():
                 col3, col4 = st.columns(2)
                 with col3:
                     st.markdown("**Treemap – Positive Points**")
-                    fig = get_treemap_figure(selected_file_path, category, "positive_points")
+                    fig = get_treemap_figure(selected_file_path, category, "positive_points", results=results,
+                                             review_index=review_index)
                     if fig:
                         st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.info("No treemap available.")
                 with col4:
                     st.markdown("**Treemap – Critical Points**")
-                    fig = get_treemap_figure(selected_file_path, category, "critical_points")
+                    fig = get_treemap_figure(selected_file_path, category, "critical_points", results=results,
+                                             review_index=review_index)
                     if fig:
                         st.plotly_chart(fig, use_container_width=True)
                     else:
@@ -414,6 +524,8 @@ def main():
     st.markdown("---")
     llm_analysis_section()
     st.markdown("---")
+    job_status_section()
+    st.markdown("---")
     result_visualization_section()
 
 if __name__ == "__main__":
@@ -1,7 +1,12 @@
 import streamlit as st
-import json
 import os
 import glob
+import math
+import sys
+
+sys.path.append('./scripts')
+
+from scripts.review_index import load_review_index
 
 st.set_page_config(
     page_title="Browse Scraped Reviews",
@@ -29,32 +34,44 @@ else:
     selected_file = st.selectbox("Select reviews file", file_names)
     data_path = os.path.join(data_folder, selected_file)
 
-    with open(data_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    reviews = []
-    for url, review_list in data.items():
-        reviews.extend(review_list)
+    index = load_review_index(data_path)
 
-    employee_types = sorted({r.get("employee_type") for r in reviews if r.get("employee_type")})
-    selected_type = st.selectbox("Filter by Employee Type", ["All"] + employee_types)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_type = st.selectbox("Filter by Employee Type", ["All"] + index.employee_types)
+    with col2:
+        selected_year = st.selectbox("Filter by Year", ["All"] + index.years)
+    with col3:
+        min_score, max_score = st.slider("Overall score", min_value=1.0, max_value=5.0, value=(1.0, 5.0), step=0.1)
 
+    example_id = index.find_review_id(23) or "company_23"
     review_number = st.number_input(
-    "Search for Review ID (number, e.g. 23 for bosch-gruppe_23, 0 for all)",
+    f"Search for Review ID (number, e.g. 23 for {example_id}, 0 for all)",
     min_value=0,
     step=1,
     value=0
 )
 
-    filtered = [r for r in reviews if (selected_type == "All" or r.get("employee_type") == selected_type)]
+    filtered = index.query(
+        employee_type=None if selected_type == "All" else selected_type,
+        year=None if selected_year == "All" else selected_year,
+        min_score=min_score if min_score > 1.0 else None,
+        max_score=max_score if max_score < 5.0 else None,
+        review_id=index.find_review_id(review_number) if review_number > 0 else None
+    )
 
-    if review_number > 0:
-        review_id_str = f"bosch-gruppe_{review_number}"
-        filtered = [r for r in filtered if r.get("review_id") == review_id_str]
+    col4, col5 = st.columns(2)
+    with col4:
+        page_size = st.selectbox("Reviews per page", [10, 25, 50, 100], index=1)
+    page_count = max(1, math.ceil(len(filtered) / page_size))
+    with col5:
+        page_number = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
 
-    st.write(f"Showing {len(filtered)} reviews.")
+    first = (page_number - 1) * page_size
+    st.write(f"Showing {min(first + 1, len(filtered))}-{min(first + page_size, len(filtered))} of {len(filtered)} reviews.")
 
-    for r in filtered:
+    # only the current page is rendered, the sections of a review go into one markdown block
+    for r in index.page(filtered, page_number, page_size):
         st.markdown(f"**{r.get('title', 'No Title')}**")
         st.caption(
             f"Score: {r.get('overall_score', 'N/A')} | "
@@ -62,8 +79,10 @@ else:
             f"Date: {r.get('year', '')}-{str(r.get('month', '')).zfill(2)} | "
             f"Review ID: {r.get('review_id', '')}"
         )
-        subcats = r.get("subcategories", [])
-        for subcat in subcats:
+        lines = []
+        for subcat in r.get("subcategories", []):
             for cat, text in subcat.items():
-                st.markdown(f"- *{cat}*: {text}")
+                lines.append(f"- *{cat}*: {text}")
+        if lines:
+            st.markdown("\n".join(lines))
         st.markdown("---")
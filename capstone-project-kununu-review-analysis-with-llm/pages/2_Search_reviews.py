@@ -0,0 +1,63 @@
+import streamlit as st
+import sys
+
+sys.path.append('./scripts')
+
+from scripts.search_index import SearchIndex
+
+st.set_page_config(
+    page_title="Search Reviews",
+    layout="wide",
+)
+
+st.title("Search Reviews and Analysis Points")
+
+for _ in range(2):
+    st.sidebar.write("")
+
+st.sidebar.markdown("""
+**by Ngoc My Nguyen**  
+Master's Program Data Science – FH Kiel  
+Capstone Project – Social Media Analytics
+""")
+
+search_index = SearchIndex()
+# only files that are new or changed since the last search are indexed
+added, removed = search_index.update()
+if added or removed:
+    st.info(f"Search index updated: {added} new entries")
+
+query = st.text_input(
+    "Search for:",
+    placeholder="e.g. Homeoffice, ältere Kollegen, Gehalt",
+    help="All words have to occur; words also match longer words (homeoffice finds Homeofficeregelung) "
+         "and spellings without umlauts (aeltere finds ältere)"
+)
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    kind_labels = {"All": None, "Reviews": "review", "Analysis points": "point"}
+    selected_kind = kind_labels[st.selectbox("Search in", list(kind_labels))]
+with col2:
+    companies = search_index.companies()
+    selected_company = st.selectbox("Company", ["All"] + companies)
+with col3:
+    limit = st.selectbox("Maximum results", [20, 50, 100, 200])
+
+if query:
+    hits = search_index.search(query, selected_kind, None if selected_company == "All" else selected_company, limit)
+    st.write(f"Found {len(hits)} results.")
+    for hit in hits:
+        if hit["kind"] == "review":
+            st.caption(f"Review {hit['review_id']} | Company: {hit['company']} | Type: {hit['section'] or ''}")
+            st.markdown(f"**{hit['title']}**\n\n{hit['snippet']}")
+        else:
+            category, subcategory = hit["section"].split("/", 1)
+            st.caption(
+                f"Analysis point | Company: {hit['company']} | {category.replace('_', ' ').title()} – "
+                f"{subcategory.replace('_', ' ').title()} | Mentioned {hit['count']}x"
+            )
+            st.markdown(hit["snippet"])
+            if hit["reference_ids"]:
+                st.caption("Reviews: " + ", ".join(hit["reference_ids"]))
+        st.markdown("---")
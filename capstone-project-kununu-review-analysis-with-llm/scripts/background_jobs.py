@@ -0,0 +1,75 @@
+import threading
+import uuid
+
+from batch_pipeline import PIPELINE_STAGES, create_stage_handlers, run_stage_worker
+from html_parsers import DEFAULT_PARSER_BACKEND
+from job_queue import JobQueue
+from llm_analyzer import extract_company_name_from_filename
+
+DEFAULT_APP_STAGE_WORKERS = {"scrape": 2, "analyze": 2, "combine": 1}
+# not the queue of batch_pipeline.py: app jobs need the API keys held by this process, and the command line
+# pipeline must not run them with its own key or requeue them while the app is still working on them
+APP_QUEUE_PATH = "./cache/app_jobs.sqlite"
+APP_QUEUE_OWNER = "app"
+
+
+class BackgroundWorker:
+    # runs the pipeline stages in daemon threads of the app server; the jobs and their progress live in the queue,
+    # so a page refresh or a second browser tab only has to look them up again
+    def __init__(self, queue=None, stage_workers=None, poll_interval=1, **handler_options):
+        self.queue = queue or JobQueue(APP_QUEUE_PATH, owner=APP_QUEUE_OWNER)
+        # API keys are only kept in memory and never written to the queue file
+        self._api_keys = {}
+        self._lock = threading.Lock()
+        self.handlers = create_stage_handlers(self._get_api_key, **handler_options)
+        self.stop_event = threading.Event()
+
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Picked up {requeued} jobs that were interrupted")
+
+        stage_workers = dict(DEFAULT_APP_STAGE_WORKERS, **(stage_workers or {}))
+        self.threads = []
+        for stage in PIPELINE_STAGES:
+            for i in range(stage_workers[stage]):
+                thread = threading.Thread(target=run_stage_worker, name=f"app-{stage}-{i + 1}", daemon=True,
+                                          args=(self.queue, stage, self.handlers[stage], self.stop_event, poll_interval))
+                thread.start()
+                self.threads.append(thread)
+
+    def _get_api_key(self, job):
+        with self._lock:
+            return self._api_keys.get(job["payload"].get("api_key_ref"))
+
+    def submit_scrape(self, kn_url, company_name, save_path, max_reviews=100, page_workers=1, fetch_backend="auto",
+                      parser_backend=DEFAULT_PARSER_BACKEND):
+        payload = {
+            "kn_url": kn_url,
+            "save_path": save_path,
+            "max_reviews": max_reviews,
+            "page_workers": page_workers,
+            "fetch_backend": fetch_backend,
+            "parser_backend": parser_backend,
+            "last_stage": "scrape",
+        }
+        return self.queue.enqueue("scrape", company_name, payload)
+
+    def submit_analysis(self, input_file, api_key, prompts, **options):
+        api_key_ref = uuid.uuid4().hex
+        with self._lock:
+            self._api_keys[api_key_ref] = api_key
+        payload = dict(options, input_file=input_file, prompts=list(prompts), api_key_ref=api_key_ref)
+        return self.queue.enqueue("analyze", extract_company_name_from_filename(input_file), payload)
+
+    def find_job_chain(self, job_id):
+        # an analysis is finished once the combine job it started is done
+        jobs = [self.queue.get_job(job_id)]
+        while jobs[-1] is not None and jobs[-1]["status"] == "done":
+            follow_up = self.queue.find_follow_up(jobs[-1]["id"])
+            if follow_up is None:
+                break
+            jobs.append(follow_up)
+        return [job for job in jobs if job is not None]
+
+    def stop(self):
+        self.stop_event.set()
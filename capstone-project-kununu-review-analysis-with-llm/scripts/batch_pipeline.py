@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+
+from html_parsers import DEFAULT_PARSER_BACKEND, find_installed_backends
+from job_queue import DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE_PATH, JOB_STATUSES, JobQueue
+from kununu_scraper import (
+    FETCH_BACKENDS,
+    extract_company_name_from_url,
+    generate_filename,
+    get_all_reviews_for_url,
+    get_all_reviews_parallel,
+)
+from llm_analyzer import (
+    DEFAULT_MODEL_NAME,
+    PROMPT_SKIPPED,
+    combine_json_responses,
+    get_analyzer_session,
+    get_current_date,
+    process_prompts_and_generate_responses,
+)
+from llm_scheduler import DEFAULT_MAX_WORKERS, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, LLMRateLimiter
+from response_cache import ResponseCache
+from retry_policy import RetryPolicy
+from review_encoding import DEFAULT_PROMPT_FORMAT
+from review_store import load_review_data
+from incremental_analysis import find_latest_result, prepare_incremental_input
+
+PIPELINE_STAGES = ("scrape", "analyze", "combine")
+NEXT_STAGE = {"scrape": "analyze", "analyze": "combine"}
+DEFAULT_STAGE_WORKERS = {"scrape": 2, "analyze": 1, "combine": 1}
+ALL_PROMPTS = list(range(1, 14))
+
+
+def read_company_urls(urls_file):
+    with open(urls_file, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def submit_companies(queue, urls, max_reviews=100, data_dir="./data", incremental=False,
+                     max_attempts=DEFAULT_MAX_ATTEMPTS):
+    os.makedirs(data_dir, exist_ok=True)
+    job_ids = []
+    for kn_url in urls:
+        company_name = extract_company_name_from_url(kn_url)
+        # the path is fixed at submit time, so a retried scrape resumes its own checkpoint
+        payload = {
+            "kn_url": kn_url,
+            "max_reviews": max_reviews,
+            "save_path": os.path.join(data_dir, generate_filename(company_name)),
+            "incremental": incremental,
+        }
+        job_ids.append(queue.enqueue("scrape", company_name, payload, max_attempts))
+        print(f"Queued {company_name} ({kn_url})")
+    return job_ids
+
+
+class PromptProgress:
+    # finished prompts plus the points of the responses still streaming in; the job row is written at most once a
+    # second, streamed chunks arrive much more often
+    def __init__(self, queue, job_id, total, min_interval=1.0):
+        self.queue = queue
+        self.job_id = job_id
+        self.done = 0
+        self.total = total
+        self.min_interval = min_interval
+        self.streams = {}
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def format(self):
+        progress = f"{self.done}/{self.total} prompts"
+        if self.streams:
+            progress += "; receiving " + ", ".join(
+                f"prompt {label}: {points} points" for label, points in sorted(self.streams.items(), key=str))
+        return progress
+
+    def _write(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._written_at < self.min_interval:
+                return
+            self._written_at = now
+            progress = self.format()
+        self.queue.set_progress(self.job_id, progress)
+
+    def prompt_done(self, done, total):
+        with self._lock:
+            self.done, self.total = done, total
+        self._write(force=True)
+
+    def stream_update(self, label, validator):
+        with self._lock:
+            if validator is None:
+                self.streams.pop(label, None)
+            else:
+                self.streams[label] = validator.points
+        self._write()
+
+
+def create_stage_handlers(api_key, page_workers=4, fetch_backend="auto", requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                          tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, prompt_workers=DEFAULT_MAX_WORKERS,
+                          use_cache=True, model=None, fetcher=None, model_name=DEFAULT_MODEL_NAME,
+                          parser_backend=DEFAULT_PARSER_BACKEND):
+    # one limiter for all analyze workers, the API quota does not grow with the number of companies
+    rate_limiter = LLMRateLimiter(requests_per_minute, tokens_per_minute)
+    # shared as well, so an exhausted quota pauses or stops every company instead of each one finding out on its own
+    retry_policy = RetryPolicy()
+    cache = ResponseCache() if use_cache else None
+    # api_key can also be a function of the job, for keys that must not be stored in the queue
+    get_api_key = api_key if callable(api_key) else lambda job: api_key
+
+    def scrape(job, queue):
+        payload = job["payload"]
+        workers = payload.get("page_workers", page_workers)
+        scrape_fn = get_all_reviews_parallel if workers > 1 else get_all_reviews_for_url
+        options = {"max_workers": workers} if workers > 1 else {}
+        result = scrape_fn(payload["kn_url"], save_path=payload["save_path"], max_reviews=payload["max_reviews"],
+                           fetcher=fetcher, backend=payload.get("fetch_backend", fetch_backend),
+                           parser_backend=payload.get("parser_backend", parser_backend), stream=True, resume=True,
+                           **options)
+        review_count = len(list(result.values())[0]) if result else 0
+        if not review_count:
+            raise RuntimeError("No reviews were scraped")
+        return {"input_file": payload["save_path"], "review_count": review_count}
+
+    def analyze(job, queue):
+        payload = job["payload"]
+        job_api_key = get_api_key(job)
+        if not job_api_key and model is None:
+            raise RuntimeError("No API key available for this job, please submit it again")
+        input_data = load_review_data(payload["input_file"])
+
+        previous_result = None
+        if payload.get("incremental"):
+            previous_result = find_latest_result(job["company"])
+            if previous_result:
+                input_data, _ = prepare_incremental_input(input_data, previous_result)
+                if not any(input_data.values()):
+                    print(f"[{job['company']}] No new reviews to analyze")
+                    return {"current_date": None, "previous_result": previous_result}
+
+        job_rate_limiter = rate_limiter
+        if "requests_per_minute" in payload or "tokens_per_minute" in payload:
+            job_rate_limiter = LLMRateLimiter(payload.get("requests_per_minute", requests_per_minute),
+                                              payload.get("tokens_per_minute", tokens_per_minute))
+        # sessions are shared by all jobs with the same key and model, so the client is only set up once
+        session = get_analyzer_session(job_api_key, payload.get("model_name", model_name), model)
+        current_date = get_current_date()
+        prompt_numbers = payload.get("prompts", ALL_PROMPTS)
+        progress = PromptProgress(queue, job["id"], len(prompt_numbers))
+        results = process_prompts_and_generate_responses(
+            input_data, job["company"], current_date, job_api_key, session=session,
+            cache=cache if payload.get("use_cache", True) else None,
+            max_workers=payload.get("prompt_workers", prompt_workers), rate_limiter=job_rate_limiter,
+            batch_token_budget=payload.get("batch_token_budget"), semantic_merge=payload.get("semantic_merge", False),
+            prompt_format=payload.get("prompt_format", DEFAULT_PROMPT_FORMAT), prefilter=payload.get("prefilter", True),
+            prompt_numbers=prompt_numbers, progress_callback=progress.prompt_done, retry_policy=retry_policy,
+            stream=payload.get("stream", False), stream_callback=progress.stream_update,
+        )
+        failed = [prompt_number for prompt_number, result in results.items() if result is None]
+        skipped = [prompt_number for prompt_number, result in results.items() if result is PROMPT_SKIPPED]
+        if skipped:
+            print(f"[{job['company']}] No matching reviews for prompts {', '.join(map(str, sorted(skipped)))}")
+        # skipped prompts are not an error, but a job where every other prompt failed has nothing to combine
+        if failed and len(failed) + len(skipped) == len(results):
+            raise RuntimeError("No prompt returned a response")
+        return {"current_date": current_date, "previous_result": previous_result}
+
+    def combine(job, queue):
+        payload = job["payload"]
+        if payload["current_date"] is None:
+            return {"result_file": payload["previous_result"]}
+
+        previous_categories = None
+        if payload.get("previous_result"):
+            input_data = load_review_data(payload["input_file"])
+            _, previous_categories = prepare_incremental_input(input_data, payload["previous_result"])
+        result_file = combine_json_responses(job["company"], payload["current_date"], payload.get("prompts", ALL_PROMPTS),
+                                             source_file=payload["input_file"], previous_categories=previous_categories)
+        return {"result_file": result_file}
+
+    return {"scrape": scrape, "analyze": analyze, "combine": combine}
+
+
+def run_stage_worker(queue, stage, handler, stop_event, poll_interval=2):
+    while not stop_event.is_set():
+        job = queue.claim(stage)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        label = f"[{stage}:{job['company']}]"
+        print(f"{label} Starting attempt {job['attempts']}/{job['max_attempts']}")
+        try:
+            result = handler(job, queue)
+        except Exception as e:
+            if queue.fail(job["id"], e):
+                print(f"{label} Failed, will retry: {e}")
+            else:
+                print(f"{label} Failed permanently: {e}")
+            continue
+
+        # jobs can stop early, e.g. a scrape started from the app is not analyzed automatically
+        next_stage = NEXT_STAGE.get(stage) if job["payload"].get("last_stage") != stage else None
+        next_job = None
+        if next_stage:
+            next_job = (next_stage, job["company"], dict(job["payload"], **result), job["max_attempts"])
+        queue.complete(job["id"], result, next_job)
+        print(f"{label} Done")
+
+
+def format_status(queue):
+    counts = queue.count_by_status()
+    lines = []
+    for stage in PIPELINE_STAGES:
+        stage_counts = counts.get(stage, {status: 0 for status in JOB_STATUSES})
+        lines.append(f"{stage:>8}: " + ", ".join(f"{stage_counts[status]} {status}" for status in JOB_STATUSES))
+    for job in queue.list_jobs(status="running"):
+        progress = f" ({job['progress']})" if job["progress"] else ""
+        lines.append(f"  running: {job['stage']} {job['company']}{progress}")
+    for job in queue.list_jobs(status="failed"):
+        lines.append(f"  failed: {job['stage']} {job['company']}: {job['error']}")
+    return "\n".join(lines)
+
+
+def run_pipeline(queue, handlers, stage_workers=None, poll_interval=2, status_interval=30):
+    stage_workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+    requeued = queue.requeue_running()
+    if requeued:
+        print(f"Picked up {requeued} jobs that were interrupted")
+
+    # every stage has its own workers, so company B is scraped while company A is analyzed
+    stop_event = threading.Event()
+    threads = []
+    for stage in PIPELINE_STAGES:
+        for i in range(stage_workers[stage]):
+            thread = threading.Thread(target=run_stage_worker, name=f"{stage}-{i + 1}", daemon=True,
+                                      args=(queue, stage, handlers[stage], stop_event, poll_interval))
+            thread.start()
+            threads.append(thread)
+
+    last_status = time.time()
+    try:
+        while queue.has_open_jobs():
+            time.sleep(poll_interval)
+            if time.time() - last_status >= status_interval:
+                print(format_status(queue))
+                last_status = time.time()
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    print(format_status(queue))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scrape and analyze several companies through a persistent job queue")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="SQLite file that holds the jobs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="queue one scrape job per Kununu URL")
+    submit_parser.add_argument("urls_file", help="text file with one Kununu review URL per line")
+    submit_parser.add_argument("--max-reviews", type=int, default=100)
+    submit_parser.add_argument("--incremental", action="store_true",
+                               help="only analyze reviews missing from the latest result of each company")
+    submit_parser.add_argument("--retries", type=int, default=DEFAULT_MAX_ATTEMPTS - 1,
+                               help="how often a failed stage is retried")
+
+    run_parser = subparsers.add_parser("run", help="work through the queued jobs")
+    run_parser.add_argument("api_key")
+    run_parser.add_argument("--scrape-workers", type=int, default=DEFAULT_STAGE_WORKERS["scrape"],
+                            help="companies scraped at the same time")
+    run_parser.add_argument("--analyze-workers", type=int, default=DEFAULT_STAGE_WORKERS["analyze"],
+                            help="companies analyzed at the same time (they share the rate limits)")
+    run_parser.add_argument("--page-workers", type=int, default=4, help="pages loaded in parallel per company")
+    run_parser.add_argument("--fetch-backend", choices=FETCH_BACKENDS, default="auto", help="how review pages are loaded")
+    run_parser.add_argument("--parser-backend", choices=find_installed_backends(), default=DEFAULT_PARSER_BACKEND,
+                            help="HTML parser for the review pages (default: the fastest one installed)")
+    run_parser.add_argument("--prompt-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                            help="prompts sent in parallel per company")
+    run_parser.add_argument("--requests-per-minute", type=int, default=DEFAULT_REQUESTS_PER_MINUTE)
+    run_parser.add_argument("--tokens-per-minute", type=int, default=DEFAULT_TOKENS_PER_MINUTE)
+    run_parser.add_argument("--no-cache", action="store_true", help="always call the model, ignore ./cache/responses")
+    run_parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Gemini model used for the analysis")
+
+    subparsers.add_parser("status", help="show how many jobs are in each stage")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue, owner="pipeline")
+    if args.command == "submit":
+        submit_companies(queue, read_company_urls(args.urls_file), args.max_reviews, incremental=args.incremental,
+                         max_attempts=args.retries + 1)
+    elif args.command == "run":
+        handlers = create_stage_handlers(args.api_key, page_workers=args.page_workers,
+                                         fetch_backend=args.fetch_backend, parser_backend=args.parser_backend,
+                                         requests_per_minute=args.requests_per_minute,
+                                         tokens_per_minute=args.tokens_per_minute,
+                                         prompt_workers=args.prompt_workers, use_cache=not args.no_cache,
+                                         model_name=args.model)
+        run_pipeline(queue, handlers, {"scrape": args.scrape_workers, "analyze": args.analyze_workers})
+    else:
+        print(format_status(queue))
@@ -0,0 +1,65 @@
+import glob
+import importlib.util
+import os
+import sys
+import time
+
+from html_parsers import PARSER_BACKENDS
+from kununu_scraper import get_parser, parse_review_block
+
+
+def load_pages(paths):
+    html_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            html_files.extend(sorted(glob.glob(os.path.join(path, "*.html"))))
+        else:
+            html_files.append(path)
+    pages = []
+    for html_file in html_files:
+        with open(html_file, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def parse_pages(pages, parser):
+    reviews = []
+    for page_source in pages:
+        soup = parser.parse(page_source)
+        for block in parser.select(soup, "review_block"):
+            reviews.append(parse_review_block(block, "https://www.kununu.com/de/benchmark/kommentare", len(reviews) + 1,
+                                              "benchmark", parser))
+    return reviews
+
+
+def benchmark(pages, repeat=5):
+    baseline = None
+    for backend in PARSER_BACKENDS:
+        if backend != "html.parser" and not importlib.util.find_spec(backend):
+            print(f"{backend:>12}: not installed")
+            continue
+        parser = get_parser(backend)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            reviews = parse_pages(pages, parser)
+        elapsed = (time.perf_counter() - start) / repeat
+
+        if baseline is None:
+            baseline = reviews
+        matches = "identical output" if reviews == baseline else "OUTPUT DIFFERS"
+        per_page = elapsed / len(pages) * 1000 if pages else 0
+        print(f"{backend:>12}: {elapsed * 1000:8.1f} ms for {len(pages)} pages ({per_page:.2f} ms/page, "
+              f"{len(reviews) / elapsed if elapsed else 0:,.0f} reviews/s) - {matches}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python benchmark_parsers.py <saved page .html files or folders> [repeat]")
+        sys.exit(1)
+    args = sys.argv[1:]
+    repeat = int(args.pop()) if len(args) > 1 and args[-1].isdigit() else 5
+    pages = load_pages(args)
+    if not pages:
+        print("No HTML pages found")
+        sys.exit(1)
+    benchmark(pages, repeat)
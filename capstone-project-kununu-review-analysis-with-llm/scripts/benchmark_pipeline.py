@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import glob
+import io
+import os
+import tempfile
+import time
+
+from fake_model import ReplayGenerativeModel
+from llm_analyzer import (
+    PROMPT_SKIPPED,
+    AnalyzerSession,
+    combine_json_responses,
+    extract_company_name_from_filename,
+    get_current_date,
+    process_prompts_and_generate_responses,
+)
+from llm_scheduler import DEFAULT_MAX_WORKERS
+from result_merger import POINT_LISTS
+from retry_policy import DEFAULT_BASE_DELAY, DEFAULT_MAX_ATTEMPTS, RetryPolicy
+from review_encoding import DEFAULT_PROMPT_FORMAT, PROMPT_FORMATS
+from review_store import load_review_data
+
+PROMPT_NUMBERS = range(1, 14)
+# the benchmark measures the pipeline, not the API limits, unless they are given
+BENCHMARK_REQUESTS_PER_MINUTE = 100000
+BENCHMARK_TOKENS_PER_MINUTE = 10 ** 9
+
+
+def find_data_files(data_dir="./data", companies=None):
+    # company -> its latest scrape
+    data_files = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.json")), key=os.path.getmtime):
+        company = extract_company_name_from_filename(path)
+        if not companies or company in companies:
+            data_files[company] = os.path.abspath(path)
+    return data_files
+
+
+def count_points(results):
+    points = 0
+    for response_data in results.values():
+        if not isinstance(response_data, dict):
+            continue
+        category_data = next(iter(response_data["response"].values()))
+        points += sum(len(category_data.get(points_key) or []) for points_key in POINT_LISTS)
+    return points
+
+
+def run_company(company, data_path, responses_dir, max_workers, model_options, retry_options, requests_per_minute,
+                tokens_per_minute, batch_token_budget=None, prompt_format=DEFAULT_PROMPT_FORMAT, stream=False):
+    input_data = load_review_data(data_path)
+    model = ReplayGenerativeModel(responses_dir, company, **model_options)
+    session = AnalyzerSession(model=model)
+    retry_policy = RetryPolicy(**retry_options)
+    current_date = get_current_date()
+
+    start = time.perf_counter()
+    results = process_prompts_and_generate_responses(
+        input_data, company, current_date, None, max_workers=max_workers, requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute, batch_token_budget=batch_token_budget, prompt_format=prompt_format,
+        retry_policy=retry_policy, stream=stream, session=session, prompt_numbers=PROMPT_NUMBERS,
+    )
+    combine_json_responses(company, current_date, PROMPT_NUMBERS, source_file=data_path)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed": elapsed,
+        "requests": model.calls,
+        "errors": model.errors,
+        "truncations": model.truncations,
+        "prompts": sum(1 for result in results.values() if isinstance(result, dict)),
+        "skipped": sum(1 for result in results.values() if result is PROMPT_SKIPPED),
+        "points": count_points(results),
+    }
+
+
+def benchmark(data_files, responses_dir, workers, model_options, retry_options, requests_per_minute=BENCHMARK_REQUESTS_PER_MINUTE,
+              tokens_per_minute=BENCHMARK_TOKENS_PER_MINUTE, batch_token_budget=None, prompt_format=DEFAULT_PROMPT_FORMAT,
+              stream=False, verbose=False):
+    # the pipeline writes to ./responses, ./results and ./cache, so it runs in a scratch directory next to the prompts
+    project_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_pipeline_") as work_dir:
+        os.symlink(os.path.join(project_dir, "prompts"), os.path.join(work_dir, "prompts"))
+        os.chdir(work_dir)
+        try:
+            for max_workers in workers:
+                for company, data_path in data_files.items():
+                    with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO()):
+                        stats = run_company(company, data_path, responses_dir, max_workers, model_options, retry_options,
+                                            requests_per_minute, tokens_per_minute, batch_token_budget, prompt_format,
+                                            stream)
+                    elapsed = stats["elapsed"]
+                    print(f"{company:>14} | {max_workers:>2} workers: {elapsed:7.2f} s wall, {stats['requests']:>3} requests "
+                          f"({stats['requests'] / elapsed if elapsed else 0:5.2f}/s), {stats['errors']} errors, "
+                          f"{stats['truncations']} truncated, {stats['prompts']}/{len(PROMPT_NUMBERS)} prompts "
+                          f"({stats['skipped']} skipped), "
+                          f"{stats['points']} points")
+        finally:
+            os.chdir(project_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="python scripts/benchmark_pipeline.py [companies ...] [options]",
+        description="Run the analysis end to end against recorded responses instead of the Gemini API",
+    )
+    parser.add_argument("companies", nargs="*", help="companies of ./data to analyze (default: all)")
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--responses-dir", default="./responses", help="recorded responses that are replayed")
+    parser.add_argument("--workers", default=str(DEFAULT_MAX_WORKERS),
+                        help="parallel requests, a comma separated list compares several (e.g. 1,4,8)")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="share of requests failing with 429")
+    parser.add_argument("--truncation-rate", type=float, default=0.0,
+                        help="share of responses cut off with finish reason MAX_TOKENS")
+    parser.add_argument("--quota-retry-after", type=float, default=1.0, help="retry delay named in the 429 errors")
+    parser.add_argument("--seed", type=int, default=None, help="makes the injected errors repeatable")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--retry-delay", type=float, default=DEFAULT_BASE_DELAY, help="base delay of the retry backoff")
+    parser.add_argument("--requests-per-minute", type=int, default=BENCHMARK_REQUESTS_PER_MINUTE)
+    parser.add_argument("--tokens-per-minute", type=int, default=BENCHMARK_TOKENS_PER_MINUTE)
+    parser.add_argument("--batch-tokens", type=int, default=None)
+    parser.add_argument("--prompt-format", choices=PROMPT_FORMATS, default=DEFAULT_PROMPT_FORMAT)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the pipeline")
+    args = parser.parse_args()
+
+    data_files = find_data_files(args.data_dir, args.companies)
+    if not data_files:
+        print(f"No review files found in {args.data_dir}")
+        raise SystemExit(1)
+
+    model_options = {
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "quota_error_rate": args.quota_error_rate,
+        "truncation_rate": args.truncation_rate,
+        "quota_retry_after": args.quota_retry_after,
+        "seed": args.seed,
+    }
+    retry_options = {"max_attempts": args.max_attempts, "base_delay": args.retry_delay}
+    benchmark(data_files, os.path.abspath(args.responses_dir), [int(w) for w in args.workers.split(",")], model_options,
+              retry_options, args.requests_per_minute, args.tokens_per_minute, args.batch_tokens, args.prompt_format,
+              args.stream, args.verbose)
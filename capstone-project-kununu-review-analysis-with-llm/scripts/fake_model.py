@@ -0,0 +1,165 @@
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+FINISH_REASON_STOP = 1
+FINISH_REASON_MAX_TOKENS = 2
+FINISH_REASON_SAFETY = 3
+
+
+class FakeCandidate:
+    def __init__(self, finish_reason=FINISH_REASON_STOP):
+        self.finish_reason = finish_reason
+
+
+class FakeResponse:
+    def __init__(self, text, finish_reason=FINISH_REASON_STOP):
+        self.text = text
+        self.candidates = [FakeCandidate(finish_reason)]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamResponse:
+    # like the response of generate_content(stream=True): chunks while iterating, text and candidates afterwards
+    def __init__(self, text, finish_reason=FINISH_REASON_STOP, chunk_chars=200, latency=0.0):
+        self.text = text
+        self.candidates = [FakeCandidate(finish_reason)]
+        self.chunk_chars = chunk_chars
+        self.latency = latency
+
+    def __iter__(self):
+        chunks = [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)] or [""]
+        for chunk in chunks:
+            time.sleep(self.latency / len(chunks))
+            yield FakeChunk(chunk)
+
+
+def get_prompt_category(prompt, generation_config=None):
+    # the schema of a structured output request names the category, else the example in the prompt does
+    schema = generation_config.get("response_schema") if isinstance(generation_config, dict) else None
+    if isinstance(schema, dict) and schema.get("required"):
+        return schema["required"][0]
+    category_match = re.search(r'## Gewünschte JSON-Struktur\s*"(\w+)"', prompt)
+    return category_match.group(1) if category_match else None
+
+
+def build_fake_response_text(prompt):
+    category = get_prompt_category(prompt) or "sonstiges"
+    review_ids = re.findall(r'"(?:review_id|id)":\s*"([^"]+)"', prompt) or ["unknown_1"]
+
+    def references(ids):
+        return [{"review_id": review_id, "employee_type": "Angestellte/r oder Arbeiter/in", "field": "Not specified"} for review_id in ids]
+
+    half = max(1, len(review_ids) // 2)
+    data = {
+        category: {
+            "positive_points": [
+                {"point": "Freundliche und angenehme Kollegen", "count": half, "references": references(review_ids[:half])}
+            ],
+            "critical_points": [
+                {"point": "Hoher Zeitdruck im Arbeitsalltag", "count": len(review_ids) - half or 1, "references": references(review_ids[half:] or review_ids[:1])}
+            ]
+        }
+    }
+    return "```json\n" + json.dumps(data, ensure_ascii=False, indent=2) + "\n```"
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name="fake-model", latency=0.5, response_fn=build_fake_response_text, max_prompt_chars=None,
+                 stream_chunk_chars=200):
+        self.model_name = model_name
+        self.latency = latency
+        self.response_fn = response_fn
+        self.stream_chunk_chars = stream_chunk_chars
+        # prompts longer than this are answered with a truncated MAX_TOKENS response
+        self.max_prompt_chars = max_prompt_chars
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        response_text = self.response_fn(prompt)
+        finish_reason = FINISH_REASON_STOP
+        if self.max_prompt_chars and len(prompt) > self.max_prompt_chars:
+            response_text, finish_reason = response_text[:len(response_text) // 2], FINISH_REASON_MAX_TOKENS
+        return self.build_response(response_text, finish_reason, stream)
+
+    def build_response(self, response_text, finish_reason=FINISH_REASON_STOP, stream=False):
+        if stream:
+            # the latency is spread over the chunks, like tokens arriving from the API
+            return FakeStreamResponse(response_text, finish_reason, self.stream_chunk_chars, self.latency)
+        time.sleep(self.latency)
+        return FakeResponse(response_text, finish_reason)
+
+
+def load_recorded_responses(responses_dir="./responses", company=None):
+    # category -> recorded response; the latest run of the company wins, runs of other companies fill the gaps
+    def is_company_run(path):
+        return bool(company) and re.fullmatch(rf"response_{re.escape(company)}_\d{{8}}_\d{{6}}", os.path.basename(path)) is not None
+
+    runs = sorted(glob.glob(os.path.join(responses_dir, "response_*")), key=lambda path: (is_company_run(path), os.path.basename(path)))
+    recorded = {}
+    for run in runs:
+        for path in sorted(glob.glob(os.path.join(run, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            response = data.get("response", data) if isinstance(data, dict) else None
+            if isinstance(response, dict) and len(response) == 1 and isinstance(next(iter(response.values())), dict):
+                recorded[next(iter(response))] = response
+    return recorded
+
+
+class ReplayGenerativeModel(FakeGenerativeModel):
+    # answers with the recorded responses of ./responses, with injected latency, API errors and truncated responses
+    def __init__(self, responses_dir="./responses", company=None, latency=0.5, error_rate=0.0, quota_error_rate=0.0,
+                 truncation_rate=0.0, quota_retry_after=1.0, seed=None, stream_chunk_chars=200, model_name="replay-model"):
+        super().__init__(model_name, latency, build_fake_response_text, stream_chunk_chars=stream_chunk_chars)
+        self.recorded = load_recorded_responses(responses_dir, company)
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.truncation_rate = truncation_rate
+        self.quota_retry_after = quota_retry_after
+        self.errors = 0
+        self.truncations = 0
+        self._random = random.Random(seed)
+
+    def build_response_text(self, prompt, generation_config=None):
+        category = get_prompt_category(prompt, generation_config)
+        if category not in self.recorded:
+            return build_fake_response_text(prompt)
+        response_text = json.dumps(self.recorded[category], ensure_ascii=False, indent=2)
+        if isinstance(generation_config, dict) and generation_config.get("response_mime_type") == "application/json":
+            return response_text
+        return "```json\n" + response_text + "\n```"
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            failed = roll < self.error_rate + self.quota_error_rate
+            truncated = not failed and roll < self.error_rate + self.quota_error_rate + self.truncation_rate
+            self.errors += failed
+            self.truncations += truncated
+        if roll < self.quota_error_rate:
+            # worded like the API, so the retry policy finds the delay in the message
+            raise ResourceExhausted(f"Quota exceeded for the replay model. Please retry in {self.quota_retry_after}s")
+        if failed:
+            raise ServiceUnavailable("The replay model is overloaded. Please try again later.")
+        response_text = self.build_response_text(prompt, generation_config)
+        if truncated:
+            return self.build_response(response_text[:len(response_text) // 2], FINISH_REASON_MAX_TOKENS, stream)
+        return self.build_response(response_text, FINISH_REASON_STOP, stream)
@@ -0,0 +1,73 @@
+import importlib.util
+
+import soupsieve
+from bs4 import BeautifulSoup
+
+PARSER_BACKENDS = ("html.parser", "lxml", "selectolax")
+
+
+def find_installed_backends():
+    # html.parser comes with Python, the others are optional packages
+    return [backend for backend in PARSER_BACKENDS if backend == "html.parser" or importlib.util.find_spec(backend)]
+
+
+def find_default_backend():
+    for backend in ("selectolax", "lxml"):
+        if backend in find_installed_backends():
+            return backend
+    return "html.parser"
+
+
+DEFAULT_PARSER_BACKEND = find_default_backend()
+
+
+class SoupParser:
+    def __init__(self, selectors, features="html.parser"):
+        self.features = features
+        # compiled once instead of on every select_one call
+        self.selectors = {name: soupsieve.compile(css) for name, css in selectors.items()}
+
+    def parse(self, page_source):
+        return BeautifulSoup(page_source, self.features)
+
+    def select(self, node, name):
+        return self.selectors[name].select(node)
+
+    def select_one(self, node, name):
+        return self.selectors[name].select_one(node)
+
+    def text(self, node):
+        return node.text
+
+    def attr(self, node, name):
+        return node.get(name)
+
+
+class SelectolaxParser:
+    def __init__(self, selectors):
+        from selectolax.lexbor import LexborHTMLParser
+        self._html_parser = LexborHTMLParser
+        self.selectors = dict(selectors)
+
+    def parse(self, page_source):
+        return self._html_parser(page_source)
+
+    def select(self, node, name):
+        return node.css(self.selectors[name])
+
+    def select_one(self, node, name):
+        return node.css_first(self.selectors[name])
+
+    def text(self, node):
+        return node.text()
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+
+def create_parser(selectors, backend=DEFAULT_PARSER_BACKEND):
+    if backend == "selectolax":
+        return SelectolaxParser(selectors)
+    if backend in ("lxml", "html.parser"):
+        return SoupParser(selectors, backend)
+    raise ValueError(f"Unknown parser backend: {backend} (choose from {', '.join(PARSER_BACKENDS)})")
@@ -0,0 +1,106 @@
+import glob
+import hashlib
+import json
+import os
+import re
+
+from result_merger import collect_referenced_review_ids, remap_references
+from review_store import load_result_data, load_review_data
+
+TIMESTAMP_PATTERN = re.compile(r'_(\d{8}_\d{6})\.json$')
+
+
+def extract_timestamp_from_filename(filename):
+    match = TIMESTAMP_PATTERN.search(os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+def review_fingerprint(review):
+    # review_ids are renumbered on every scrape, so reviews are matched by their content instead
+    content = {
+        "title": review.get("title"),
+        "year": review.get("year"),
+        "month": review.get("month"),
+        "overall_score": review.get("overall_score"),
+        "employee_type": review.get("employee_type"),
+        "subcategories": review.get("subcategories"),
+    }
+    serialized = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+def iter_reviews(input_data):
+    for reviews in input_data.values():
+        for review in reviews:
+            yield review
+
+
+def find_latest_result(company_name, results_dir="./results"):
+    result_files = [
+        path for path in glob.glob(os.path.join(results_dir, f"result_{company_name}_*.json"))
+        if re.fullmatch(rf"result_{re.escape(company_name)}_\d{{8}}_\d{{6}}\.json", os.path.basename(path))
+    ]
+    if not result_files:
+        return None
+    return max(result_files, key=extract_timestamp_from_filename)
+
+
+def find_source_data_file(result_path, result_data=None, data_dir="./data"):
+    if result_data and result_data.get("source_file"):
+        source_path = os.path.join(data_dir, os.path.basename(result_data["source_file"]))
+        if os.path.exists(source_path):
+            return source_path
+
+    # older results do not record their input; use the newest scrape that existed when the result was written
+    match = re.fullmatch(r"result_(.+)_(\d{8}_\d{6})\.json", os.path.basename(result_path))
+    if not match:
+        return None
+    company_name, result_timestamp = match.groups()
+    candidates = [
+        path for path in glob.glob(os.path.join(data_dir, f"scraped_reviews_{company_name}_*.json"))
+        if re.fullmatch(rf"scraped_reviews_{re.escape(company_name)}_\d{{8}}_\d{{6}}\.json", os.path.basename(path))
+        and extract_timestamp_from_filename(path) <= result_timestamp
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=extract_timestamp_from_filename)
+
+
+def select_new_reviews(input_data, analyzed_fingerprints):
+    new_data = {}
+    for url, reviews in input_data.items():
+        new_data[url] = [review for review in reviews if review_fingerprint(review) not in analyzed_fingerprints]
+    return new_data
+
+
+def prepare_incremental_input(input_data, previous_result_path, data_dir="./data"):
+    previous_result = load_result_data(previous_result_path)
+    previous_categories = previous_result.get("categories", [])
+
+    source_path = find_source_data_file(previous_result_path, previous_result, data_dir)
+    if source_path:
+        print(f"Previous analysis: {os.path.basename(previous_result_path)} (input: {os.path.basename(source_path)})")
+        previous_data = load_review_data(source_path)
+
+        current_ids = {review_fingerprint(review): review["review_id"] for review in iter_reviews(input_data)}
+        id_map = {}
+        for review in iter_reviews(previous_data):
+            fingerprint = review_fingerprint(review)
+            if fingerprint in current_ids:
+                id_map[review["review_id"]] = current_ids[fingerprint]
+        analyzed_fingerprints = {review_fingerprint(review) for review in iter_reviews(previous_data)}
+        new_data = select_new_reviews(input_data, analyzed_fingerprints)
+        # references to reviews that are no longer part of the scrape would clash with the new numbering
+        remap_references(previous_categories, id_map, drop_unmapped=True)
+    else:
+        print(f"Previous analysis: {os.path.basename(previous_result_path)} (input file not found, matching by review_id)")
+        seen_ids = collect_referenced_review_ids(previous_categories)
+        new_data = {
+            url: [review for review in reviews if review.get("review_id") not in seen_ids]
+            for url, reviews in input_data.items()
+        }
+
+    total_reviews = sum(len(reviews) for reviews in input_data.values())
+    new_reviews = sum(len(reviews) for reviews in new_data.values())
+    print(f"{new_reviews} of {total_reviews} reviews have not been analyzed yet")
+    return new_data, previous_categories
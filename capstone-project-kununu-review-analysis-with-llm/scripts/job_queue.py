@@ -0,0 +1,192 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+DEFAULT_QUEUE_PATH = "./cache/jobs.sqlite"
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 30
+JOB_STATUSES = ("pending", "running", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER,
+    company TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress TEXT,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_stage_status ON jobs (stage, status, available_at);
+"""
+ADDED_COLUMNS = {"parent_id": "INTEGER", "owner": "TEXT"}
+
+
+def row_to_job(row):
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    # every call opens its own connection, so worker threads can share one JobQueue;
+    # owner names the kind of process working on the queue, e.g. the app server or the command line pipeline
+    def __init__(self, path=DEFAULT_QUEUE_PATH, retry_delay=DEFAULT_RETRY_DELAY, owner=None):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.owner = owner
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # queue files created by older versions get the newer columns
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_parent ON jobs (parent_id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, stage, company, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (company, stage, payload, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (company, stage, json.dumps(payload), max_attempts, now + delay, now, now),
+            )
+            return cursor.lastrowid
+
+    def claim(self, stage):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE stage = ? AND status = 'pending' AND available_at <= ? "
+                "ORDER BY available_at, id LIMIT 1",
+                (stage, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, updated_at = ? WHERE id = ?",
+                (self.owner, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        job = row_to_job(row)
+        job["status"] = "running"
+        job["attempts"] += 1
+        job["owner"] = self.owner
+        return job
+
+    def complete(self, job_id, result=None, next_job=None):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # the follow-up job is added in the same transaction, so the queue never looks empty in between
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), now, job_id),
+            )
+            if next_job is not None:
+                stage, company, payload, max_attempts = next_job
+                conn.execute(
+                    "INSERT INTO jobs (parent_id, company, stage, payload, max_attempts, available_at, created_at, "
+                    "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, company, stage, json.dumps(payload), max_attempts, now, now, now),
+                )
+            conn.execute("COMMIT")
+
+    def set_progress(self, job_id, progress):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?", (progress, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row["attempts"] < row["max_attempts"]:
+                # back off a little more after every failed attempt
+                retry_at = now + self.retry_delay * 2 ** (row["attempts"] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', error = ?, available_at = ?, updated_at = ? WHERE id = ?",
+                    (str(error), retry_at, now, job_id),
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (str(error), now, job_id),
+            )
+            return False
+
+    def requeue_running(self):
+        # jobs that were running when a process of this owner died are picked up again; jobs of other owners may still
+        # be running. Jobs without an owner were claimed by an older version
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', available_at = ?, updated_at = ? "
+                "WHERE status = 'running' AND (owner IS ? OR owner IS NULL)",
+                (time.time(), time.time(), self.owner),
+            )
+            return cursor.rowcount
+
+    def get_job(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row_to_job(row) if row else None
+
+    def find_follow_up(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE parent_id = ? ORDER BY id LIMIT 1", (job_id,)).fetchone()
+        return row_to_job(row) if row else None
+
+    def list_jobs(self, company=None, stage=None, status=None, limit=None):
+        query = "SELECT * FROM jobs"
+        conditions, params = [], []
+        for column, value in (("company", company), ("stage", stage), ("status", status)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        with closing(self._connect()) as conn:
+            return [row_to_job(row) for row in conn.execute(query, params).fetchall()]
+
+    def count_by_status(self, stage=None):
+        query = "SELECT stage, status, COUNT(*) AS n FROM jobs"
+        params = []
+        if stage is not None:
+            query += " WHERE stage = ?"
+            params.append(stage)
+        query += " GROUP BY stage, status"
+        counts = {}
+        with closing(self._connect()) as conn:
+            for row in conn.execute(query, params).fetchall():
+                counts.setdefault(row["stage"], {status: 0 for status in JOB_STATUSES})[row["status"]] = row["n"]
+        return counts
+
+    def has_open_jobs(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')").fetchone()
+        return row[0] > 0
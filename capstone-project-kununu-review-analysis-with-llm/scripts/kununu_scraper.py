@@ -1,10 +1,15 @@
-import json
-import time
+import math
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+from html_parsers import DEFAULT_PARSER_BACKEND, create_parser
+from page_fetchers import FallbackPageFetcher, HttpPageFetcher, PageNotFoundError, SeleniumPageFetcher
+from rate_limiting import SlidingWindowRateLimiter
+from review_store import add_to_review_store
+from scrape_output import ReviewListSink, ReviewStreamSink
 
 CSS_CLASSES = {
     "overall_score": ".index__score__BktQY",
@@ -17,6 +22,16 @@ CSS_CLASSES = {
     "factor_text": ".index__plainText__JgbHE",
     "review_block": ".index__reviewBlock__I8pdb",
 }
+LOAD_MORE_SELECTOR = "a.index__button__2PFpW"
+SELECTORS = dict(CSS_CLASSES, employee_type="b", load_more=LOAD_MORE_SELECTOR)
+FETCH_BACKENDS = ("auto", "http", "selenium")
+# stands in for a page that does not exist: no reviews and no link to a next page end the pagination
+MISSING_PAGE_HTML = "<html><body></body></html>"
+
+
+@lru_cache(maxsize=None)
+def get_parser(backend=DEFAULT_PARSER_BACKEND):
+    return create_parser(SELECTORS, backend)
 
 def extract_company_name_from_url(kn_url):
 
@@ -42,23 +57,24 @@ def is_review_within_last_2_years(review_year, review_month):
     review_date = datetime(review_year, review_month or 1, 1)
     return review_date >= cutoff_date
 
-def parse_review_block(block, kn_url, review_order, company_name):
+def parse_review_block(block, kn_url, review_order, company_name, parser=None):
+    parser = parser or get_parser()
     review = {}
 
     review['review_id'] = f"{company_name}_{review_order}"
     review['kn_url'] = kn_url
 
 
-    score_el = block.select_one(CSS_CLASSES["overall_score"])
-    review['overall_score'] = float(score_el.text.replace(',', '.')) if score_el else None
+    score_el = parser.select_one(block, "overall_score")
+    review['overall_score'] = float(parser.text(score_el).replace(',', '.')) if score_el else None
 
 
-    title_el = block.select_one(CSS_CLASSES["title"])
-    review['title'] = title_el.text.strip() if title_el else None
+    title_el = parser.select_one(block, "title")
+    review['title'] = parser.text(title_el).strip() if title_el else None
 
-    date_el = block.select_one(CSS_CLASSES["date"])
+    date_el = parser.select_one(block, "date")
     if date_el:
-        date_str = date_el.get('datetime', '')
+        date_str = parser.attr(date_el, 'datetime') or ''
         date_parts = date_str.split('T')[0].split('-')
         review['year'] = int(date_parts[0])
         review['month'] = int(date_parts[1])
@@ -68,13 +84,13 @@ def parse_review_block(block, kn_url, review_order, company_name):
 
 
 
-    emp_info_el = block.select_one(CSS_CLASSES["employment_info"])
+    emp_info_el = parser.select_one(block, "employment_info")
     if emp_info_el:
-        emp_info_text = emp_info_el.text.strip()
-        emp_type_el = emp_info_el.select_one('b')
-        review['employee_type'] = emp_type_el.text.strip() if emp_type_el else None
+        emp_info_text = parser.text(emp_info_el)
+        emp_type_el = parser.select_one(emp_info_el, "employee_type")
+        review['employee_type'] = parser.text(emp_type_el).strip() if emp_type_el else None
         try:
-            position_text = emp_info_el.text.replace(review['employee_type'], '', 1).strip()
+            position_text = emp_info_text.replace(review['employee_type'], '', 1).strip()
             review['position'] = position_text if position_text else None
         except:
             review['position'] = None
@@ -83,14 +99,14 @@ def parse_review_block(block, kn_url, review_order, company_name):
         review['position'] = None
 
     review['subcategories'] = []
-    factors = block.select(CSS_CLASSES["factor"])
+    factors = parser.select(block, "factor")
     for f in factors:
-        cat_title_el = f.select_one(CSS_CLASSES["factor_title"])
+        cat_title_el = parser.select_one(f, "factor_title")
         if not cat_title_el:
             continue
-        cat_title = cat_title_el.text.strip()
-        text_el = f.select_one(CSS_CLASSES["factor_text"])
-        cat_text = text_el.text.strip() if text_el else None
+        cat_title = parser.text(cat_title_el).strip()
+        text_el = parser.select_one(f, "factor_text")
+        cat_text = parser.text(text_el).strip() if text_el else None
         
         if cat_text:
             review['subcategories'].append({cat_title: cat_text})
@@ -98,67 +114,223 @@ def parse_review_block(block, kn_url, review_order, company_name):
     return review
 
 
-def get_all_reviews_for_url(kn_url, save_path=None, max_reviews=100):
+def page_has_reviews(page_source):
+    return CSS_CLASSES["review_block"].lstrip('.') in page_source
+
+
+def create_page_fetcher(backend="auto", max_workers=1):
+    if backend == "selenium":
+        return SeleniumPageFetcher()
+    if backend == "http":
+        return HttpPageFetcher(pool_size=max_workers)
+    # review pages are server-rendered; the browser is only started for blocked pages, or when pages come back
+    # without reviews before any page had them
+    return FallbackPageFetcher(HttpPageFetcher(pool_size=max_workers), SeleniumPageFetcher(), page_has_reviews)
+
+
+def build_page_url(kn_url, page):
+    # the page number belongs to the path, a query string (e.g. a filter) stays behind it
+    parts = urlsplit(kn_url)
+    path = parts.path.rstrip('/')
+    if page != 1:
+        path = f"{path}/{page}"
+    return urlunsplit(parts._replace(path=path))
+
+
+def find_page_number(page_url):
+    match = re.search(r'/kommentare/(\d+)/?$', urlsplit(page_url or "").path)
+    return int(match.group(1)) if match else None
+
+
+def find_next_page_url(soup, parser):
+    load_more_link = parser.select_one(soup, "load_more")
+    href = parser.attr(load_more_link, "href") if load_more_link else None
+    if href:
+        return f"https://www.kununu.com{href}"
+    return None
+
+
+def collect_page_reviews(soup, kn_url, company_name, collected, max_reviews, parser):
+    page_reviews = []
+    for block in parser.select(soup, "review_block"):
+        if collected + len(page_reviews) >= max_reviews:
+            print(f"Maximum number of reviews ({max_reviews}) reached. Stopping scraping.")
+            return page_reviews, False
+
+        parsed = parse_review_block(block, kn_url, collected + len(page_reviews) + 1, company_name, parser)
+        if parsed.get('title'):
+            if is_review_within_last_2_years(parsed.get('year'), parsed.get('month')):
+                page_reviews.append(parsed)
+            else:
+                print("First review outside the last 2 years found. Stopping scraping.")
+                return page_reviews, False
+    return page_reviews, True
+
+
+def create_review_sink(save_path, stream=False, resume=False):
+    if stream or resume:
+        return ReviewStreamSink(save_path, resume)
+    return ReviewListSink(save_path)
+
+
+def get_all_reviews_for_url(kn_url, save_path=None, max_reviews=100, fetcher=None, seconds_between_pages=3, backend="auto",
+                            parser_backend=DEFAULT_PARSER_BACKEND, stream=False, resume=False):
     company_name = extract_company_name_from_url(kn_url)
     if save_path is None:
         save_path = '../data/' + generate_filename(company_name)
-        
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    driver = webdriver.Chrome(options=chrome_options)
 
-    try:
-        driver.get(kn_url)
-        reviews = []
-        more_reviews_available = True
-        review_counter = 1
-    
-        while more_reviews_available:
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            review_blocks = soup.select(CSS_CLASSES["review_block"])
+    sink = create_review_sink(save_path, stream, resume)
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = create_page_fetcher(backend)
+    rate_limiter = SlidingWindowRateLimiter(1, seconds_between_pages)
+    parser = get_parser(parser_backend)
 
-            for block in review_blocks:
-                if len(reviews) >= max_reviews:
-                    print(f"Maximum number of reviews ({max_reviews}) reached. Stopping scraping.")
-                    more_reviews_available = False
-                    break
+    try:
+        page_url = kn_url
+        more_reviews_available = sink.count < max_reviews
+        if getattr(sink, "checkpoint", None):
+            page_url = sink.checkpoint["next_page_url"]
+            more_reviews_available = more_reviews_available and page_url is not None
+            print(f"Resuming after {sink.count} reviews at {page_url}")
 
-                parsed = parse_review_block(block, kn_url, review_counter, company_name)
-                if parsed.get('title'):
-                    if is_review_within_last_2_years(parsed.get('year'), parsed.get('month')):
-                        reviews.append(parsed)
-                        review_counter += 1
+        while more_reviews_available:
+            rate_limiter.acquire()
+            try:
+                page_source = fetcher.fetch(page_url)
+            except PageNotFoundError:
+                print(f"{page_url} does not exist. All reviews loaded.")
+                break
+            if page_source is None:
+                print(f"Could not load {page_url}. Stopping scraping.")
+                break
+            soup = parser.parse(page_source)
+
+            page_reviews, more_reviews_available = collect_page_reviews(
+                soup, kn_url, company_name, sink.count, max_reviews, parser
+            )
+
+            next_page_url = None
+            if more_reviews_available:
+                try:
+                    next_page_url = find_next_page_url(soup, parser)
+                    if next_page_url:
+                        print(f"Navigating to next page: {next_page_url}")
                     else:
-                        print("First review outside the last 2 years found. Stopping scraping.")
+                        print("No more 'Mehr Bewertungen lesen' button found. All reviews loaded.")
                         more_reviews_available = False
-                        break
+                except Exception as e:
+                    print(f"Error finding 'Mehr Bewertungen lesen' button: {e}")
+                    more_reviews_available = False
+            sink.add(page_reviews, next_page_url=next_page_url)
+            page_url = next_page_url
 
-            print(f"Collected {len(reviews)} reviews so far...")            
+            print(f"Collected {sink.count} reviews so far...")
 
-            if not more_reviews_available:
-                break
+        print(f"Total reviews collected: {sink.count}")
 
-            try:
-                load_more_link = soup.select_one("a.index__button__2PFpW")
-                if load_more_link and load_more_link.get("href"):
-                    next_page_url = load_more_link["href"]
-                    full_next_page_url = f"https://www.kununu.com{next_page_url}"
-                    print(f"Navigating to next page: {full_next_page_url}")
-                    driver.get(full_next_page_url)
-                    time.sleep(3)
-                else:
-                    print("No more 'Mehr Bewertungen lesen' button found. All reviews loaded.")
-                    more_reviews_available = False
-            except Exception as e:
-                print(f"Error finding 'Mehr Bewertungen lesen' button: {e}")
-                more_reviews_available = False
+        results = sink.finish(kn_url)
+        add_to_review_store(save_path)
+        return results
+    finally:
+        sink.close()
+        if own_fetcher:
+            fetcher.close()
+
+
+def fetch_and_parse_page(fetcher, rate_limiter, page_url, parser):
+    rate_limiter.acquire()
+    try:
+        page_source = fetcher.fetch(page_url)
+    except PageNotFoundError:
+        # pages are requested ahead, so the ones past the last page are expected to be missing
+        print(f"{page_url} does not exist.")
+        page_source = MISSING_PAGE_HTML
+    except Exception as e:
+        print(f"Error loading {page_url}: {e}")
+        return None
+    if page_source is None:
+        return None
+    return parser.parse(page_source)
+
+
+def checkpoint_page(sink, kn_url, page_reviews, next_page):
+    next_page_url = build_page_url(kn_url, next_page) if next_page else None
+    sink.add(page_reviews, next_page=next_page, next_page_url=next_page_url)
+
+
+def get_all_reviews_parallel(kn_url, save_path=None, max_reviews=100, max_workers=4, requests_per_second=1.0,
+                             fetcher=None, backend="auto", parser_backend=DEFAULT_PARSER_BACKEND, stream=False,
+                             resume=False):
+    if requests_per_second <= 0:
+        raise ValueError(f"requests_per_second must be greater than 0, got {requests_per_second}")
+    company_name = extract_company_name_from_url(kn_url)
+    if save_path is None:
+        save_path = '../data/' + generate_filename(company_name)
 
-        print(f"Total reviews collected: {len(reviews)}")
+    sink = create_review_sink(save_path, stream, resume)
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = create_page_fetcher(backend, max_workers)
+    # one global limit for all workers, so more workers only hide latency instead of hitting the site harder
+    rate_limiter = SlidingWindowRateLimiter(1, 1.0 / requests_per_second)
+    parser = get_parser(parser_backend)
 
-        results = {kn_url: reviews}
-        with open(save_path, "w") as f:
-            json.dump(results, f, indent=2)
+    try:
+        start_page = 1
+        if getattr(sink, "checkpoint", None):
+            # checkpoints of the serial scraper only store the link that was followed
+            start_page = sink.checkpoint["next_page"] or find_page_number(sink.checkpoint["next_page_url"])
+            print(f"Resuming after {sink.count} reviews at page {start_page}")
+
+        first_page = None
+        if start_page is not None and sink.count < max_reviews:
+            first_page = fetch_and_parse_page(fetcher, rate_limiter, build_page_url(kn_url, start_page), parser)
+        reviews_per_page = len(parser.select(first_page, "review_block")) if first_page else 0
+        if not reviews_per_page:
+            print("No more reviews to load." if start_page != 1 else "No reviews found on the first page.")
+        else:
+            page_reviews, more_reviews_available = collect_page_reviews(
+                first_page, kn_url, company_name, sink.count, max_reviews, parser
+            )
+            more_reviews_available = more_reviews_available and find_next_page_url(first_page, parser) is not None
+            next_page = start_page + 1
+            checkpoint_page(sink, kn_url, page_reviews, next_page if more_reviews_available else None)
+            print(f"Collected {sink.count} reviews so far ({reviews_per_page} reviews per page)...")
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while more_reviews_available and sink.count < max_reviews:
+                    # page URLs follow /kommentare/<n>, so the next pages can be requested at once
+                    pages_needed = math.ceil((max_reviews - sink.count) / reviews_per_page)
+                    pages = list(range(next_page, next_page + min(max_workers, pages_needed)))
+                    page_urls = [build_page_url(kn_url, page) for page in pages]
+                    print(f"Fetching pages {pages[0]}-{pages[-1]}...")
+                    soups = list(executor.map(lambda url: fetch_and_parse_page(fetcher, rate_limiter, url, parser), page_urls))
+
+                    # pages finish in any order; reviews are numbered and checkpointed in page order afterwards
+                    for page, page_url, soup in zip(pages, page_urls, soups):
+                        if soup is None:
+                            print(f"Could not load {page_url}. Stopping scraping.")
+                            more_reviews_available = False
+                            break
+                        page_reviews, more_reviews_available = collect_page_reviews(
+                            soup, kn_url, company_name, sink.count, max_reviews, parser
+                        )
+                        if more_reviews_available and find_next_page_url(soup, parser) is None:
+                            print("No more 'Mehr Bewertungen lesen' button found. All reviews loaded.")
+                            more_reviews_available = False
+                        next_page = page + 1
+                        checkpoint_page(sink, kn_url, page_reviews, next_page if more_reviews_available else None)
+                        if not more_reviews_available:
+                            break
+                    print(f"Collected {sink.count} reviews so far...")
+
+        print(f"Total reviews collected: {sink.count}")
+
+        results = sink.finish(kn_url)
+        add_to_review_store(save_path)
         return results
     finally:
-        driver.quit()
+        sink.close()
+        if own_fetcher:
+            fetcher.close()
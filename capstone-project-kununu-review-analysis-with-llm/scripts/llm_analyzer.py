@@ -1,15 +1,100 @@
 import google.generativeai as genai
-import google.ai.generativelanguage as glm
+from google.generativeai import client as genai_client
 import json
 import os
-import time
 import glob
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+
+from llm_scheduler import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    LLMRateLimiter,
+    estimate_tokens,
+    run_prompts_concurrently,
+)
+from response_cache import ResponseCache, make_cache_key
+from result_merger import is_valid_category_response, merge_category_responses
+from review_batching import DEFAULT_BATCH_TOKEN_BUDGET, count_reviews, split_batch_in_half, split_reviews_into_batches
+from review_encoding import DEFAULT_PROMPT_FORMAT, PROMPT_FORMATS, encode_input_data, format_token_savings
+from review_filtering import filter_reviews_for_prompt
+from retry_policy import CircuitOpenError, FatalResponseError, RetryableResponseError, RetryPolicy
+from response_schema import (
+    PROMPT_CATEGORIES,
+    get_generation_config,
+    load_json_fragment,
+    repair_category_response,
+    validate_category_response,
+)
+from stream_validation import InvalidStreamError, StreamingJsonValidator
+from review_store import add_to_review_store, load_review_data
+from incremental_analysis import find_latest_result, prepare_incremental_input
+from token_index import write_token_index
+
+DEFAULT_MODEL_NAME = "gemini-2.5-flash-preview-05-20"
+PROMPTS_DIR = "./prompts"
+MERGE_PROMPT_NAME = "merge_points"
+REPAIR_PROMPT_NAME = "repair_response"
+# returned instead of a response when no review mentions the category, None stays the value of a failed prompt
+PROMPT_SKIPPED = "skipped"
+# create_generative_model uses private parts of google-generativeai that were checked against these versions
+SUPPORTED_GENAI_VERSIONS = ("0.8.",)
 
 def configure_genai(api_key):
     genai.configure(api_key=api_key)
 
+@lru_cache(maxsize=32)
+def _read_prompt_template(path, mtime):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+def load_prompt_template(name, prompts_dir=PROMPTS_DIR):
+    # read again only when the file was edited
+    path = os.path.join(prompts_dir, f"{name}.txt")
+    if not os.path.exists(path):
+        return None
+    return _read_prompt_template(os.path.abspath(path), os.path.getmtime(path))
+
+def create_generative_model(api_key, model_name=DEFAULT_MODEL_NAME):
+    model = genai.GenerativeModel(model_name=model_name)
+    # a model without a client falls back to the global genai.configure state, which would mix up the keys of parallel
+    # jobs. The SDK's own client factory builds one for this key instead, and the client keeps its channel open, so
+    # later requests skip the connection setup
+    if not genai.__version__.startswith(SUPPORTED_GENAI_VERSIONS):
+        print(f"google-generativeai {genai.__version__} was not tested with a client per API key "
+              f"(tested: {', '.join(v + 'x' for v in SUPPORTED_GENAI_VERSIONS)})")
+    if not hasattr(model, "_client") or not hasattr(genai_client, "_ClientManager"):
+        # the global key would be used for every job, better to stop than to send requests with the wrong key
+        raise RuntimeError(f"google-generativeai {genai.__version__} does not support a client per API key, "
+                           f"please install google-generativeai==0.8.6")
+    client_manager = genai_client._ClientManager()
+    client_manager.configure(api_key=api_key)
+    model._client = client_manager.make_client("generative")
+    return model
+
+class AnalyzerSession:
+    # one configured client and model for all prompts, batches, companies and threads of an API key
+    def __init__(self, api_key=None, model_name=DEFAULT_MODEL_NAME, model=None, prompts_dir=PROMPTS_DIR):
+        self.model_name = getattr(model, "model_name", None) or model_name
+        self.prompts_dir = prompts_dir
+        self.model = model or create_generative_model(api_key, model_name)
+        for prompt_name in self.prompt_names():
+            load_prompt_template(prompt_name, prompts_dir)
+
+    def prompt_names(self):
+        names = glob.glob(os.path.join(self.prompts_dir, "*.txt"))
+        return sorted(os.path.splitext(os.path.basename(name))[0] for name in names)
+
+    def get_prompt_template(self, prompt_number):
+        return load_prompt_template(f"prompt_{prompt_number}", self.prompts_dir)
+
+@lru_cache(maxsize=16)
+def get_analyzer_session(api_key=None, model_name=DEFAULT_MODEL_NAME, model=None, prompts_dir=PROMPTS_DIR):
+    return AnalyzerSession(api_key, model_name, model, prompts_dir)
+
 def extract_company_name_from_filename(filename):
     basename = os.path.basename(filename)
     name_without_ext = os.path.splitext(basename)[0]
@@ -33,103 +118,312 @@ def extract_json_from_response(response_text):
         return extracted
     return response_text
 
-def process_individual_prompts(input_data, prompt_number, company_name, current_date, api_key, max_retries=5):
+def save_response(response_data, company_name, current_date, prompt_number):
+    responses_dir = f"./responses/response_{company_name}_{current_date}"
+    os.makedirs(responses_dir, exist_ok=True)
     
-    genai.configure(api_key=api_key)
+    response_output_path = f"{responses_dir}/response_{company_name}_{current_date}_{prompt_number}.json"
+    with open(response_output_path, "w", encoding="utf-8") as f:
+        json.dump(response_data, f, ensure_ascii=False, indent=2)
+
+class PromptTooLargeError(FatalResponseError):
+    pass
+
+def build_prompt(prompt_template, input_data, prompt_format=DEFAULT_PROMPT_FORMAT):
+    return prompt_template + "\n\n" + encode_input_data(input_data, prompt_format)
+
+def get_chunk_text(chunk):
+    # a chunk without text parts (e.g. the last one of a blocked response) raises instead of returning ""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+def stream_response_text(model, prompt, prompt_label, stream_callback=None, generation_config=None):
+    response = model.generate_content(prompt, stream=True, generation_config=generation_config)
+    validator = StreamingJsonValidator()
+    try:
+        for chunk in response:
+            # raises on clearly broken output, the rest of the stream is not waited for
+            validator.feed(get_chunk_text(chunk))
+            if stream_callback:
+                stream_callback(prompt_label, validator)
+    except InvalidStreamError as e:
+        print(f"[prompt_{prompt_label}] Aborting stream after {len(validator.text)} characters: {e}")
+        raise
+    finally:
+        if stream_callback:
+            stream_callback(prompt_label, None)
+    return response, validator
+
+def request_response_text(model, prompt, prompt_label, estimated_tokens, rate_limiter=None, min_response_chars=500,
+                          stream=False, stream_callback=None, generation_config=None):
+    if rate_limiter is not None:
+        rate_limiter.acquire(estimated_tokens)
+    try:
+        validator = None
+        if stream:
+            response, validator = stream_response_text(model, prompt, prompt_label, stream_callback, generation_config)
+        else:
+            response = model.generate_content(prompt, generation_config=generation_config)
     
-    model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash-preview-05-20",
-    )
+        if hasattr(response, 'candidates') and response.candidates:
+            candidate = response.candidates[0]
+        
+            if hasattr(candidate, 'finish_reason'):
+                finish_reason = candidate.finish_reason
+                print(f"[prompt_{prompt_label}] Finish reason: {finish_reason}")
+            
+                if finish_reason == 2:  # MAX_TOKENS
+                    # the same input would be truncated again, the caller has to send less data
+                    print(f"[prompt_{prompt_label}] Response truncated due to max tokens")
+                    raise PromptTooLargeError(f"prompt_{prompt_label} exceeded the output token limit")
+                elif finish_reason == 3:  # SAFETY
+                    # the same prompt is blocked again, so it is not retried
+                    raise FatalResponseError("Response blocked due to safety filters")
+    
+        if validator is not None:
+            validator.finish()
+            response_text = validator.text
+        else:
+            response_text = response.text
     
-    prompt_file = f'./prompts/prompt_{prompt_number}.txt'
+        if len(response_text) < min_response_chars:
+            raise RetryableResponseError(f"Response too short ({len(response_text)} chars)")
     
-    if not os.path.exists(prompt_file):
-        print(f"Error: Prompt file not found: {prompt_file}")
+        print(f"[prompt_{prompt_label}] Valid response received ({len(response_text)} characters)")
+        return response_text
+    finally:
+        if rate_limiter is not None:
+            rate_limiter.release()
+
+def generate_response_text(model, prompt, prompt_label, max_retries=5, rate_limiter=None, min_response_chars=500,
+                           retry_policy=None, stream=False, stream_callback=None, generation_config=None):
+    retry_policy = retry_policy or RetryPolicy(max_retries)
+    estimated_tokens = estimate_tokens(prompt)
+    try:
+        return retry_policy.call(
+            lambda: request_response_text(model, prompt, prompt_label, estimated_tokens, rate_limiter, min_response_chars,
+                                          stream, stream_callback, generation_config),
+            prompt_label,
+        )
+    except (PromptTooLargeError, CircuitOpenError):
+        raise
+    except Exception as e:
+        print(f"[prompt_{prompt_label}] Failed to get valid response ({e}). Skipping prompt_{prompt_label}")
+        return None
+
+def parse_response_text(response_text, prompt_label, category=None):
+    clean_json_text = extract_json_from_response(response_text)
+    parsed_json = load_json_fragment(clean_json_text)
+    if parsed_json is None:
+        print(f"[prompt_{prompt_label}] Response is not valid JSON")
         return None
-        
-    with open(prompt_file, 'r', encoding='utf-8') as file:
-        prompt = file.read()
-            
-    prompt = prompt + "\n\nHier sind die zu analysierenden Daten:\n" + json.dumps(input_data, ensure_ascii=False, indent=2)
-            
-    print(f"Processing prompt_{prompt_number}.txt...")
-            
-    retry_count = 0
-    response_text = None
     
-    while retry_count < max_retries:
+    errors = validate_category_response(parsed_json, category)
+    if errors:
+        print(f"[prompt_{prompt_label}] {len(errors)} schema errors, repairing them (first: {errors[0]})")
+        parsed_json = repair_category_response(parsed_json, category)
+        if parsed_json is None:
+            print(f"[prompt_{prompt_label}] Response does not contain a category object")
+    return parsed_json
+
+def repair_response_with_llm(model, response_text, prompt_label, prompt_number, max_retries=5, rate_limiter=None,
+                             retry_policy=None, prompts_dir=PROMPTS_DIR):
+    # only the broken answer is sent, not the reviews again, so this costs a fraction of a new analysis
+    repair_template = load_prompt_template(REPAIR_PROMPT_NAME, prompts_dir)
+    if repair_template is None:
+        return None
+    
+    prompt = repair_template + "\n\nHier ist die fehlerhafte Antwort:\n" + extract_json_from_response(response_text)
+    print(f"[prompt_{prompt_label}] Asking the model to repair the JSON of the response...")
+    try:
+        repaired_text = generate_response_text(model, prompt, f"{prompt_label}.repair", max_retries, rate_limiter,
+                                               min_response_chars=0, retry_policy=retry_policy,
+                                               generation_config=get_generation_config(prompt_number))
+    except PromptTooLargeError:
+        return None
+    if repaired_text is None:
+        return None
+    return parse_response_text(repaired_text, f"{prompt_label}.repair", PROMPT_CATEGORIES.get(prompt_number))
+
+def parse_or_repair_response(model, response_text, prompt_label, prompt_number, max_retries=5, rate_limiter=None,
+                             retry_policy=None, prompts_dir=PROMPTS_DIR):
+    parsed_json = parse_response_text(response_text, prompt_label, PROMPT_CATEGORIES.get(prompt_number))
+    if parsed_json is None:
+        parsed_json = repair_response_with_llm(model, response_text, prompt_label, prompt_number, max_retries,
+                                               rate_limiter, retry_policy, prompts_dir)
+    if parsed_json is None:
+        print(f"[prompt_{prompt_label}] Response could not be repaired and is left out")
+    return parsed_json
+
+def merge_points_with_llm(model, merged_response, prompt_number, max_retries=5, rate_limiter=None, retry_policy=None,
+                          stream=False, stream_callback=None, prompts_dir=PROMPTS_DIR):
+    merge_template = load_prompt_template(MERGE_PROMPT_NAME, prompts_dir)
+    if merge_template is None:
+        print(f"[prompt_{prompt_number}] Merge prompt not found: {os.path.join(prompts_dir, MERGE_PROMPT_NAME)}.txt")
+        return merged_response
+    
+    prompt = merge_template + "\n\nHier ist die zusammenzuführende JSON-Struktur:\n" + json.dumps(merged_response, ensure_ascii=False, indent=2)
+    print(f"[prompt_{prompt_number}] Merging similar points across batches...")
+    try:
+        response_text = generate_response_text(model, prompt, f"{prompt_number}.merge", max_retries, rate_limiter,
+                                               min_response_chars=0, retry_policy=retry_policy, stream=stream,
+                                               stream_callback=stream_callback,
+                                               generation_config=get_generation_config(prompt_number))
+    except PromptTooLargeError:
+        response_text = None
+    if response_text is None:
+        return merged_response
+    
+    parsed_json = parse_response_text(response_text, f"{prompt_number}.merge", PROMPT_CATEGORIES.get(prompt_number))
+    if not is_valid_category_response(parsed_json) or set(parsed_json) != set(merged_response):
+        print(f"[prompt_{prompt_number}] Merge response unusable, keeping the deterministic merge")
+        return merged_response
+    return parsed_json
+
+def analyze_in_batches(input_data, prompt_template, prompt_number, model, max_retries=5, rate_limiter=None,
+                       batch_token_budget=DEFAULT_BATCH_TOKEN_BUDGET, max_workers=DEFAULT_MAX_WORKERS, semantic_merge=False,
+                       prompt_format=DEFAULT_PROMPT_FORMAT, retry_policy=None, stream=False, stream_callback=None,
+                       prompts_dir=PROMPTS_DIR):
+    batches = split_reviews_into_batches(input_data, batch_token_budget, prompt_format)
+    generation_config = get_generation_config(prompt_number)
+    print(f"[prompt_{prompt_number}] Splitting {count_reviews(input_data)} reviews into {len(batches)} batches")
+    
+    # every batch returns a list of responses, None when it failed and the prompt result would be incomplete
+    def analyze_batch(batch, label):
+        prompt = build_prompt(prompt_template, batch, prompt_format)
         try:
-            response = model.generate_content(prompt)
-            
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                
-                if hasattr(candidate, 'finish_reason'):
-                    finish_reason = candidate.finish_reason
-                    print(f"Finish reason: {finish_reason}")
-                    
-                    if finish_reason == 2:  # MAX_TOKENS
-                        print(f"Response truncated due to max tokens. Retry {retry_count + 1}/{max_retries}")
-                        retry_count += 1
-                        time.sleep(30)
-                        continue
-                    elif finish_reason == 3:  # SAFETY
-                        print("Response blocked due to safety filters")
-                        retry_count += 1
-                        time.sleep(30)
-                        continue
-            
-            response_text = response.text
-            
-            if len(response_text) < 500:
-                print(f"Response too short ({len(response_text)} chars). Retry {retry_count + 1}/{max_retries}")
-                retry_count += 1
-                time.sleep(30)
-                continue
-            
-            print(f"Valid response received ({len(response_text)} characters)")
-            break
-            
-        except ValueError as e:
-            print(f"ValueError occurred: {e}")
-            retry_count += 1
-            if retry_count >= max_retries:
-                print(f"Max retries ({max_retries}) reached. Skipping prompt_{prompt_number}")
+            response_text = generate_response_text(model, prompt, label, max_retries, rate_limiter, min_response_chars=0,
+                                                   retry_policy=retry_policy, stream=stream, stream_callback=stream_callback,
+                                                   generation_config=generation_config)
+        except PromptTooLargeError:
+            halves = split_batch_in_half(batch)
+            if halves is None:
+                print(f"[prompt_{label}] Single review exceeds the output limit, skipping it")
+                return []
+            print(f"[prompt_{label}] Splitting batch of {count_reviews(batch)} reviews in half")
+            first_half = analyze_batch(halves[0], f"{label}a")
+            second_half = analyze_batch(halves[1], f"{label}b")
+            if first_half is None or second_half is None:
                 return None
-            print(f"Retrying... ({retry_count}/{max_retries})")
-            time.sleep(5)
+            return first_half + second_half
+        if response_text is None:
+            return None
+        parsed_json = parse_or_repair_response(model, response_text, label, prompt_number, max_retries, rate_limiter,
+                                               retry_policy, prompts_dir)
+        return [parsed_json] if parsed_json is not None else None
+    
+    def analyze_batch_safely(indexed_batch):
+        i, batch = indexed_batch
+        try:
+            return analyze_batch(batch, f"{prompt_number}.{i + 1}")
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print(f"Unexpected error: {e}")
-            retry_count += 1
-            if retry_count >= max_retries:
-                print(f"Max retries ({max_retries}) reached. Skipping prompt_{prompt_number}")
-                return None
-            time.sleep(5)
+            print(f"[prompt_{prompt_number}.{i + 1}] Unexpected error: {e}")
+            return None
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        batch_results = list(executor.map(analyze_batch_safely, enumerate(batches)))
     
-    if retry_count >= max_retries or response_text is None:
-        print(f"Failed to get valid response after {max_retries} retries")
+    failed = sum(1 for responses in batch_results if responses is None)
+    if failed:
+        # a result missing some batches must not be saved and cached as the result of the whole input
+        print(f"[prompt_{prompt_number}] {failed} of {len(batches)} batches failed, skipping prompt_{prompt_number}")
         return None
+    
+    # merge in batch order so the combined point lists do not depend on completion order
+    batch_responses = [response for responses in batch_results for response in responses]
+    merged = merge_category_responses([], batch_responses)
+    if not merged:
+        return None
+    if len(merged) > 1:
+        print(f"[prompt_{prompt_number}] Batches returned different categories: {', '.join(next(iter(r)) for r in merged)}")
+    
+    merged_response = merged[0]
+    if semantic_merge and len(batches) > 1:
+        merged_response = merge_points_with_llm(model, merged_response, prompt_number, max_retries, rate_limiter,
+                                                retry_policy, stream, stream_callback, prompts_dir)
+    return merged_response
 
-    clean_json_text = extract_json_from_response(response_text)
+def process_individual_prompts(input_data, prompt_number, company_name, current_date, api_key, max_retries=5, model=None,
+                               rate_limiter=None, cache=None, batch_token_budget=None, semantic_merge=False,
+                               max_workers=DEFAULT_MAX_WORKERS, prompt_format=DEFAULT_PROMPT_FORMAT, prefilter=True,
+                               retry_policy=None, stream=False, stream_callback=None, session=None,
+                               model_name=DEFAULT_MODEL_NAME):
+    session = session or get_analyzer_session(api_key, model_name, model)
+    prompt_template = session.get_prompt_template(prompt_number)
+    
+    if prompt_template is None:
+        print(f"Error: Prompt file not found: {session.prompts_dir}/prompt_{prompt_number}.txt")
+        return None
+    
+    if prefilter:
+        input_data = filter_reviews_for_prompt(input_data, prompt_number)
+        if not count_reviews(input_data):
+            print(f"[prompt_{prompt_number}] No review mentions this category, skipping prompt_{prompt_number}")
+            return PROMPT_SKIPPED
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key(prompt_template, session.model_name, input_data, prompt_format)
+        cached_response = cache.get(cache_key)
+        if cached_response is not None:
+            print(f"[prompt_{prompt_number}] Using cached response for prompt_{prompt_number}.txt")
+            save_response(cached_response, company_name, current_date, prompt_number)
+            return cached_response
+    
+    model = session.model
+    prompt = build_prompt(prompt_template, input_data, prompt_format)
+            
+    print(f"[prompt_{prompt_number}] Processing prompt_{prompt_number}.txt...")
+    
+    def run_batches(budget):
+        return analyze_in_batches(input_data, prompt_template, prompt_number, model, max_retries, rate_limiter,
+                                  budget, max_workers, semantic_merge, prompt_format, retry_policy, stream, stream_callback,
+                                  session.prompts_dir)
     
     try:
-        parsed_json = json.loads(clean_json_text)
-    except json.JSONDecodeError as e:
-        print(f"JSON parsing error: {e}")
-        parsed_json = {"raw_response": clean_json_text}
+        if batch_token_budget and estimate_tokens(prompt) > batch_token_budget:
+            parsed_json = run_batches(batch_token_budget)
+        else:
+            try:
+                response_text = generate_response_text(model, prompt, prompt_number, max_retries, rate_limiter,
+                                                       retry_policy=retry_policy, stream=stream,
+                                                       stream_callback=stream_callback,
+                                                       generation_config=get_generation_config(prompt_number))
+                parsed_json = None
+                if response_text is not None:
+                    parsed_json = parse_or_repair_response(model, response_text, prompt_number, prompt_number,
+                                                           max_retries, rate_limiter, retry_policy, session.prompts_dir)
+            except PromptTooLargeError:
+                print(f"[prompt_{prompt_number}] Falling back to batched analysis")
+                parsed_json = run_batches(batch_token_budget or DEFAULT_BATCH_TOKEN_BUDGET)
+    except CircuitOpenError as e:
+        print(f"[prompt_{prompt_number}] {e}. Skipping prompt_{prompt_number}")
+        return None
+    
+    if parsed_json is None:
+        return None
     
     response_data = {"response": parsed_json}
 
-    responses_dir = f"./responses/response_{company_name}_{current_date}"
-    os.makedirs(responses_dir, exist_ok=True)
-    
-    response_output_path = f"{responses_dir}/response_{company_name}_{current_date}_{prompt_number}.json"
-    with open(response_output_path, "w", encoding="utf-8") as f:
-        json.dump(response_data, f, ensure_ascii=False, indent=2)
+    save_response(response_data, company_name, current_date, prompt_number)
+    if cache is not None:
+        cache.put(cache_key, response_data)
         
     return response_data
 
-def combine_json_responses(company_name, current_date, selected_prompts, responses_dir="./responses"):
+def write_result_file(combined_data, output_file):
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(combined_data, f, ensure_ascii=False, indent=2)
+    write_token_index(combined_data, output_file)
+    add_to_review_store(output_file)
+
+def combine_json_responses(company_name, current_date, selected_prompts, responses_dir="./responses", source_file=None,
+                           previous_categories=None):
     json_files = []
     for prompt_num in selected_prompts:
         file_path = os.path.join(responses_dir, f"response_{company_name}_{current_date}",
@@ -148,34 +442,78 @@ def combine_json_responses(company_name, current_date, selected_prompts, respons
                 response_data = json.load(f)
                 
                 if isinstance(response_data, dict) and "response" in response_data:
-                    all_responses.append(response_data["response"])
-                else:
-                    all_responses.append(response_data)
+                    response_data = response_data["response"]
+                if not is_valid_category_response(response_data):
+                    # e.g. a {"raw_response": ...} of an older run, which the visualizations cannot show
+                    print(f"Skipping {os.path.basename(json_file)}: not a valid category response")
+                    continue
+                all_responses.append(response_data)
                 
                 print(f"Loaded {os.path.basename(json_file)}")
         except Exception as e:
             print(f"Error processing {json_file}: {e}")
     
+    if previous_categories is not None:
+        all_responses = merge_category_responses(previous_categories, all_responses)
+        print(f"Merged new points into {len(previous_categories)} previously analyzed categories")
+    
     combined_data = {"categories": all_responses}
+    if source_file:
+        combined_data["source_file"] = os.path.basename(source_file)
     
     results_dir = "./results"
-    os.makedirs(results_dir, exist_ok=True)
     output_file = os.path.join(results_dir, f"result_{company_name}_{current_date}.json")
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(combined_data, f, ensure_ascii=False, indent=2)
+    write_result_file(combined_data, output_file)
     
     print(f"Combined results saved to: {output_file}")
+    return output_file
+
+
+def process_prompts_and_generate_responses(input_data, company_name, current_date, api_key, start_prompt=1, end_prompt=13,
+                                           max_workers=DEFAULT_MAX_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                                           tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, model=None, cache=None,
+                                           batch_token_budget=None, semantic_merge=False, prompt_format=DEFAULT_PROMPT_FORMAT,
+                                           prefilter=True, rate_limiter=None, progress_callback=None, prompt_numbers=None,
+                                           retry_policy=None, stream=False, stream_callback=None, session=None,
+                                           model_name=DEFAULT_MODEL_NAME):
+    if prompt_numbers is None:
+        prompt_numbers = range(start_prompt, end_prompt + 1)
+    prompt_numbers = list(prompt_numbers)
+    print(format_token_savings(input_data, prompt_numbers, prompt_format, prefilter))
+    # prompts and their batches share one cap, so max_workers is the number of requests in flight
+    if rate_limiter is None:
+        rate_limiter = LLMRateLimiter(requests_per_minute, tokens_per_minute, max_concurrent=max_workers)
+    else:
+        rate_limiter = rate_limiter.with_max_concurrent(max_workers)
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+    if session is None:
+        session = get_analyzer_session(api_key, model_name, model)
 
+    def process_prompt(prompt_number):
+        return process_individual_prompts(input_data, prompt_number, company_name, current_date, api_key,
+                                          model=model, rate_limiter=rate_limiter, cache=cache,
+                                          batch_token_budget=batch_token_budget, semantic_merge=semantic_merge,
+                                          max_workers=max_workers, prompt_format=prompt_format, prefilter=prefilter,
+                                          retry_policy=retry_policy, stream=stream, stream_callback=stream_callback,
+                                          session=session, model_name=model_name)
 
-def process_prompts_and_generate_responses(input_data, company_name, current_date, api_key, start_prompt=1, end_prompt=13):
-    for i in range(start_prompt, end_prompt + 1):
-        result = process_individual_prompts(input_data, i, company_name, current_date, api_key)
+    results = {}
+    for prompt_number, result in run_prompts_concurrently(process_prompt, prompt_numbers, max_workers):
         if result is None:
-            print(f"Skipping prompt {i} due to errors")
-        time.sleep(30)
+            print(f"Skipping prompt {prompt_number} due to errors")
+        results[prompt_number] = result
+        if progress_callback:
+            progress_callback(len(results), len(prompt_numbers))
+    
+    skipped = sum(1 for result in results.values() if result is PROMPT_SKIPPED)
+    failed = sum(1 for result in results.values() if result is None)
+    print(f"{len(results) - skipped - failed} prompts answered, {skipped} skipped without matching reviews, {failed} failed")
+    return results
 
-def main(input_file_path=None, api_key=None):
+def main(input_file_path=None, api_key=None, use_cache=True, incremental=False, batch_token_budget=None,
+         semantic_merge=False, prompt_format=DEFAULT_PROMPT_FORMAT, prefilter=True, stream=False,
+         model_name=DEFAULT_MODEL_NAME):
     if input_file_path is None:
         data_dir = "./data"
         json_files = glob.glob(os.path.join(data_dir, "*.json"))
@@ -193,20 +531,53 @@ def main(input_file_path=None, api_key=None):
     print(f"Company: {company_name}")
     print(f"Date: {current_date}")
     
-    with open(input_file_path, "r", encoding="utf-8") as f:
-        input_data = json.load(f)
+    input_data = load_review_data(input_file_path)
     
-    if api_key:
-        process_prompts_and_generate_responses(input_data, company_name, current_date, api_key, 1, 13)
-    else:
+    if not api_key:
         print("Error: API key is required")
+        return
+    
+    previous_categories = None
+    if incremental:
+        previous_result_path = find_latest_result(company_name)
+        if previous_result_path:
+            input_data, previous_categories = prepare_incremental_input(input_data, previous_result_path)
+            if not any(input_data.values()):
+                print("No new reviews to analyze")
+                return
+        else:
+            print("No previous result found, analyzing all reviews")
+    
+    cache = ResponseCache() if use_cache else None
+    process_prompts_and_generate_responses(input_data, company_name, current_date, api_key, 1, 13, cache=cache,
+                                           batch_token_budget=batch_token_budget, semantic_merge=semantic_merge,
+                                           prompt_format=prompt_format, prefilter=prefilter, stream=stream,
+                                           model_name=model_name)
+    combine_json_responses(company_name, current_date, range(1, 14), source_file=input_file_path,
+                           previous_categories=previous_categories)
 
 if __name__ == "__main__":
-    import sys
+    import argparse
     
-    if len(sys.argv) > 2:
-        input_file = sys.argv[1]
-        api_key = sys.argv[2]
-        main(input_file, api_key)
-    else:
-        print("Usage: python llm_analyzer.py <input_file> <api_key>")
+    parser = argparse.ArgumentParser(usage="python llm_analyzer.py <input_file> <api_key> [options]")
+    parser.add_argument("input_file")
+    parser.add_argument("api_key")
+    parser.add_argument("--no-cache", action="store_true", help="always call the model, ignore ./cache/responses")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only analyze reviews missing from the latest result of this company and merge them into it")
+    parser.add_argument("--batch-tokens", type=int, default=None,
+                        help=f"split inputs larger than this many tokens into batches (e.g. {DEFAULT_BATCH_TOKEN_BUDGET})")
+    parser.add_argument("--semantic-merge", action="store_true",
+                        help="let the model merge similar points after a batched analysis")
+    parser.add_argument("--prompt-format", choices=PROMPT_FORMATS, default=DEFAULT_PROMPT_FORMAT,
+                        help="how the reviews are serialized into the prompt")
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="send every review section to every prompt instead of only the matching ones")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="Gemini model used for the analysis")
+    parser.add_argument("--stream", action="store_true",
+                        help="receive the responses as a stream and retry as soon as the JSON is clearly broken")
+    args = parser.parse_args()
+    
+    main(args.input_file, args.api_key, use_cache=not args.no_cache, incremental=args.incremental,
+         batch_token_budget=args.batch_tokens, semantic_merge=args.semantic_merge, prompt_format=args.prompt_format,
+         prefilter=not args.no_prefilter, stream=args.stream, model_name=args.model)
@@ -0,0 +1,58 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rate_limiting import SlidingWindowRateLimiter
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 10
+DEFAULT_TOKENS_PER_MINUTE = 250000
+
+
+def estimate_tokens(text):
+    # rough heuristic for Gemini models: ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+class LLMRateLimiter:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_concurrent=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = SlidingWindowRateLimiter(requests_per_minute, 60.0)
+        self._tokens = SlidingWindowRateLimiter(tokens_per_minute, 60.0)
+        # the windows limit how many requests start per minute, this how many are in flight at the same time
+        self._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def with_max_concurrent(self, max_concurrent):
+        # shares the request and token windows, with its own cap for the prompts and batches of one analysis
+        limiter = copy.copy(self)
+        limiter._slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        return limiter
+
+    def acquire(self, estimated_tokens=1):
+        if self._slots is not None:
+            self._slots.acquire()
+        self._requests.acquire(1)
+        self._tokens.acquire(estimated_tokens)
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+
+def run_prompts_concurrently(process_fn, prompt_numbers, max_workers=DEFAULT_MAX_WORKERS):
+    prompt_numbers = list(prompt_numbers)
+    if not prompt_numbers:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompt_numbers)))) as executor:
+        futures = {executor.submit(process_fn, prompt_number): prompt_number for prompt_number in prompt_numbers}
+        for future in as_completed(futures):
+            prompt_number = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[prompt_{prompt_number}] Unexpected error: {e}")
+                result = None
+            yield prompt_number, result
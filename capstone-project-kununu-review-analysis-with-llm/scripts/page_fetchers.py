@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "de-DE,de;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+# status codes of pages that do not exist, e.g. a page number past the last page of reviews
+NOT_FOUND_STATUS_CODES = (404, 410)
+
+
+class PageNotFoundError(Exception):
+    pass
+
+
+class SeleniumPageFetcher:
+    def __init__(self):
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def _get_driver(self):
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            chrome_options = Options()
+            chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--disable-gpu")
+            driver = webdriver.Chrome(options=chrome_options)
+            self._local.driver = driver
+            with self._lock:
+                self._drivers.append(driver)
+        return driver
+
+    def fetch(self, url):
+        driver = self._get_driver()
+        driver.get(url)
+        return driver.page_source
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+class HttpPageFetcher:
+    def __init__(self, pool_size=8, timeout=20):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(HTTP_HEADERS)
+        # keep-alive connections are reused across pages and worker threads
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        if response.status_code in NOT_FOUND_STATUS_CODES:
+            raise PageNotFoundError(f"HTTP {response.status_code} for {url}")
+        if response.status_code != 200:
+            print(f"HTTP {response.status_code} for {url}")
+            return None
+        return response.text
+
+    def close(self):
+        self.session.close()
+
+
+class FallbackPageFetcher:
+    def __init__(self, primary, fallback, is_complete_page):
+        self.primary = primary
+        self.fallback = fallback
+        self.is_complete_page = is_complete_page
+        self.primary_renders_pages = False
+
+    def fetch(self, url):
+        try:
+            page_source = self.primary.fetch(url)
+        except PageNotFoundError:
+            # a browser would not find the page either
+            raise
+        except Exception as e:
+            print(f"Error loading {url} without browser: {e}")
+            page_source = None
+        if page_source is not None:
+            if self.is_complete_page(page_source):
+                self.primary_renders_pages = True
+                return page_source
+            if self.primary_renders_pages:
+                # earlier pages were complete without a browser, so this one is past the last page, not JS-rendered
+                return page_source
+        print(f"Page needs a browser, loading {url} with Selenium")
+        return self.fallback.fetch(url)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+class LocalHtmlFetcher:
+    # serves saved pages from a folder (page_1.html, page_2.html, ...) instead of kununu.com
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+
+    def fetch(self, url):
+        match = re.search(r'/kommentare/(\d+)/?$', urlsplit(url).path)
+        page = int(match.group(1)) if match else 1
+        path = os.path.join(self.fixtures_dir, f"page_{page}.html")
+        if not os.path.exists(path):
+            raise PageNotFoundError(f"No saved page for {url}")
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def close(self):
+        pass
@@ -0,0 +1,33 @@
+import threading
+import time
+from collections import deque
+
+
+class SlidingWindowRateLimiter:
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.period = period
+        self._events = deque()
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._events and now - self._events[0][0] >= self.period:
+            _, amount = self._events.popleft()
+            self._used -= amount
+
+    def acquire(self, amount=1):
+        if not self.limit:
+            return
+        # a single request larger than the whole budget still has to go through eventually
+        amount = min(amount, self.limit)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if self._used + amount <= self.limit:
+                    self._events.append((now, amount))
+                    self._used += amount
+                    return
+                wait = self.period - (now - self._events[0][0])
+            time.sleep(max(wait, 0.01))
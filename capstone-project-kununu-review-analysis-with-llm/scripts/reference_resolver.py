@@ -0,0 +1,95 @@
+import os
+from functools import lru_cache
+
+from incremental_analysis import find_source_data_file
+from review_filtering import (
+    CATEGORY_PROMPT_NUMBERS,
+    FREE_TEXT_SECTIONS,
+    MAPPED_SUBCATEGORIES,
+    OTHER_PROMPT_NUMBER,
+    PROMPT_SUBCATEGORIES,
+)
+from review_index import load_review_index
+from results_loader import load_results
+
+DEFAULT_SNIPPET_LENGTH = 160
+
+
+@lru_cache(maxsize=16)
+def _find_source_for_result(path, mtime, source_file, data_dir):
+    result_data = {"source_file": source_file} if source_file else None
+    return find_source_data_file(path, result_data, data_dir)
+
+
+def load_review_index_for_result(result_path, results=None, data_dir="./data"):
+    # the reviews a result was built from; review_id -> review is a dict lookup in the cached index of that file
+    results = results or load_results(result_path)
+    source_file = results.data.get("source_file") if results else None
+    try:
+        source_path = _find_source_for_result(os.path.abspath(result_path), os.path.getmtime(result_path), source_file,
+                                              os.path.abspath(data_dir))
+        return load_review_index(source_path) if source_path else None
+    except (OSError, ValueError):
+        return None
+
+
+def is_category_section(title, category):
+    prompt_number = CATEGORY_PROMPT_NUMBERS.get(category)
+    if prompt_number == OTHER_PROMPT_NUMBER:
+        return title not in MAPPED_SUBCATEGORIES and title not in FREE_TEXT_SECTIONS
+    return title in PROMPT_SUBCATEGORIES.get(prompt_number, ())
+
+
+def build_review_snippet(review, category=None, subcategory=None, max_length=DEFAULT_SNIPPET_LENGTH):
+    # the rating text of the category, else the free text matching positive/critical, else the title
+    sections = [(title, text) for item in review.get("subcategories") or [] for title, text in item.items() if text]
+    free_text = FREE_TEXT_SECTIONS[1] if subcategory == "critical_points" else FREE_TEXT_SECTIONS[0]
+    text = next((text for title, text in sections if category and is_category_section(title, category)), None)
+    text = text or next((text for title, text in sections if title == free_text), None) or review.get("title") or ""
+    text = " ".join(str(text).split())
+    if len(text) > max_length:
+        text = text[:max_length].rsplit(" ", 1)[0] + " …"
+    return text
+
+
+def resolve_references(references, review_index, category=None, subcategory=None, max_length=DEFAULT_SNIPPET_LENGTH):
+    resolved = []
+    for ref in references or []:
+        review = review_index.get(ref.get("review_id")) if review_index else None
+        resolved.append({
+            **ref,
+            "title": review.get("title") if review else None,
+            "overall_score": review.get("overall_score") if review else None,
+            "snippet": build_review_snippet(review, category, subcategory, max_length) if review else None,
+        })
+    return resolved
+
+
+def resolve_point_references(result_path, category, subcategory, results=None, data_dir="./data"):
+    # the points of a subcategory with every reference extended by title, score and snippet of its review
+    results = results or load_results(result_path)
+    points = results.get_points(category, subcategory) if results else None
+    if points is None:
+        return None
+    review_index = load_review_index_for_result(result_path, results, data_dir)
+    return [
+        {**point, "references": resolve_references(point.get("references"), review_index, category, subcategory)}
+        for point in points
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 4:
+        print("Usage: python reference_resolver.py <result .json file> <category> <positive_points|critical_points>")
+        sys.exit(1)
+
+    points = resolve_point_references(*sys.argv[1:])
+    if points is None:
+        print("Category not found")
+        sys.exit(1)
+    for point in points:
+        print(f"{point['point']} ({point['count']}x)")
+        for ref in point["references"]:
+            print(f"  {ref.get('review_id')}: {ref['snippet'] or '(review not found)'}")
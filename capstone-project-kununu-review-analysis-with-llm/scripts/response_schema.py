@@ -0,0 +1,192 @@
+import json
+import re
+
+from result_merger import POINT_LISTS
+from review_filtering import CATEGORY_PROMPT_NUMBERS
+
+PROMPT_CATEGORIES = {prompt_number: category for category, prompt_number in CATEGORY_PROMPT_NUMBERS.items()}
+
+REFERENCE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "review_id": {"type": "string"},
+        "employee_type": {"type": "string"},
+        "field": {"type": "string"},
+    },
+    "required": ["review_id"],
+}
+
+POINT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "point": {"type": "string"},
+        "count": {"type": "integer"},
+        "references": {"type": "array", "items": REFERENCE_SCHEMA},
+    },
+    "required": ["point", "count", "references"],
+}
+
+# the prompt examples contain trailing commas and unquoted review ids, which models sometimes copy
+TRAILING_COMMA_PATTERN = re.compile(r',(\s*[}\]])')
+UNQUOTED_REVIEW_ID_PATTERN = re.compile(r'("review_id"\s*:\s*)([A-Za-z0-9][\w.\-]*)(\s*[,}\n])')
+
+
+def build_response_schema(category):
+    category_schema = {
+        "type": "object",
+        "properties": {points_key: {"type": "array", "items": POINT_SCHEMA} for points_key in POINT_LISTS},
+        "required": list(POINT_LISTS),
+    }
+    return {"type": "object", "properties": {category: category_schema}, "required": [category]}
+
+
+def get_generation_config(prompt_number):
+    # the API then only produces JSON of this structure, without a ```json block around it
+    category = PROMPT_CATEGORIES.get(prompt_number)
+    if category is None:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": build_response_schema(category)}
+
+
+def validate_point(point):
+    if not isinstance(point, dict):
+        return "is not an object"
+    if not isinstance(point.get("point"), str) or not point["point"].strip():
+        return "has no point text"
+    if not isinstance(point.get("count"), int) or isinstance(point["count"], bool) or point["count"] < 1:
+        return f"has an invalid count {point.get('count')!r}"
+    references = point.get("references")
+    if not isinstance(references, list):
+        return "has no reference list"
+    for ref in references:
+        if not isinstance(ref, dict) or not isinstance(ref.get("review_id"), str):
+            return f"has an invalid reference {ref!r}"
+    return None
+
+
+def validate_category_response(response, category=None):
+    # a list of "path: problem" strings, empty when the response matches the schema
+    if not isinstance(response, dict) or len(response) != 1:
+        return ["response is not an object with exactly one category"]
+    name, category_data = next(iter(response.items()))
+    if category is not None and name != category:
+        return [f"category {name!r} instead of {category!r}"]
+    if not isinstance(category_data, dict):
+        return [f"{name}: is not an object"]
+    errors = []
+    for points_key in POINT_LISTS:
+        points = category_data.get(points_key)
+        if not isinstance(points, list):
+            errors.append(f"{name}.{points_key}: is not a list")
+            continue
+        for i, point in enumerate(points):
+            error = validate_point(point)
+            if error:
+                errors.append(f"{name}.{points_key}[{i}]: {error}")
+    return errors
+
+
+def repair_reference(ref):
+    if isinstance(ref, (str, int)) and not isinstance(ref, bool):
+        return {"review_id": str(ref)}
+    if not isinstance(ref, dict) or not isinstance(ref.get("review_id"), (str, int)) or isinstance(ref.get("review_id"), bool):
+        return None
+    return {**ref, "review_id": str(ref["review_id"])}
+
+
+def repair_point(point):
+    if not isinstance(point, dict) or not isinstance(point.get("point"), str) or not point["point"].strip():
+        return None
+    references = point.get("references")
+    if isinstance(references, dict):
+        references = [references]
+    references = [ref for ref in map(repair_reference, references if isinstance(references, list) else []) if ref]
+    count = point.get("count")
+    try:
+        count = int(count)
+    except (TypeError, ValueError):
+        count = 0
+    if count < 1:
+        count = max(1, len(references))
+    return {**point, "count": count, "references": references}
+
+
+def repair_category_response(response, category=None):
+    # fixes only the fragments that break the schema; points without text cannot be fixed and are dropped
+    if not isinstance(response, dict):
+        return None
+    if all(points_key in response for points_key in POINT_LISTS) and category is not None:
+        # the category object without the category around it
+        response = {category: response}
+    if category is not None and category in response:
+        category_data = response[category]
+    elif len(response) == 1:
+        category_data = next(iter(response.values()))
+    else:
+        return None
+    if not isinstance(category_data, dict):
+        return None
+    name = category if category is not None else next(iter(response))
+    repaired = dict(category_data)
+    for points_key in POINT_LISTS:
+        points = category_data.get(points_key)
+        points = points if isinstance(points, list) else []
+        repaired[points_key] = [point for point in map(repair_point, points) if point is not None]
+    return {name: repaired}
+
+
+def fix_common_json_errors(text):
+    text = UNQUOTED_REVIEW_ID_PATTERN.sub(r'\1"\2"\3', text)
+    return TRAILING_COMMA_PATTERN.sub(r'\1', text)
+
+
+def close_truncated_json(text):
+    # cuts a response that stops in the middle after its last complete point and closes the open lists and objects
+    start = text.find("{")
+    if start < 0:
+        return None
+    stack = []
+    in_string = escaped = False
+    cut = None
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            # root, category and point list are still open after a point
+            if char == "}" and len(stack) == 3:
+                cut = (i + 1, list(stack))
+            if not stack:
+                return None
+    if cut is None:
+        return None
+    end, open_brackets = cut
+    return text[start:end] + "".join("}" if bracket == "{" else "]" for bracket in reversed(open_brackets))
+
+
+def load_json_fragment(text):
+    # json.loads, then the cheap local fixes; None when only the model can repair the text
+    for candidate in (text, fix_common_json_errors(text)):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+    closed = close_truncated_json(fix_common_json_errors(text))
+    if closed is None:
+        return None
+    try:
+        return json.loads(closed)
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,109 @@
+import re
+
+POINT_LISTS = ("positive_points", "critical_points")
+
+
+def normalize_point_text(text):
+    return re.sub(r'\s+', ' ', str(text)).strip().rstrip('.').lower()
+
+
+def merge_references(existing_references, new_references):
+    merged = list(existing_references or [])
+    seen_ids = {ref.get("review_id") for ref in merged if isinstance(ref, dict)}
+    for ref in new_references or []:
+        review_id = ref.get("review_id") if isinstance(ref, dict) else None
+        if review_id is not None and review_id in seen_ids:
+            continue
+        seen_ids.add(review_id)
+        merged.append(ref)
+    return merged
+
+
+def merge_points(existing_points, new_points):
+    merged = [dict(point) for point in existing_points or []]
+    index = {normalize_point_text(point.get("point", "")): point for point in merged}
+    for point in new_points or []:
+        if not isinstance(point, dict) or "point" not in point:
+            continue
+        key = normalize_point_text(point["point"])
+        if key in index:
+            target = index[key]
+            target["count"] = target.get("count", 0) + point.get("count", 0)
+            target["references"] = merge_references(target.get("references"), point.get("references"))
+        else:
+            new_point = dict(point)
+            new_point["references"] = list(point.get("references") or [])
+            merged.append(new_point)
+            index[key] = new_point
+    merged.sort(key=lambda p: p.get("count", 0), reverse=True)
+    return merged
+
+
+def merge_category(existing_category, new_category):
+    merged = dict(existing_category)
+    for points_key in POINT_LISTS:
+        merged[points_key] = merge_points(existing_category.get(points_key), new_category.get(points_key))
+    return merged
+
+
+def is_valid_category_response(response):
+    if not isinstance(response, dict) or "raw_response" in response or len(response) != 1:
+        return False
+    return isinstance(next(iter(response.values())), dict)
+
+
+def merge_category_responses(existing_responses, new_responses):
+    merged = [dict(response) for response in existing_responses or []]
+    positions = {next(iter(response)): i for i, response in enumerate(merged) if is_valid_category_response(response)}
+    for response in new_responses or []:
+        if not is_valid_category_response(response):
+            continue
+        category, category_data = next(iter(response.items()))
+        if category in positions:
+            i = positions[category]
+            merged[i] = {category: merge_category(merged[i][category], category_data)}
+        else:
+            positions[category] = len(merged)
+            merged.append({category: merge_category({}, category_data)})
+    return merged
+
+
+def remap_references(categories, id_map, drop_unmapped=False):
+    for response in categories:
+        if not is_valid_category_response(response):
+            continue
+        category_data = next(iter(response.values()))
+        for points_key in POINT_LISTS:
+            remapped_points = []
+            for point in category_data.get(points_key) or []:
+                references = []
+                removed = 0
+                for ref in point.get("references") or []:
+                    review_id = ref.get("review_id") if isinstance(ref, dict) else None
+                    if review_id in id_map:
+                        ref["review_id"] = id_map[review_id]
+                        references.append(ref)
+                    elif drop_unmapped:
+                        removed += 1
+                    else:
+                        references.append(ref)
+                point["references"] = references
+                point["count"] = max(0, point.get("count", 0) - removed)
+                if point["count"] > 0:
+                    remapped_points.append(point)
+            category_data[points_key] = remapped_points
+    return categories
+
+
+def collect_referenced_review_ids(categories):
+    review_ids = set()
+    for response in categories:
+        if not is_valid_category_response(response):
+            continue
+        category_data = next(iter(response.values()))
+        for points_key in POINT_LISTS:
+            for point in category_data.get(points_key) or []:
+                for ref in point.get("references") or []:
+                    if isinstance(ref, dict) and ref.get("review_id"):
+                        review_ids.add(ref["review_id"])
+    return review_ids
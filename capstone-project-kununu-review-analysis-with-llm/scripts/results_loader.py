@@ -0,0 +1,60 @@
+import hashlib
+import os
+from functools import lru_cache
+
+from review_store import load_result_data
+
+
+class LoadedResults:
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        # category -> subcategory -> points, so lookups do not scan the categories list
+        self.index = {}
+        for cat in data.get("categories", []):
+            if not isinstance(cat, dict):
+                continue
+            for category, category_data in cat.items():
+                if isinstance(category_data, dict):
+                    self.index.setdefault(category, category_data)
+
+    @property
+    def categories(self):
+        return list(self.index)
+
+    def get_points(self, category, subcategory):
+        return self.index.get(category, {}).get(subcategory)
+
+
+@lru_cache(maxsize=16)
+def _load_results(path, mtime):
+    return LoadedResults(path, load_result_data(path))
+
+
+def load_results(path):
+    # keyed by modification time, so a rewritten result file is parsed again; the module stays imported between
+    # Streamlit reruns, so the cache does as well
+    try:
+        return _load_results(os.path.abspath(path), os.path.getmtime(path))
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=64)
+def _file_sha256(path, mtime):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_sha256(path):
+    return _file_sha256(os.path.abspath(path), os.path.getmtime(path))
+
+
+def get_points(json_file_path, category, subcategory, results=None):
+    results = results or load_results(json_file_path)
+    if results is None:
+        return None
+    return results.get_points(category, subcategory)
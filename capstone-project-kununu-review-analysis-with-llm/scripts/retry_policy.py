@@ -0,0 +1,162 @@
+import random
+import re
+import threading
+import time
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 120.0
+# a quota that frees up later than this is treated as exhausted for the run instead of waited for
+DEFAULT_MAX_PAUSE = 600.0
+DEFAULT_MAX_QUOTA_ERRORS = 5
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+QUOTA = "quota"
+
+QUOTA_STATUS_CODES = {429}
+FATAL_STATUS_CODES = {400, 401, 403, 404}
+# Gemini puts the hint into the error text, e.g. "retry_delay { seconds: 39 }" or "Please retry in 39.2s"
+RETRY_AFTER_PATTERNS = (
+    re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)'),
+    re.compile(r'retry in ([\d.]+)\s*s\b', re.IGNORECASE),
+)
+
+
+class FatalResponseError(Exception):
+    pass
+
+
+class RetryableResponseError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def get_status_code(error):
+    # google.api_core errors carry the HTTP status as an int
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def get_retry_after(error):
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is not None and headers.get("Retry-After"):
+        try:
+            return float(headers.get("Retry-After"))
+        except ValueError:
+            pass
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def classify_error(error):
+    if isinstance(error, FatalResponseError):
+        return FATAL
+    if isinstance(error, RetryableResponseError):
+        return RETRYABLE
+    status_code = get_status_code(error)
+    if status_code in QUOTA_STATUS_CODES:
+        return QUOTA
+    if status_code in FATAL_STATUS_CODES:
+        return FATAL
+    # response.text raises ValueError when the response has no text, e.g. a blocked prompt
+    if isinstance(error, ValueError):
+        return FATAL
+    return RETRYABLE
+
+
+class CircuitBreaker:
+    def __init__(self, max_quota_errors=DEFAULT_MAX_QUOTA_ERRORS, max_pause=DEFAULT_MAX_PAUSE):
+        self.max_quota_errors = max_quota_errors
+        self.max_pause = max_pause
+        self._quota_errors = 0
+        self._paused_until = 0.0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return time.monotonic() < self._open_until
+
+    def wait(self):
+        # every worker waits out a pause; while the circuit is open requests fail immediately
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._open_until:
+                    raise CircuitOpenError(f"API quota exhausted, no requests for {self._open_until - now:.0f}s")
+                wait = self._paused_until - now
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self._quota_errors = 0
+
+    def record_quota_error(self, pause):
+        with self._lock:
+            self._quota_errors += 1
+            now = time.monotonic()
+            if pause > self.max_pause or self._quota_errors >= self.max_quota_errors:
+                self._open_until = now + max(pause, self.max_pause)
+                return False
+            self._paused_until = max(self._paused_until, now + pause)
+            return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 jitter=0.5, circuit_breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        # shared by every request that uses this policy, so one quota error pauses all workers
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def get_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            # spread the workers a little, so they do not all hit the API again at the same moment
+            return retry_after + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def call(self, fn, label):
+        attempt = 0
+        while True:
+            attempt += 1
+            self.circuit_breaker.wait()
+            try:
+                result = fn()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == FATAL:
+                    print(f"[prompt_{label}] {e} (not retried)")
+                    raise
+                delay = self.get_delay(attempt, get_retry_after(e))
+                if kind == QUOTA and not self.circuit_breaker.record_quota_error(delay):
+                    print(f"[prompt_{label}] Quota exhausted, stopping all requests: {e}")
+                    raise CircuitOpenError(f"API quota exhausted: {e}") from e
+                if attempt >= self.max_attempts:
+                    print(f"[prompt_{label}] Max retries ({self.max_attempts}) reached: {e}")
+                    raise
+                if kind == QUOTA:
+                    # the circuit breaker pauses every worker, circuit_breaker.wait() does the sleeping
+                    print(f"[prompt_{label}] Quota exceeded, pausing all requests for {delay:.1f}s")
+                else:
+                    print(f"[prompt_{label}] {e}. Retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                    time.sleep(delay)
+            else:
+                self.circuit_breaker.record_success()
+                return result
@@ -0,0 +1,40 @@
+from llm_scheduler import estimate_tokens
+from review_encoding import DEFAULT_PROMPT_FORMAT, serialize_review
+
+DEFAULT_BATCH_TOKEN_BUDGET = 30000
+
+
+def count_reviews(input_data):
+    return sum(len(reviews) for reviews in input_data.values())
+
+
+def split_reviews_into_batches(input_data, max_tokens_per_batch=DEFAULT_BATCH_TOKEN_BUDGET, prompt_format=DEFAULT_PROMPT_FORMAT):
+    batches = []
+    current_batch = {}
+    current_tokens = 0
+    for url, reviews in input_data.items():
+        for review in reviews:
+            review_tokens = estimate_tokens(serialize_review(review, prompt_format))
+            if current_batch and current_tokens + review_tokens > max_tokens_per_batch:
+                batches.append(current_batch)
+                current_batch = {}
+                current_tokens = 0
+            current_batch.setdefault(url, []).append(review)
+            current_tokens += review_tokens
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
+def split_batch_in_half(batch):
+    reviews = [(url, review) for url, url_reviews in batch.items() for review in url_reviews]
+    if len(reviews) < 2:
+        return None
+    middle = len(reviews) // 2
+    halves = []
+    for part in (reviews[:middle], reviews[middle:]):
+        half = {}
+        for url, review in part:
+            half.setdefault(url, []).append(review)
+        halves.append(half)
+    return halves
@@ -0,0 +1,71 @@
+import json
+import re
+
+from llm_scheduler import estimate_tokens
+from review_filtering import filter_reviews_for_prompt
+
+PROMPT_FORMATS = ("compact", "json")
+DEFAULT_PROMPT_FORMAT = "compact"
+
+FIELD_PATTERN = re.compile(r'im Bereich (.+?) bei ')
+FIELD_NOT_SPECIFIED = "Not specified"
+
+COMPACT_DATA_HEADER = (
+    "Hier sind die zu analysierenden Daten. Jede Zeile ist eine Bewertung im JSON-Format mit den Schlüsseln "
+    "id = review_id, typ = employee_type, bereich = field, titel = Titel der Bewertung, "
+    "texte = Textabschnitte der Bewertung:\n"
+)
+JSON_DATA_HEADER = "Hier sind die zu analysierenden Daten:\n"
+
+
+def extract_field(position):
+    if not position:
+        return FIELD_NOT_SPECIFIED
+    match = FIELD_PATTERN.search(position)
+    return match.group(1).strip() if match else FIELD_NOT_SPECIFIED
+
+
+def compact_review(review):
+    # kn_url, score, date and the full position sentence are never used by the prompts
+    texts = {}
+    for subcategory in review.get("subcategories") or []:
+        texts.update(subcategory)
+    return {
+        "id": review.get("review_id"),
+        "typ": review.get("employee_type"),
+        "bereich": extract_field(review.get("position")),
+        "titel": review.get("title"),
+        "texte": texts,
+    }
+
+
+def serialize_review(review, prompt_format=DEFAULT_PROMPT_FORMAT):
+    if prompt_format == "compact":
+        return json.dumps(compact_review(review), ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(review, ensure_ascii=False, indent=2)
+
+
+def encode_input_data(input_data, prompt_format=DEFAULT_PROMPT_FORMAT):
+    if prompt_format == "compact":
+        lines = [serialize_review(review, prompt_format) for reviews in input_data.values() for review in reviews]
+        return COMPACT_DATA_HEADER + "\n".join(lines)
+    return JSON_DATA_HEADER + json.dumps(input_data, ensure_ascii=False, indent=2)
+
+
+def estimate_token_savings(input_data, prompt_numbers, prompt_format=DEFAULT_PROMPT_FORMAT, prefilter=False):
+    full_tokens = estimate_tokens(encode_input_data(input_data, "json")) * len(prompt_numbers)
+    encoded_tokens = 0
+    for prompt_number in prompt_numbers:
+        prompt_data = filter_reviews_for_prompt(input_data, prompt_number) if prefilter else input_data
+        encoded_tokens += estimate_tokens(encode_input_data(prompt_data, prompt_format))
+    return full_tokens, encoded_tokens
+
+
+def format_token_savings(input_data, prompt_numbers, prompt_format=DEFAULT_PROMPT_FORMAT, prefilter=False):
+    prompt_numbers = list(prompt_numbers)
+    full_tokens, encoded_tokens = estimate_token_savings(input_data, prompt_numbers, prompt_format, prefilter)
+    saved = full_tokens - encoded_tokens
+    percent = 100 * saved / full_tokens if full_tokens else 0
+    method = f"'{prompt_format}' format" + (" with per-prompt filtering" if prefilter else "")
+    return (f"Review data: ~{encoded_tokens:,} input tokens over {len(prompt_numbers)} prompts using {method} "
+            f"instead of ~{full_tokens:,} (-{percent:.0f}%)")
@@ -0,0 +1,73 @@
+FREE_TEXT_SECTIONS = (
+    "Gut am Arbeitgeber finde ich",
+    "Schlecht am Arbeitgeber finde ich",
+    "Verbesserungsvorschläge",
+)
+
+# Kununu subcategory headings per prompt, including the headings of trainee reviews
+# (Spaßfaktor, Die Ausbilder, Ausbildungsvergütung, Respekt, Variation, ...)
+PROMPT_SUBCATEGORIES = {
+    1: ("Arbeitsatmosphäre", "Kollegenzusammenhalt", "Spaßfaktor"),
+    2: ("Image",),
+    3: ("Work-Life-Balance", "Arbeitszeiten"),
+    4: ("Karriere/Weiterbildung", "Karrierechancen", "Die Ausbilder"),
+    5: ("Gehalt/Sozialleistungen", "Ausbildungsvergütung"),
+    6: ("Umwelt-/Sozialbewusstsein",),
+    7: ("Umgang mit älteren Kollegen",),
+    8: ("Vorgesetztenverhalten", "Respekt"),
+    9: ("Arbeitsbedingungen",),
+    10: ("Kommunikation",),
+    11: ("Gleichberechtigung",),
+    12: ("Interessante Aufgaben", "Aufgaben/Tätigkeiten", "Variation"),
+}
+# prompt 13 (Sonstiges) gets every heading that no other prompt covers
+OTHER_PROMPT_NUMBER = 13
+
+# the category key each prompt asks the model to return
+CATEGORY_PROMPT_NUMBERS = {
+    "arbeitsatmosphaere": 1,
+    "image": 2,
+    "work_life_balance": 3,
+    "karriere_weiterbildung": 4,
+    "gehalt_sozialleistungen": 5,
+    "umwelt_sozialbewusstsein": 6,
+    "umgang_aeltere_kollegen": 7,
+    "vorgesetztenverhalten": 8,
+    "arbeitsbedingungen": 9,
+    "kommunikation": 10,
+    "gleichberechtigung": 11,
+    "interessante_aufgaben": 12,
+    "sonstiges": 13,
+}
+
+MAPPED_SUBCATEGORIES = {title for titles in PROMPT_SUBCATEGORIES.values() for title in titles}
+
+
+def is_relevant_subcategory(title, prompt_number):
+    if title in FREE_TEXT_SECTIONS:
+        return True
+    if prompt_number == OTHER_PROMPT_NUMBER:
+        return title not in MAPPED_SUBCATEGORIES
+    if prompt_number not in PROMPT_SUBCATEGORIES:
+        return True
+    return title in PROMPT_SUBCATEGORIES[prompt_number]
+
+
+def filter_review_for_prompt(review, prompt_number):
+    subcategories = [
+        subcategory for subcategory in review.get("subcategories") or []
+        if all(is_relevant_subcategory(title, prompt_number) for title in subcategory)
+    ]
+    if not subcategories:
+        return None
+    filtered = dict(review)
+    filtered["subcategories"] = subcategories
+    return filtered
+
+
+def filter_reviews_for_prompt(input_data, prompt_number):
+    filtered_data = {}
+    for url, reviews in input_data.items():
+        filtered_reviews = [filter_review_for_prompt(review, prompt_number) for review in reviews]
+        filtered_data[url] = [review for review in filtered_reviews if review is not None]
+    return filtered_data
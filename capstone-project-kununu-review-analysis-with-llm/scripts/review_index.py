@@ -0,0 +1,87 @@
+import os
+from collections import Counter
+from functools import lru_cache
+
+from review_store import load_review_data
+
+
+class ReviewIndex:
+    def __init__(self, path, data):
+        self.path = path
+        self.reviews = [review for review_list in data.values() for review in review_list]
+        self.by_id = {}
+        self.by_employee_type = {}
+        self.by_year = {}
+        self.by_year_month = {}
+        for position, review in enumerate(self.reviews):
+            self.by_id[review.get("review_id")] = position
+            self.by_employee_type.setdefault(review.get("employee_type"), []).append(position)
+            self.by_year.setdefault(review.get("year"), []).append(position)
+            self.by_year_month.setdefault((review.get("year"), review.get("month")), []).append(position)
+        self.scores = [review.get("overall_score") for review in self.reviews]
+
+        # review ids are "<company>_<number>"; the prefix lets the page look up a review by its number
+        prefixes = Counter(str(review_id).rsplit("_", 1)[0] for review_id in self.by_id if review_id)
+        self.id_prefix = prefixes.most_common(1)[0][0] if prefixes else None
+
+    def __len__(self):
+        return len(self.reviews)
+
+    @property
+    def employee_types(self):
+        return sorted(employee_type for employee_type in self.by_employee_type if employee_type)
+
+    @property
+    def years(self):
+        return sorted((year for year in self.by_year if year is not None), reverse=True)
+
+    def find_review_id(self, review_number):
+        return f"{self.id_prefix}_{review_number}" if self.id_prefix else None
+
+    def get(self, review_id):
+        position = self.by_id.get(review_id)
+        return self.reviews[position] if position is not None else None
+
+    def query(self, employee_type=None, year=None, month=None, min_score=None, max_score=None, review_id=None):
+        # positions in file order; the most selective index is used first and the others only filter its result
+        if review_id is not None:
+            positions = [self.by_id[review_id]] if review_id in self.by_id else []
+        elif year is not None and month is not None:
+            positions = self.by_year_month.get((year, month), [])
+        elif year is not None:
+            positions = self.by_year.get(year, [])
+        elif employee_type is not None:
+            positions = self.by_employee_type.get(employee_type, [])
+        else:
+            positions = range(len(self.reviews))
+
+        result = []
+        for position in positions:
+            review = self.reviews[position]
+            if employee_type is not None and review.get("employee_type") != employee_type:
+                continue
+            if year is not None and review.get("year") != year:
+                continue
+            if month is not None and review.get("month") != month:
+                continue
+            score = self.scores[position]
+            if min_score is not None and (score is None or score < min_score):
+                continue
+            if max_score is not None and (score is None or score > max_score):
+                continue
+            result.append(position)
+        return result
+
+    def page(self, positions, page_number, page_size):
+        start = (page_number - 1) * page_size
+        return [self.reviews[position] for position in positions[start:start + page_size]]
+
+
+@lru_cache(maxsize=8)
+def _load_review_index(path, mtime):
+    return ReviewIndex(path, load_review_data(path))
+
+
+def load_review_index(path):
+    # rebuilt only when the file changes; shared by all reruns and sessions of the app
+    return _load_review_index(os.path.abspath(path), os.path.getmtime(path))
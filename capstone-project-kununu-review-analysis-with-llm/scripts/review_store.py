@@ -0,0 +1,456 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from contextlib import closing
+from functools import lru_cache
+
+DEFAULT_REVIEW_STORE_PATH = "./cache/reviews.sqlite"
+FILE_NAME_PATTERN = re.compile(r'^(scraped_reviews|result)_(.+)_\d{8}_\d{6}\.json$')
+REVIEW_COLUMNS = ("kn_url", "overall_score", "title", "year", "month", "employee_type", "position")
+POINT_KEYS = ("point", "count", "references")
+REFERENCE_KEYS = ("review_id", "employee_type", "field")
+# result file names end with their timestamp, so the largest name is the newest analysis of a company
+LATEST_RESULTS_SQL = (
+    "SELECT MAX(id) FROM results r WHERE file_name = (SELECT MAX(file_name) FROM results WHERE company = r.company) "
+    "GROUP BY company"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrapes (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    company TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    list_urls TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    company TEXT NOT NULL,
+    content_key TEXT NOT NULL,
+    kn_url TEXT,
+    overall_score REAL,
+    title TEXT,
+    year INTEGER,
+    month INTEGER,
+    employee_type TEXT,
+    position TEXT,
+    extra TEXT,
+    UNIQUE (company, content_key)
+);
+CREATE INDEX IF NOT EXISTS reviews_company ON reviews (company, employee_type, year);
+CREATE TABLE IF NOT EXISTS review_sections (
+    review_id INTEGER NOT NULL REFERENCES reviews (id),
+    position INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    text TEXT,
+    PRIMARY KEY (review_id, position)
+);
+CREATE TABLE IF NOT EXISTS scrape_reviews (
+    scrape_id INTEGER NOT NULL REFERENCES scrapes (id),
+    review_order INTEGER NOT NULL,
+    list_url TEXT NOT NULL,
+    review_key TEXT,
+    review_id INTEGER NOT NULL REFERENCES reviews (id),
+    PRIMARY KEY (scrape_id, review_order)
+);
+CREATE INDEX IF NOT EXISTS scrape_reviews_key ON scrape_reviews (scrape_id, review_key);
+CREATE INDEX IF NOT EXISTS scrape_reviews_review ON scrape_reviews (review_id);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    company TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    source_file TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS result_categories (
+    result_id INTEGER NOT NULL REFERENCES results (id),
+    position INTEGER NOT NULL,
+    category TEXT,
+    subcategories TEXT,
+    raw TEXT,
+    PRIMARY KEY (result_id, position)
+);
+CREATE TABLE IF NOT EXISTS points (
+    id INTEGER PRIMARY KEY,
+    result_id INTEGER NOT NULL REFERENCES results (id),
+    category_position INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    subcategory TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    point TEXT,
+    count INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS points_result ON points (result_id, category_position, subcategory, position);
+CREATE INDEX IF NOT EXISTS points_category ON points (category, subcategory);
+CREATE TABLE IF NOT EXISTS point_references (
+    point_id INTEGER NOT NULL REFERENCES points (id),
+    position INTEGER NOT NULL,
+    review_key TEXT,
+    employee_type TEXT,
+    field TEXT,
+    extra TEXT,
+    PRIMARY KEY (point_id, position)
+);
+CREATE INDEX IF NOT EXISTS point_references_key ON point_references (review_key);
+"""
+
+
+def parse_company_name(path):
+    match = FILE_NAME_PATTERN.match(os.path.basename(path))
+    return match.group(2) if match else os.path.splitext(os.path.basename(path))[0]
+
+
+def review_content_key(review):
+    # review_ids are renumbered on every scrape, so the same review of two scrapes is stored once
+    content = {key: value for key, value in review.items() if key != "review_id"}
+    serialized = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+def split_extra(item, known_keys):
+    extra = {key: value for key, value in item.items() if key not in known_keys}
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+def is_list_of_dicts(value):
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def is_standard_category(cat):
+    # {category: {subcategory: [point, ...]}}; anything else (e.g. unparsed raw responses) is kept as JSON
+    if not isinstance(cat, dict) or len(cat) != 1:
+        return False
+    category_data = next(iter(cat.values()))
+    if not isinstance(category_data, dict):
+        return False
+    for points in category_data.values():
+        if not is_list_of_dicts(points):
+            return False
+        for point in points:
+            if not isinstance(point.get("point", ""), str) or not is_list_of_dicts(point.get("references", [])):
+                return False
+    return True
+
+
+class ReviewStore:
+    def __init__(self, path=DEFAULT_REVIEW_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _find_file(self, conn, table, path):
+        return conn.execute(f"SELECT id, mtime FROM {table} WHERE path = ?", (os.path.abspath(path),)).fetchone()
+
+    def is_current(self, path):
+        table = "results" if os.path.basename(path).startswith("result_") else "scrapes"
+        with closing(self._connect()) as conn:
+            row = self._find_file(conn, table, path)
+        return row is not None and row["mtime"] == os.path.getmtime(path)
+
+    def sync_file(self, path):
+        # imports the file unless the stored copy has the same modification time
+        if self.is_current(path):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if os.path.basename(path).startswith("result_"):
+            self.import_result(path, data)
+        else:
+            self.import_scrape(path, data)
+        return True
+
+    def import_scrape(self, path, data):
+        company = parse_company_name(path)
+        with closing(self._connect()) as conn, conn:
+            self._remove_scrape(conn, path)
+            cursor = conn.execute(
+                "INSERT INTO scrapes (path, file_name, company, mtime, list_urls) VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(path), os.path.basename(path), company, os.path.getmtime(path), json.dumps(list(data))),
+            )
+            scrape_id = cursor.lastrowid
+            review_order = 0
+            for list_url, reviews in data.items():
+                for review in reviews:
+                    review_id = self._add_review(conn, company, review)
+                    conn.execute(
+                        "INSERT INTO scrape_reviews (scrape_id, review_order, list_url, review_key, review_id) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (scrape_id, review_order, list_url, review.get("review_id"), review_id),
+                    )
+                    review_order += 1
+        return scrape_id
+
+    def _add_review(self, conn, company, review):
+        content_key = review_content_key(review)
+        row = conn.execute("SELECT id FROM reviews WHERE company = ? AND content_key = ?",
+                           (company, content_key)).fetchone()
+        if row is not None:
+            return row["id"]
+        cursor = conn.execute(
+            "INSERT INTO reviews (company, content_key, kn_url, overall_score, title, year, month, employee_type, "
+            "position, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (company, content_key, *[review.get(column) for column in REVIEW_COLUMNS],
+             split_extra(review, ("review_id", "subcategories") + REVIEW_COLUMNS)),
+        )
+        sections = []
+        for subcategory in review.get("subcategories") or []:
+            sections.extend(subcategory.items())
+        conn.executemany(
+            "INSERT INTO review_sections (review_id, position, section, text) VALUES (?, ?, ?, ?)",
+            [(cursor.lastrowid, position, section, text) for position, (section, text) in enumerate(sections)],
+        )
+        return cursor.lastrowid
+
+    def _remove_scrape(self, conn, path):
+        row = self._find_file(conn, "scrapes", path)
+        if row is None:
+            return
+        conn.execute("DELETE FROM scrape_reviews WHERE scrape_id = ?", (row["id"],))
+        conn.execute("DELETE FROM scrapes WHERE id = ?", (row["id"],))
+        # reviews that are no longer part of any scrape
+        orphans = "SELECT id FROM reviews WHERE id NOT IN (SELECT review_id FROM scrape_reviews)"
+        conn.execute(f"DELETE FROM review_sections WHERE review_id IN ({orphans})")
+        conn.execute(f"DELETE FROM reviews WHERE id IN ({orphans})")
+
+    def import_result(self, path, data):
+        with closing(self._connect()) as conn, conn:
+            self._remove_result(conn, path)
+            source_file = data.get("source_file")
+            cursor = conn.execute(
+                "INSERT INTO results (path, file_name, company, mtime, source_file, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(path), os.path.basename(path), parse_company_name(path), os.path.getmtime(path),
+                 os.path.basename(source_file) if source_file else None, split_extra(data, ("categories",))),
+            )
+            result_id = cursor.lastrowid
+            for category_position, cat in enumerate(data.get("categories", [])):
+                if not is_standard_category(cat):
+                    conn.execute("INSERT INTO result_categories (result_id, position, raw) VALUES (?, ?, ?)",
+                                 (result_id, category_position, json.dumps(cat, ensure_ascii=False)))
+                    continue
+                category, category_data = next(iter(cat.items()))
+                conn.execute(
+                    "INSERT INTO result_categories (result_id, position, category, subcategories) VALUES (?, ?, ?, ?)",
+                    (result_id, category_position, category, json.dumps(list(category_data), ensure_ascii=False)),
+                )
+                for subcategory, points in category_data.items():
+                    for position, point in enumerate(points):
+                        self._add_point(conn, result_id, category_position, category, subcategory, position, point)
+        return result_id
+
+    def _add_point(self, conn, result_id, category_position, category, subcategory, position, point):
+        cursor = conn.execute(
+            "INSERT INTO points (result_id, category_position, category, subcategory, position, point, count, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (result_id, category_position, category, subcategory, position, point.get("point"), point.get("count"),
+             split_extra(point, POINT_KEYS)),
+        )
+        conn.executemany(
+            "INSERT INTO point_references (point_id, position, review_key, employee_type, field, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(cursor.lastrowid, ref_position, ref.get("review_id"), ref.get("employee_type"), ref.get("field"),
+              split_extra(ref, REFERENCE_KEYS))
+             for ref_position, ref in enumerate(point.get("references", []))],
+        )
+
+    def _remove_result(self, conn, path):
+        row = self._find_file(conn, "results", path)
+        if row is None:
+            return
+        point_ids = "SELECT id FROM points WHERE result_id = ?"
+        conn.execute(f"DELETE FROM point_references WHERE point_id IN ({point_ids})", (row["id"],))
+        conn.execute("DELETE FROM points WHERE result_id = ?", (row["id"],))
+        conn.execute("DELETE FROM result_categories WHERE result_id = ?", (row["id"],))
+        conn.execute("DELETE FROM results WHERE id = ?", (row["id"],))
+
+    def import_directories(self, data_dir="./data", results_dir="./results"):
+        imported = 0
+        for pattern in (os.path.join(data_dir, "scraped_reviews_*.json"), os.path.join(results_dir, "result_*.json")):
+            for path in sorted(glob.glob(pattern)):
+                try:
+                    imported += self.sync_file(path)
+                except (OSError, ValueError) as e:
+                    print(f"Could not import {path}: {e}")
+        return imported
+
+    def load_scrape(self, path):
+        # the same structure as the scraped_reviews_*.json file
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id, list_urls FROM scrapes WHERE path = ?", (os.path.abspath(path),)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute(
+                "SELECT sr.list_url, sr.review_key, r.* FROM scrape_reviews sr JOIN reviews r ON r.id = sr.review_id "
+                "WHERE sr.scrape_id = ? ORDER BY sr.review_order", (row["id"],),
+            ).fetchall()
+            sections = {}
+            for section in conn.execute(
+                "SELECT s.review_id, s.section, s.text FROM review_sections s WHERE s.review_id IN "
+                "(SELECT review_id FROM scrape_reviews WHERE scrape_id = ?) ORDER BY s.review_id, s.position",
+                (row["id"],),
+            ):
+                sections.setdefault(section["review_id"], []).append({section["section"]: section["text"]})
+
+        data = {list_url: [] for list_url in json.loads(row["list_urls"])}
+        for review_row in rows:
+            review = {"review_id": review_row["review_key"]}
+            review.update((column, review_row[column]) for column in REVIEW_COLUMNS)
+            if review_row["extra"]:
+                review.update(json.loads(review_row["extra"]))
+            review["subcategories"] = sections.get(review_row["id"], [])
+            data[review_row["list_url"]].append(review)
+        return data
+
+    def load_result(self, path):
+        # the same structure as the result_*.json file
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id, extra FROM results WHERE path = ?", (os.path.abspath(path),)).fetchone()
+            if row is None:
+                return None
+            category_rows = conn.execute(
+                "SELECT position, category, subcategories, raw FROM result_categories WHERE result_id = ? "
+                "ORDER BY position", (row["id"],),
+            ).fetchall()
+            point_rows = conn.execute(
+                "SELECT id, category_position, subcategory, point, count, extra FROM points WHERE result_id = ? "
+                "ORDER BY category_position, subcategory, position", (row["id"],),
+            ).fetchall()
+            references = {}
+            for ref in conn.execute(
+                "SELECT point_id, review_key, employee_type, field, extra FROM point_references WHERE point_id IN "
+                "(SELECT id FROM points WHERE result_id = ?) ORDER BY point_id, position", (row["id"],),
+            ):
+                reference = {"review_id": ref["review_key"], "employee_type": ref["employee_type"], "field": ref["field"]}
+                if ref["extra"]:
+                    reference.update(json.loads(ref["extra"]))
+                references.setdefault(ref["point_id"], []).append(reference)
+
+        categories = []
+        points_by_category = {}
+        for category_row in category_rows:
+            if category_row["raw"] is not None:
+                categories.append(json.loads(category_row["raw"]))
+                continue
+            category_data = {subcategory: [] for subcategory in json.loads(category_row["subcategories"])}
+            points_by_category[category_row["position"]] = category_data
+            categories.append({category_row["category"]: category_data})
+        for point_row in point_rows:
+            point = {"point": point_row["point"], "count": point_row["count"],
+                     "references": references.get(point_row["id"], [])}
+            if point_row["extra"]:
+                point.update(json.loads(point_row["extra"]))
+            points_by_category[point_row["category_position"]][point_row["subcategory"]].append(point)
+
+        data = {"categories": categories}
+        if row["extra"]:
+            data.update(json.loads(row["extra"]))
+        return data
+
+    def companies(self):
+        with closing(self._connect()) as conn:
+            return [row["company"] for row in conn.execute(
+                "SELECT company FROM scrapes UNION SELECT company FROM results ORDER BY company")]
+
+    def category_summary(self, category=None, subcategory=None):
+        # points and mentions per company and category over the latest result of every company
+        with closing(self._connect()) as conn:
+            sql = (
+                "SELECT r.company, p.category, p.subcategory, COUNT(*) AS points, SUM(p.count) AS mentions "
+                "FROM points p JOIN results r ON r.id = p.result_id "
+                f"WHERE p.result_id IN ({LATEST_RESULTS_SQL})"
+            )
+            params = []
+            if category is not None:
+                sql += " AND p.category = ?"
+                params.append(category)
+            if subcategory is not None:
+                sql += " AND p.subcategory = ?"
+                params.append(subcategory)
+            sql += " GROUP BY r.company, p.category, p.subcategory ORDER BY r.company, p.category, p.subcategory"
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def review_summary(self):
+        # reviews, average score and employee types per company over all stored scrapes, without duplicates
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT company, employee_type, COUNT(*) AS reviews, ROUND(AVG(overall_score), 2) AS average_score "
+                "FROM reviews GROUP BY company, employee_type ORDER BY company, reviews DESC"
+            )]
+
+
+@lru_cache(maxsize=None)
+def get_review_store(path=DEFAULT_REVIEW_STORE_PATH):
+    return ReviewStore(path)
+
+
+def load_json_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_to_review_store(path):
+    try:
+        get_review_store().sync_file(path)
+    except Exception as e:
+        print(f"Could not add {path} to the review store: {e}")
+
+
+def load_review_data(path):
+    # scraped reviews through the store; the JSON file is imported first if it is new or was rewritten
+    try:
+        store = get_review_store()
+        store.sync_file(path)
+        data = store.load_scrape(path)
+        if data is not None:
+            return data
+    except sqlite3.Error as e:
+        print(f"Review store unavailable ({e}), reading {path} directly")
+    return load_json_file(path)
+
+
+def load_result_data(path):
+    try:
+        store = get_review_store()
+        store.sync_file(path)
+        data = store.load_result(path)
+        if data is not None:
+            return data
+    except sqlite3.Error as e:
+        print(f"Review store unavailable ({e}), reading {path} directly")
+    return load_json_file(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import scrapes and results into the review store and query it")
+    parser.add_argument("command", choices=["import", "reviews", "points"])
+    parser.add_argument("--category")
+    parser.add_argument("--subcategory")
+    parser.add_argument("--store", default=DEFAULT_REVIEW_STORE_PATH)
+    args = parser.parse_args()
+
+    store = ReviewStore(args.store)
+    imported = store.import_directories()
+    print(f"{imported} files imported")
+    if args.command == "import":
+        sys.exit(0)
+
+    rows = store.review_summary() if args.command == "reviews" else store.category_summary(args.category, args.subcategory)
+    for row in rows:
+        print(" | ".join(str(value) for value in row.values()))
@@ -0,0 +1,107 @@
+import glob
+import json
+import os
+
+
+def save_reviews(results, save_path):
+    with open(save_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def get_stream_paths(save_path):
+    base_path = os.path.splitext(save_path)[0]
+    # deliberately not *.json, so the data folder listings only show finished scrapes
+    return base_path + ".jsonl", base_path + ".checkpoint"
+
+
+def load_checkpoint(save_path):
+    _, checkpoint_path = get_stream_paths(save_path)
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_resumable_scrape(company_name, data_dir="./data"):
+    checkpoints = glob.glob(os.path.join(data_dir, f"scraped_reviews_{company_name}_*.checkpoint"))
+    if not checkpoints:
+        return None
+    latest = max(checkpoints, key=os.path.getmtime)
+    return os.path.splitext(latest)[0] + ".json"
+
+
+class ReviewListSink:
+    def __init__(self, save_path):
+        self.save_path = save_path
+        self.reviews = []
+
+    @property
+    def count(self):
+        return len(self.reviews)
+
+    def add(self, page_reviews, next_page=None, next_page_url=None):
+        self.reviews.extend(page_reviews)
+
+    def close(self):
+        pass
+
+    def finish(self, kn_url):
+        results = {kn_url: self.reviews}
+        save_reviews(results, self.save_path)
+        return results
+
+
+class ReviewStreamSink:
+    def __init__(self, save_path, resume=False):
+        self.save_path = save_path
+        self.jsonl_path, self.checkpoint_path = get_stream_paths(save_path)
+        self.checkpoint = load_checkpoint(save_path) if resume else None
+        self.count = self.checkpoint["review_counter"] if self.checkpoint else 0
+        if self.checkpoint:
+            self._truncate_to_checkpoint()
+        self._file = open(self.jsonl_path, "a" if self.checkpoint else "w", encoding="utf-8")
+
+    def _truncate_to_checkpoint(self):
+        # reviews written after the last checkpoint are scraped again on resume
+        tmp_path = self.jsonl_path + ".tmp"
+        kept = 0
+        with open(self.jsonl_path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                if kept >= self.count:
+                    break
+                if line.strip():
+                    dst.write(line)
+                    kept += 1
+        os.replace(tmp_path, self.jsonl_path)
+        self.count = kept
+
+    def add(self, page_reviews, next_page=None, next_page_url=None):
+        for review in page_reviews:
+            self._file.write(json.dumps(review) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.count += len(page_reviews)
+
+        checkpoint = {"next_page": next_page, "next_page_url": next_page_url, "review_counter": self.count}
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def finish(self, kn_url):
+        self.close()
+        with open(self.jsonl_path, "r", encoding="utf-8") as f:
+            reviews = [json.loads(line) for line in f if line.strip()]
+        # written next to the target and moved, so a crash never leaves a half written scrape in the data folder
+        tmp_path = self.save_path + ".tmp"
+        save_reviews({kn_url: reviews}, tmp_path)
+        os.replace(tmp_path, self.save_path)
+        # the finished JSON holds every review, the stream files were only needed to resume
+        for path in (self.checkpoint_path, self.jsonl_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return {kn_url: reviews}
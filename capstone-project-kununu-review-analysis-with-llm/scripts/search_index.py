@@ -0,0 +1,225 @@
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+from contextlib import closing
+
+from review_store import load_result_data, load_review_data
+
+DEFAULT_SEARCH_INDEX_PATH = "./cache/search.sqlite"
+DOCUMENT_KINDS = ("review", "point")
+FILE_NAME_PATTERN = re.compile(r'^(scraped_reviews|result)_(.+)_\d{8}_\d{6}\.json$')
+# German spellings without umlauts ("aeltere", "Strasse") also find the umlaut forms
+TRANSLITERATIONS = (("ae", "ä"), ("oe", "ö"), ("ue", "ü"), ("ss", "ß"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    kind TEXT NOT NULL,
+    company TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    company TEXT NOT NULL,
+    review_id TEXT,
+    section TEXT,
+    count INTEGER,
+    reference_ids TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_source ON documents (source);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, text, tokenize = "unicode61 remove_diacritics 2"
+);
+"""
+
+
+def parse_source_file_name(path):
+    match = FILE_NAME_PATTERN.match(os.path.basename(path))
+    if not match:
+        return None, None
+    kind = "review" if match.group(1) == "scraped_reviews" else "point"
+    return kind, match.group(2)
+
+
+def iter_review_documents(data):
+    for reviews in data.values():
+        for review in reviews:
+            sections = []
+            for subcategory in review.get("subcategories") or []:
+                for section, text in subcategory.items():
+                    sections.append(f"{section}: {text}")
+            yield {
+                "review_id": review.get("review_id"),
+                "section": review.get("employee_type"),
+                "count": None,
+                "reference_ids": None,
+                "title": review.get("title") or "",
+                "text": "\n".join(sections),
+            }
+
+
+def iter_point_documents(data):
+    for cat in data.get("categories", []):
+        if not isinstance(cat, dict):
+            continue
+        for category, category_data in cat.items():
+            if not isinstance(category_data, dict):
+                continue
+            for subcategory, points in category_data.items():
+                if not isinstance(points, list):
+                    continue
+                for point in points:
+                    reference_ids = [ref.get("review_id") for ref in point.get("references") or [] if ref.get("review_id")]
+                    yield {
+                        "review_id": None,
+                        "section": f"{category}/{subcategory}",
+                        "count": point.get("count"),
+                        "reference_ids": json.dumps(reference_ids),
+                        "title": category.replace("_", " "),
+                        "text": point.get("point") or "",
+                    }
+
+
+def build_match_query(query, prefix=True):
+    # every word has to occur; each word matches its transliterated spellings and, with prefix, longer words
+    clauses = []
+    for term in re.findall(r'\w+', query.lower()):
+        variants = {term}
+        for plain, umlaut in TRANSLITERATIONS:
+            variants |= {variant.replace(plain, umlaut) for variant in variants}
+        suffix = "*" if prefix else ""
+        clauses.append("(" + " OR ".join(f'"{variant}"{suffix}' for variant in sorted(variants)) + ")")
+    return " AND ".join(clauses)
+
+
+class SearchIndex:
+    def __init__(self, path=DEFAULT_SEARCH_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _remove_source(self, conn, path):
+        conn.execute("DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE source = ?)", (path,))
+        conn.execute("DELETE FROM documents WHERE source = ?", (path,))
+        conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def _add_source(self, conn, path, mtime, kind, company):
+        if kind == "review":
+            documents = iter_review_documents(load_review_data(path))
+        else:
+            documents = iter_point_documents(load_result_data(path))
+        count = 0
+        for document in documents:
+            cursor = conn.execute(
+                "INSERT INTO documents (source, kind, company, review_id, section, count, reference_ids) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, kind, company, document["review_id"], document["section"], document["count"],
+                 document["reference_ids"]),
+            )
+            conn.execute("INSERT INTO documents_fts (rowid, title, text) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, document["title"], document["text"]))
+            count += 1
+        conn.execute("INSERT INTO sources (path, mtime, kind, company) VALUES (?, ?, ?, ?)", (path, mtime, kind, company))
+        return count
+
+    def update(self, data_dir="./data", results_dir="./results", latest_only=True):
+        # only new or changed files are (re)indexed; with latest_only older scrapes and results of a company are
+        # dropped, so a review does not show up once per scrape
+        latest = {}
+        for pattern in (os.path.join(data_dir, "scraped_reviews_*.json"), os.path.join(results_dir, "result_*.json")):
+            for path in glob.glob(pattern):
+                kind, company = parse_source_file_name(path)
+                if kind is None:
+                    continue
+                key = (kind, company) if latest_only else path
+                if key not in latest or os.path.basename(path) > os.path.basename(latest[key][0]):
+                    latest[key] = (os.path.abspath(path), kind, company)
+
+        wanted = {path: (kind, company) for path, kind, company in latest.values()}
+        added = removed = 0
+        with closing(self._connect()) as conn, conn:
+            indexed = {row["path"]: row["mtime"] for row in conn.execute("SELECT path, mtime FROM sources")}
+            for path in indexed:
+                if path not in wanted:
+                    self._remove_source(conn, path)
+                    removed += 1
+            for path, (kind, company) in wanted.items():
+                mtime = os.path.getmtime(path)
+                if indexed.get(path) == mtime:
+                    continue
+                if path in indexed:
+                    self._remove_source(conn, path)
+                added += self._add_source(conn, path, mtime, kind, company)
+        return added, removed
+
+    def search(self, query, kind=None, company=None, limit=20, prefix=True):
+        match_query = build_match_query(query, prefix)
+        if not match_query:
+            return []
+        sql = (
+            "SELECT d.kind, d.company, d.review_id, d.section, d.count, d.reference_ids, d.source, "
+            "documents_fts.title AS title, snippet(documents_fts, 1, '**', '**', ' … ', 16) AS snippet, "
+            "bm25(documents_fts, 2.0, 1.0) AS score "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params = [match_query]
+        if kind is not None:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        if company is not None:
+            sql += " AND d.company = ?"
+            params.append(company)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        hits = []
+        for row in rows:
+            hit = dict(row)
+            hit["reference_ids"] = json.loads(hit["reference_ids"]) if hit["reference_ids"] else []
+            hits.append(hit)
+        return hits
+
+    def companies(self):
+        with closing(self._connect()) as conn:
+            return [row["company"] for row in conn.execute("SELECT DISTINCT company FROM sources ORDER BY company")]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Full-text search over scraped reviews and extracted points")
+    parser.add_argument("query", nargs="?", help="words to search for; leave out to only update the index")
+    parser.add_argument("--kind", choices=DOCUMENT_KINDS)
+    parser.add_argument("--company")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--all-files", action="store_true", help="index every scrape and result, not only the latest")
+    parser.add_argument("--index", default=DEFAULT_SEARCH_INDEX_PATH)
+    args = parser.parse_args()
+
+    search_index = SearchIndex(args.index)
+    added, removed = search_index.update(latest_only=not args.all_files)
+    print(f"Index updated: {added} documents added, {removed} files removed")
+    if not args.query:
+        sys.exit(0)
+
+    start = time.perf_counter()
+    hits = search_index.search(args.query, args.kind, args.company, args.limit)
+    print(f"{len(hits)} hits in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for hit in hits:
+        label = hit["review_id"] or f"{hit['section']} ({hit['count']}x)"
+        print(f"[{hit['kind']}] {hit['company']} {label}: {hit['snippet']}")
@@ -0,0 +1,151 @@
+from retry_policy import RetryableResponseError
+
+POINT_LIST_KEYS = ("positive_points", "critical_points")
+# prose of this length without a JSON object means the model ignored the format
+MAX_PREAMBLE_CHARS = 300
+JSON_FENCE = "```json"
+
+
+class InvalidStreamError(RetryableResponseError):
+    pass
+
+
+class StreamingJsonValidator:
+    # checks the {category: {positive_points: [point, ...], critical_points: [...]}} structure while the response
+    # arrives, so broken output is detected after a few hundred characters instead of after the whole response
+    def __init__(self):
+        self.text = ""
+        self.points = 0
+        self.started = False
+        self.complete = False
+        self._position = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._string_is_key = False
+        self._key = []
+        self._expect_value = False
+
+    @property
+    def depth(self):
+        return len(self._stack)
+
+    def feed(self, chunk):
+        self.text += chunk
+        if not self.started:
+            self._find_start()
+        if self.started and not self.complete:
+            self._scan()
+
+    def finish(self):
+        if not self.started:
+            raise InvalidStreamError("Response contains no JSON object")
+        if not self.complete:
+            raise InvalidStreamError(f"Response ended inside the JSON at depth {self.depth}")
+
+    def _find_start(self):
+        start = self.text.find("{")
+        if start < 0:
+            if len(self.text.strip()) > MAX_PREAMBLE_CHARS:
+                raise InvalidStreamError("Response does not start with a JSON object")
+            return
+        # extract_json_from_response only finds the object behind text if it is inside a ```json block
+        preamble = self.text[:start].strip()
+        if preamble and not preamble.endswith(JSON_FENCE):
+            raise InvalidStreamError(f"Unexpected text before the JSON object: {preamble[:50]!r}")
+        self.started = True
+        self._position = start
+
+    def _fail(self, message):
+        raise InvalidStreamError(f"{message} at character {self._position}")
+
+    def _scan(self):
+        text = self.text
+        while self._position < len(text) and not self.complete:
+            char = text[self._position]
+            if self._in_string:
+                self._scan_string_char(char)
+            elif not char.isspace():
+                self._scan_char(char)
+            self._position += 1
+
+    def _scan_string_char(self, char):
+        if self._escaped:
+            self._escaped = False
+        elif char == "\\":
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._stack[-1]["key"] = "".join(self._key)
+                self._check_key(self._stack[-1]["key"])
+            return
+        if self._string_is_key:
+            self._key.append(char)
+
+    def _check_key(self, key):
+        # depth 1 holds the category, depth 2 its point lists
+        if self.depth == 2 and key not in POINT_LIST_KEYS:
+            self._fail(f"Unexpected key {key!r} instead of {' / '.join(POINT_LIST_KEYS)}")
+
+    def _check_value_start(self, char):
+        if self.depth == 1 and char != "{":
+            self._fail("Category is not an object")
+        if self.depth == 2 and char != "[":
+            self._fail("Point list is not a list")
+        if self.depth == 3 and char != "{":
+            self._fail("Point is not an object")
+
+    def _scan_char(self, char):
+        top = self._stack[-1] if self._stack else None
+        in_object = top is not None and top["type"] == "{"
+        if top is None and char != "{":
+            self._fail("Expected a JSON object")
+
+        if in_object and top["expect_key"]:
+            if char == '"':
+                self._in_string = True
+                self._string_is_key = True
+                self._key = []
+                top["expect_key"] = False
+                return
+            if char == "}" and top["key"] is None:
+                self._close("{")
+                return
+            self._fail("Expected a key")
+
+        if char == ":":
+            if not in_object or top["key"] is None:
+                self._fail("Unexpected ':'")
+            self._expect_value = True
+            return
+        if char == ",":
+            if in_object:
+                top["expect_key"] = True
+                top["key"] = None
+            self._expect_value = top is not None and top["type"] == "["
+            return
+        if char in "}]":
+            self._close("{" if char == "}" else "[")
+            return
+
+        if self._expect_value or top is None or top["type"] == "[":
+            if top is not None:
+                self._check_value_start(char)
+            self._expect_value = False
+        if char in "{[":
+            self._stack.append({"type": char, "key": None, "expect_key": char == "{"})
+            self._expect_value = char == "["
+        elif char == '"':
+            self._in_string = True
+            self._string_is_key = False
+
+    def _close(self, opening):
+        if not self._stack or self._stack[-1]["type"] != opening:
+            self._fail(f"Unbalanced '{'}' if opening == '{' else ']'}'")
+        self._stack.pop()
+        self._expect_value = False
+        if opening == "{" and self.depth == 3:
+            self.points += 1
+        if not self._stack:
+            self.complete = True
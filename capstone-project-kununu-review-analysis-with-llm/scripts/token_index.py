@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+
+from results_loader import file_sha256
+
+TOKEN_INDEX_DIRNAME = "token_index"
+TOKEN_INDEX_VERSION = 1
+
+GERMAN_STOPWORDS = {
+    'der', 'die', 'das', 'den', 'dem', 'des', 'ein', 'eine', 'einer', 'eines', 'einem', 'einen',
+    'und', 'oder', 'aber', 'doch', 'dann', 'wenn', 'als', 'wie', 'so', 'auch', 'noch', 'nur',
+    'schon', 'sehr', 'mehr', 'nach', 'vor', 'bei', 'mit', 'ohne', 'durch', 'für', 'gegen',
+    'über', 'unter', 'zwischen', 'während', 'seit', 'bis', 'von', 'zu', 'an', 'auf', 'in',
+    'ist', 'sind', 'war', 'waren', 'wird', 'werden', 'wurde', 'wurden', 'hat', 'haben',
+    'hatte', 'hatten', 'kann', 'können', 'konnte', 'konnten', 'muss', 'müssen', 'musste',
+    'sollte', 'sollen', 'wollte', 'wollen', 'würde', 'würden', 'könnte', 'könnten',
+    'ich', 'du', 'er', 'sie', 'es', 'wir', 'ihr', 'man', 'sich', 'mich', 'dir', 'ihm',
+    'uns', 'euch', 'ihnen', 'diesem', 'dieser', 'dieses', 'diese', 'jeder', 'jede', 'jedes',
+    'alle', 'alles', 'viele', 'wenige', 'einige', 'andere', 'anderer', 'anderes',
+    'dass', 'weil', 'damit', 'obwohl', 'während', 'bevor', 'nachdem', 'sobald'
+}
+
+
+def tokenize_text_for_wordcloud(text, min_word_length=3):
+    text = text.lower()
+    text = re.sub(r'[^\w\säöüß]', ' ', text)
+    words = text.split()
+    return [
+        word for word in words
+        if len(word) >= min_word_length and word not in GERMAN_STOPWORDS and not word.isdigit()
+    ]
+
+
+def merge_plural_counts(frequencies):
+    # same rule as WordCloud.generate: "xs" is counted as "x" when both occur, except for words ending in "ss"
+    for word in list(frequencies):
+        if word.endswith('s') and not word.endswith('ss') and word[:-1] in frequencies:
+            frequencies[word[:-1]] += frequencies.pop(word)
+    return frequencies
+
+
+def extract_frequencies_from_points(points_data, weight_by_frequency=True):
+    # one entry per distinct word, weighted by the point counts, instead of repeating each text count times
+    frequencies = Counter()
+    for point in points_data:
+        weight = point['count'] if weight_by_frequency else 1
+        if weight <= 0:
+            continue
+        for word in tokenize_text_for_wordcloud(point['point']):
+            frequencies[word] += weight
+    return merge_plural_counts(frequencies)
+
+
+def build_token_index(combined_data):
+    index = {}
+    for cat in combined_data.get("categories", []):
+        if not isinstance(cat, dict):
+            continue
+        for category, category_data in cat.items():
+            if not isinstance(category_data, dict) or category in index:
+                continue
+            index[category] = {}
+            for subcategory, points in category_data.items():
+                if isinstance(points, list):
+                    frequencies = extract_frequencies_from_points(points, weight_by_frequency=True)
+                    # [word, weight] pairs, heaviest first, so top-N queries only read the head of the list
+                    index[category][subcategory] = [[word, weight] for word, weight in frequencies.most_common()]
+    return index
+
+
+def get_token_index_path(result_path):
+    # a subfolder, so the *.json listings of ./results do not show it as a result file
+    base_name = os.path.splitext(os.path.basename(result_path))[0]
+    return os.path.join(os.path.dirname(result_path), TOKEN_INDEX_DIRNAME, f"{base_name}.tokens.json")
+
+
+def write_token_index(combined_data, result_path):
+    index_path = get_token_index_path(result_path)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    token_index = {
+        "version": TOKEN_INDEX_VERSION,
+        "result_sha256": file_sha256(result_path),
+        "categories": build_token_index(combined_data),
+    }
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(token_index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+@lru_cache(maxsize=16)
+def _load_token_index(index_path, mtime):
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_token_index(result_path):
+    index_path = get_token_index_path(result_path)
+    try:
+        token_index = _load_token_index(os.path.abspath(index_path), os.path.getmtime(index_path))
+        # an index of an older version or of a result file that was changed afterwards is ignored
+        if token_index.get("version") != TOKEN_INDEX_VERSION or token_index.get("result_sha256") != file_sha256(result_path):
+            return None
+    except (OSError, ValueError):
+        return None
+    return token_index["categories"]
+
+
+def get_token_frequencies(result_path, category, subcategory):
+    token_index = load_token_index(result_path)
+    if token_index is None:
+        return None
+    pairs = token_index.get(category, {}).get(subcategory)
+    return dict(pairs) if pairs is not None else None
+
+
+def get_top_tokens(result_path, category, subcategory, limit=20):
+    token_index = load_token_index(result_path)
+    if token_index is None:
+        return None
+    return [tuple(pair) for pair in token_index.get(category, {}).get(subcategory, [])[:limit]]
+
+
+if __name__ == "__main__":
+    # builds the token index for result files written before it existed
+    if len(sys.argv) < 2:
+        print("Usage: python token_index.py <result .json files>")
+        sys.exit(1)
+    for result_path in sys.argv[1:]:
+        with open(result_path, "r", encoding="utf-8") as f:
+            combined_data = json.load(f)
+        print(f"Token index saved to: {write_token_index(combined_data, result_path)}")
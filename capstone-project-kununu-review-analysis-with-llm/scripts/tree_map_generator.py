@@ -1,6 +1,13 @@
-import json
+import html
+
 import plotly.graph_objects as go
 
+from reference_resolver import load_review_index_for_result, resolve_references
+from results_loader import get_points, load_results
+
+# a hover box taller than the treemap is cut off, so only the first reviews get a snippet
+MAX_HOVER_REFERENCES = 5
+
 def wrap_text_for_plotly(text, max_chars_per_line=20):
     if len(text) <= max_chars_per_line:
         return text
@@ -32,23 +39,24 @@ def calculate_optimal_size(num_points, total_count):
     height = max(600, min(1200, height))
     return width, height
 
-def get_treemap_figure(json_file_path, category, subcategory, width=None, height=None):
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-    except Exception:
-        return None
-
-    categories = data.get('categories', [])
-    category_data = None
-    for cat in categories:
-        if category in cat:
-            category_data = cat[category]
-            break
-    if not category_data or subcategory not in category_data:
+def format_reference_hover(references, review_index, category, subcategory):
+    resolved = resolve_references(references[:MAX_HOVER_REFERENCES], review_index, category, subcategory)
+    lines = []
+    for ref in resolved:
+        line = f"<b>{html.escape(str(ref.get('review_id')))}</b>"
+        if ref["snippet"]:
+            line += ": " + wrap_text_for_plotly(html.escape(ref["snippet"]), 60)
+        lines.append(line)
+    if len(references) > MAX_HOVER_REFERENCES:
+        remaining_ids = ", ".join(html.escape(str(ref.get('review_id'))) for ref in references[MAX_HOVER_REFERENCES:])
+        lines.append(wrap_text_for_plotly(f"and {len(references) - MAX_HOVER_REFERENCES} more: {remaining_ids}", 60))
+    return "<br>".join(lines)
+
+def get_treemap_figure(json_file_path, category, subcategory, width=None, height=None, results=None, review_index=None):
+    results = results or load_results(json_file_path)
+    points_data = get_points(json_file_path, category, subcategory, results)
+    if points_data is None:
         return None
-
-    points_data = category_data[subcategory]
     if not points_data:
         return None
 
@@ -84,15 +92,19 @@ def get_treemap_figure(json_file_path, category, subcategory, width=None, height
     colors.append(root_color)
     hover_texts.append(f"<b>{category.replace('_', ' ').title()} - {subcategory.replace('_', ' ').title()}</b><br>Total Points: {num_points}<br>Total Mentions: {total_count}")
 
+    if review_index is None:
+        review_index = load_review_index_for_result(json_file_path, results)
+
     sorted_points = sorted(points_data, key=lambda x: x['count'], reverse=True)
     for i, point in enumerate(sorted_points):
         point_text = point['point']
         references = point.get('references', [])
         hover_text = f"<b>{point_text}</b>"
         if references and isinstance(references, list):
-            review_ids = [ref.get('review_id') for ref in references if ref.get('review_id')]
-            if review_ids:
-                hover_text += "<br><br><b>Review IDs:</b><br>" + "<br>".join(review_ids)
+            references = [ref for ref in references if isinstance(ref, dict) and ref.get('review_id')]
+            if references:
+                hover_text += "<br><br><b>Reviews:</b><br>" + format_reference_hover(references, review_index, category,
+                                                                                    subcategory)
 
         point_id = f"{root_id}_point_{i}"
 
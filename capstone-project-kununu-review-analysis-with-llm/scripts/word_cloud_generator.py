@@ -1,30 +1,33 @@
-import json
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 from pathlib import Path
-import re
-from collections import Counter
 import random
 import colorsys
+import hashlib
+import os
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
-GERMAN_STOPWORDS = {
-    'der', 'die', 'das', 'den', 'dem', 'des', 'ein', 'eine', 'einer', 'eines', 'einem', 'einen',
-    'und', 'oder', 'aber', 'doch', 'dann', 'wenn', 'als', 'wie', 'so', 'auch', 'noch', 'nur',
-    'schon', 'sehr', 'mehr', 'nach', 'vor', 'bei', 'mit', 'ohne', 'durch', 'für', 'gegen',
-    'über', 'unter', 'zwischen', 'während', 'seit', 'bis', 'von', 'zu', 'an', 'auf', 'in',
-    'ist', 'sind', 'war', 'waren', 'wird', 'werden', 'wurde', 'wurden', 'hat', 'haben',
-    'hatte', 'hatten', 'kann', 'können', 'konnte', 'konnten', 'muss', 'müssen', 'musste',
-    'sollte', 'sollen', 'wollte', 'wollen', 'würde', 'würden', 'könnte', 'könnten',
-    'ich', 'du', 'er', 'sie', 'es', 'wir', 'ihr', 'man', 'sich', 'mich', 'dir', 'ihm',
-    'uns', 'euch', 'ihnen', 'diesem', 'dieser', 'dieses', 'diese', 'jeder', 'jede', 'jedes',
-    'alle', 'alles', 'viele', 'wenige', 'einige', 'andere', 'anderer', 'anderes',
-    'dass', 'weil', 'damit', 'obwohl', 'während', 'bevor', 'nachdem', 'sobald'
-}
+from PIL import Image
+
+from results_loader import file_sha256, get_points, load_results
+from token_index import (
+    GERMAN_STOPWORDS,
+    extract_frequencies_from_points,
+    get_token_frequencies,
+    tokenize_text_for_wordcloud,
+)
+
+WORDCLOUD_CACHE_DIR = "./cache/wordclouds"
+# bump when the rendering changes, so old images are not served from the cache
+WORDCLOUD_RENDER_VERSION = "1"
 
 def create_custom_color_function(color_scheme='critical'):
     def color_func(word, font_size, position, orientation, random_state=None, **kwargs):
-        word_seed = hash(word) % 1000
+        # crc32 instead of hash(), which differs between processes and would change the colors of cached images
+        word_seed = zlib.crc32(word.encode('utf-8')) % 1000
         random.seed(word_seed)
         if color_scheme == 'critical':
             hue = random.uniform(0, 20)
@@ -39,46 +42,20 @@ def create_custom_color_function(color_scheme='critical'):
     return color_func
 
 def preprocess_text_for_wordcloud(text, min_word_length=3):
-    text = text.lower()
-    text = re.sub(r'[^\w\säöüß]', ' ', text)
-    words = text.split()
-    filtered_words = [
-        word for word in words
-        if len(word) >= min_word_length and word not in GERMAN_STOPWORDS and not word.isdigit()
-    ]
-    return ' '.join(filtered_words)
-
-def extract_text_from_points(points_data, weight_by_frequency=True):
-    combined_text = []
-    for point in points_data:
-        text = point['point']
-        count = point['count']
-        processed_text = preprocess_text_for_wordcloud(text)
-        if weight_by_frequency:
-            combined_text.extend([processed_text] * count)
-        else:
-            combined_text.append(processed_text)
-    return ' '.join(combined_text)
-
-def get_wordcloud_image(json_file_path, category, subcategory, width=800, height=600, max_words=100):
-    try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-    except Exception:
-        return None
+    return ' '.join(tokenize_text_for_wordcloud(text, min_word_length))
 
-    categories = data.get('categories', [])
-    category_data = None
-    for cat in categories:
-        if category in cat:
-            category_data = cat[category]
-            break
-    if not category_data or subcategory not in category_data:
+def get_wordcloud_frequencies(json_file_path, category, subcategory, results=None):
+    # precomputed by combine_json_responses; older result files without a token index are tokenized here
+    frequencies = get_token_frequencies(json_file_path, category, subcategory)
+    if frequencies is not None:
+        return frequencies
+    points_data = get_points(json_file_path, category, subcategory, results)
+    if points_data is None:
         return None
+    return extract_frequencies_from_points(points_data, weight_by_frequency=True)
 
-    points_data = category_data[subcategory]
-    text_for_wordcloud = extract_text_from_points(points_data, weight_by_frequency=True)
-    if not text_for_wordcloud.strip():
+def render_wordcloud_png(frequencies, subcategory, width=800, height=600, max_words=100):
+    if not frequencies:
         return None
 
     color_scheme = 'critical' if subcategory == 'critical_points' else 'positive'
@@ -94,8 +71,94 @@ def get_wordcloud_image(json_file_path, category, subcategory, width=800, height
             collocations=False,
             prefer_horizontal=0.7,
             min_word_length=3
-        ).generate(text_for_wordcloud)
+        ).generate_from_frequencies(frequencies)
     except Exception:
         return None
 
-    return wordcloud.to_image()
+    buffer = BytesIO()
+    wordcloud.to_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def get_wordcloud_cache_path(json_file_path, category, subcategory, width, height, max_words,
+                             cache_dir=WORDCLOUD_CACHE_DIR):
+    try:
+        file_hash = file_sha256(json_file_path)
+    except OSError:
+        return None
+    key = "\0".join([WORDCLOUD_RENDER_VERSION, file_hash, category, subcategory, str(width), str(height), str(max_words)])
+    return os.path.join(cache_dir, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.png')
+
+def read_cached_image(cache_path):
+    if cache_path is None or not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as file:
+            image = Image.open(BytesIO(file.read()))
+            image.load()
+            return image
+    except Exception:
+        return None
+
+def write_cached_image(cache_path, png_bytes):
+    if cache_path is None or png_bytes is None:
+        return
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(png_bytes)
+    os.replace(tmp_path, cache_path)
+
+def get_wordcloud_image(json_file_path, category, subcategory, width=800, height=600, max_words=100, results=None,
+                        use_cache=True):
+    cache_path = get_wordcloud_cache_path(json_file_path, category, subcategory, width, height, max_words) if use_cache else None
+    image = read_cached_image(cache_path)
+    if image is not None:
+        return image
+
+    frequencies = get_wordcloud_frequencies(json_file_path, category, subcategory, results)
+    png_bytes = render_wordcloud_png(frequencies, subcategory, width, height, max_words)
+    if png_bytes is None:
+        return None
+    write_cached_image(cache_path, png_bytes)
+    return Image.open(BytesIO(png_bytes))
+
+def get_wordcloud_images(json_file_path, subcategories_by_category, width=800, height=600, max_words=100, results=None,
+                         use_cache=True, max_workers=None):
+    results = results or load_results(json_file_path)
+    if results is None:
+        return {}
+
+    images = {}
+    missing = []
+    for category, subcategories in subcategories_by_category:
+        for subcategory in subcategories:
+            cache_path = get_wordcloud_cache_path(json_file_path, category, subcategory, width, height,
+                                                  max_words) if use_cache else None
+            image = read_cached_image(cache_path)
+            if image is not None:
+                images[(category, subcategory)] = image
+                continue
+            frequencies = get_wordcloud_frequencies(json_file_path, category, subcategory, results)
+            if frequencies:
+                missing.append((category, subcategory, frequencies, cache_path))
+
+    if not missing:
+        return images
+
+    # layout and rasterization are CPU bound, so the missing images are rendered on all cores
+    render_args = [(frequencies, subcategory, width, height, max_words) for _, subcategory, frequencies, _ in missing]
+    try:
+        # spawn instead of fork: the Streamlit process runs worker threads, SQLite connections and gRPC channels,
+        # and a forked child can hang on a lock another thread held at fork time
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            rendered = list(executor.map(render_wordcloud_png, *zip(*render_args)))
+    except Exception as e:
+        print(f"Rendering word clouds in parallel failed ({e}), rendering them one by one")
+        rendered = [render_wordcloud_png(*args) for args in render_args]
+
+    for (category, subcategory, _, cache_path), png_bytes in zip(missing, rendered):
+        if png_bytes is None:
+            continue
+        write_cached_image(cache_path, png_bytes)
+        images[(category, subcategory)] = Image.open(BytesIO(png_bytes))
+    return images
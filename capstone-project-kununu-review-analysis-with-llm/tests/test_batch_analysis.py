@@ -0,0 +1,94 @@
+import glob
+import json
+import os
+
+import pytest
+
+import llm_analyzer
+from fake_model import FakeGenerativeModel, build_fake_response_text
+from llm_analyzer import AnalyzerSession, process_individual_prompts
+from response_cache import ResponseCache, make_cache_key
+from review_encoding import DEFAULT_PROMPT_FORMAT
+from review_filtering import filter_reviews_for_prompt
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS_DIR = os.path.join(PROJECT_DIR, "prompts")
+PROMPT_NUMBER = 1
+BATCH_TOKEN_BUDGET = 1500
+
+
+@pytest.fixture
+def input_data():
+    data_file = sorted(glob.glob(os.path.join(PROJECT_DIR, "data", "*.json")))[0]
+    with open(data_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    url = next(iter(data))
+    return {url: data[url][:20]}
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    # responses are saved to ./responses
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def analyze(input_data, model, cache):
+    session = AnalyzerSession(model=model, prompts_dir=PROMPTS_DIR)
+    return process_individual_prompts(input_data, PROMPT_NUMBER, "batchtest", "x", None, session=session, cache=cache,
+                                      batch_token_budget=BATCH_TOKEN_BUDGET)
+
+
+def get_cached(cache, input_data):
+    template = llm_analyzer.load_prompt_template(f"prompt_{PROMPT_NUMBER}", PROMPTS_DIR)
+    filtered = filter_reviews_for_prompt(input_data, PROMPT_NUMBER)
+    return cache.get(make_cache_key(template, "fake-model", filtered, DEFAULT_PROMPT_FORMAT))
+
+
+def response_file(work_dir):
+    return work_dir / "responses" / "response_batchtest_x" / f"response_batchtest_x_{PROMPT_NUMBER}.json"
+
+
+def test_complete_batches_are_saved_and_cached(work_dir, input_data):
+    cache = ResponseCache(cache_dir=str(work_dir / "cache"))
+    model = FakeGenerativeModel(latency=0)
+
+    result = analyze(input_data, model, cache)
+
+    assert result is not None and model.calls > 1
+    assert response_file(work_dir).exists()
+    assert get_cached(cache, input_data) == result
+
+
+def test_failed_batch_fails_the_whole_prompt(work_dir, input_data):
+    cache = ResponseCache(cache_dir=str(work_dir / "cache"))
+    failing_review = input_data[next(iter(input_data))][-1]["review_id"]
+
+    def response_fn(prompt):
+        # a blocked response is not retried, so the batch with this review fails after one request
+        if failing_review in prompt:
+            raise ValueError("Response has no text")
+        return build_fake_response_text(prompt)
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn)
+
+    assert analyze(input_data, model, cache) is None
+    assert model.calls > 1
+    assert not response_file(work_dir).exists()
+    assert get_cached(cache, input_data) is None
+
+
+def test_unexpected_batch_error_fails_the_whole_prompt(work_dir, input_data, monkeypatch):
+    cache = ResponseCache(cache_dir=str(work_dir / "cache"))
+    parse_or_repair_response = llm_analyzer.parse_or_repair_response
+
+    def failing_parse(model, response_text, prompt_label, *args):
+        if str(prompt_label).endswith(".2"):
+            raise RuntimeError("unexpected")
+        return parse_or_repair_response(model, response_text, prompt_label, *args)
+
+    monkeypatch.setattr(llm_analyzer, "parse_or_repair_response", failing_parse)
+
+    assert analyze(input_data, FakeGenerativeModel(latency=0), cache) is None
+    assert not response_file(work_dir).exists()
+    assert get_cached(cache, input_data) is None
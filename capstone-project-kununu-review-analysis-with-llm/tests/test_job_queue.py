@@ -0,0 +1,27 @@
+from job_queue import JobQueue
+
+
+def test_requeue_only_takes_back_jobs_of_the_same_owner(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    app_queue = JobQueue(path, owner="app")
+    pipeline_queue = JobQueue(path, owner="pipeline")
+    app_job = app_queue.enqueue("analyze", "a", {})
+    pipeline_job = pipeline_queue.enqueue("analyze", "b", {})
+    assert app_queue.claim("analyze")["id"] == app_job
+    assert pipeline_queue.claim("analyze")["id"] == pipeline_job
+
+    # the pipeline starting up again leaves the job the app is still working on alone
+    assert pipeline_queue.requeue_running() == 1
+    assert app_queue.get_job(app_job)["status"] == "running"
+    assert app_queue.get_job(pipeline_job)["status"] == "pending"
+    assert app_queue.get_job(app_job)["owner"] == "app"
+
+
+def test_requeue_takes_back_jobs_claimed_before_owners_existed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    old_queue = JobQueue(path)
+    job_id = old_queue.enqueue("scrape", "a", {})
+    old_queue.claim("scrape")
+
+    assert JobQueue(path, owner="pipeline").requeue_running() == 1
+    assert old_queue.get_job(job_id)["status"] == "pending"
@@ -0,0 +1,154 @@
+import json
+import os
+
+import pytest
+
+import kununu_scraper
+from kununu_scraper import build_page_url, find_page_number, get_all_reviews_for_url, get_all_reviews_parallel
+from page_fetchers import FallbackPageFetcher, LocalHtmlFetcher
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "kununu_pages")
+KN_URL = "https://www.kununu.com/de/fixture-ag/kommentare"
+FIXTURE_REVIEWS = 10
+EMPTY_PAGE_HTML = '<!DOCTYPE html><html lang="de"><body><p>Keine weiteren Bewertungen</p></body></html>'
+
+
+@pytest.fixture(autouse=True)
+def scrape_dir(tmp_path, monkeypatch):
+    # the review store is written to ./cache, and the fixture reviews must not age out of the two year window
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kununu_scraper, "is_review_within_last_2_years", lambda year, month: True)
+    return tmp_path
+
+
+def scrape_serial(save_path, **options):
+    return get_all_reviews_for_url(KN_URL, save_path=str(save_path), fetcher=LocalHtmlFetcher(FIXTURES_DIR),
+                                   seconds_between_pages=0, **options)
+
+
+def scrape_parallel(save_path, **options):
+    return get_all_reviews_parallel(KN_URL, save_path=str(save_path), fetcher=LocalHtmlFetcher(FIXTURES_DIR),
+                                    requests_per_second=1000, **options)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2, 4])
+@pytest.mark.parametrize("max_reviews", [3, 6, 100])
+def test_parallel_scrape_matches_serial_scrape(scrape_dir, max_workers, max_reviews):
+    serial = scrape_serial(scrape_dir / "serial.json", max_reviews=max_reviews)
+    parallel = scrape_parallel(scrape_dir / "parallel.json", max_reviews=max_reviews, max_workers=max_workers)
+
+    assert parallel == serial
+    assert len(serial[KN_URL]) == min(max_reviews, FIXTURE_REVIEWS)
+    assert (scrape_dir / "parallel.json").read_text() == (scrape_dir / "serial.json").read_text()
+
+
+def test_streamed_scrape_matches_list_scrape(scrape_dir):
+    listed = scrape_parallel(scrape_dir / "listed.json", max_workers=2)
+    streamed = scrape_parallel(scrape_dir / "streamed.json", max_workers=2, stream=True)
+
+    assert streamed == listed
+    assert json.loads((scrape_dir / "streamed.json").read_text()) == listed
+    # only the finished JSON stays in the data folder
+    assert not (scrape_dir / "streamed.jsonl").exists()
+    assert not (scrape_dir / "streamed.checkpoint").exists()
+
+
+def test_fixture_reviews_are_parsed(scrape_dir):
+    reviews = scrape_serial(scrape_dir / "serial.json")[KN_URL]
+
+    assert [review["review_id"] for review in reviews] == [f"fixture-ag_{i}" for i in range(1, FIXTURE_REVIEWS + 1)]
+    assert reviews[0]["title"] == "Gutes Team, wenig Aufstieg"
+    assert reviews[0]["overall_score"] == 3.0
+    assert (reviews[0]["year"], reviews[0]["month"]) == (2026, 9)
+    assert reviews[0]["employee_type"] == "Angestellte/r oder Arbeiter/in"
+    assert {"Arbeitsatmosphäre": "Kollegiales Miteinander, man hilft sich gegenseitig."} in reviews[0]["subcategories"]
+
+
+def test_parallel_scrape_rejects_a_rate_of_zero(scrape_dir):
+    with pytest.raises(ValueError, match="requests_per_second"):
+        get_all_reviews_parallel(KN_URL, save_path=str(scrape_dir / "zero.json"), fetcher=LocalHtmlFetcher(FIXTURES_DIR),
+                                 requests_per_second=0)
+
+
+def test_page_url_keeps_the_query_string():
+    assert build_page_url(KN_URL + "/", 1) == KN_URL
+    assert build_page_url(KN_URL, 3) == KN_URL + "/3"
+    assert build_page_url(KN_URL + "?sort=newest", 3) == KN_URL + "/3?sort=newest"
+    assert find_page_number(KN_URL + "/3?sort=newest") == 3
+
+
+class RecordingFetcher:
+    # stands in for Selenium, which must not be started for the end of the pagination
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        return None
+
+    def close(self):
+        pass
+
+
+def scrape_with_fallback(save_path, fixtures_dir):
+    browser = RecordingFetcher()
+    fetcher = FallbackPageFetcher(LocalHtmlFetcher(fixtures_dir), browser, kununu_scraper.page_has_reviews)
+    result = get_all_reviews_parallel(KN_URL + "?sort=newest", save_path=str(save_path), fetcher=fetcher,
+                                      requests_per_second=1000, max_workers=4, max_reviews=100)
+    return result, browser
+
+
+def test_missing_pages_past_the_end_do_not_start_the_browser(scrape_dir):
+    # pages 2-5 are requested together, 4 and 5 do not exist
+    result, browser = scrape_with_fallback(scrape_dir / "reviews.json", FIXTURES_DIR)
+
+    assert len(next(iter(result.values()))) == FIXTURE_REVIEWS
+    assert browser.urls == []
+
+
+def test_empty_pages_past_the_end_do_not_start_the_browser(scrape_dir):
+    fixtures_dir = scrape_dir / "pages"
+    fixtures_dir.mkdir()
+    for name in os.listdir(FIXTURES_DIR):
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            (fixtures_dir / name).write_text(f.read(), encoding="utf-8")
+    (fixtures_dir / "page_4.html").write_text(EMPTY_PAGE_HTML, encoding="utf-8")
+    (fixtures_dir / "page_5.html").write_text(EMPTY_PAGE_HTML, encoding="utf-8")
+
+    result, browser = scrape_with_fallback(scrape_dir / "reviews.json", str(fixtures_dir))
+
+    assert len(next(iter(result.values()))) == FIXTURE_REVIEWS
+    assert browser.urls == []
+
+
+def test_page_without_reviews_before_any_complete_page_uses_the_browser(scrape_dir):
+    fixtures_dir = scrape_dir / "pages"
+    fixtures_dir.mkdir()
+    (fixtures_dir / "page_1.html").write_text(EMPTY_PAGE_HTML, encoding="utf-8")
+
+    result, browser = scrape_with_fallback(scrape_dir / "reviews.json", str(fixtures_dir))
+
+    assert browser.urls == [KN_URL + "?sort=newest"]
+    assert next(iter(result.values())) == []
+
+
+def test_scrape_stage_uses_the_parser_backend_of_the_job(scrape_dir, monkeypatch):
+    from batch_pipeline import create_stage_handlers
+    from job_queue import JobQueue
+
+    get_parser = kununu_scraper.get_parser
+    backends = []
+
+    def recording_get_parser(backend):
+        backends.append(backend)
+        return get_parser(backend)
+
+    monkeypatch.setattr(kununu_scraper, "get_parser", recording_get_parser)
+    handlers = create_stage_handlers(None, fetcher=LocalHtmlFetcher(FIXTURES_DIR), parser_backend="lxml")
+    payload = {"kn_url": KN_URL, "save_path": str(scrape_dir / "reviews.json"), "max_reviews": 100,
+               "page_workers": 2, "parser_backend": "html.parser"}
+
+    result = handlers["scrape"]({"payload": payload}, JobQueue(str(scrape_dir / "jobs.sqlite")))
+
+    assert result["review_count"] == FIXTURE_REVIEWS
+    assert backends == ["html.parser"]
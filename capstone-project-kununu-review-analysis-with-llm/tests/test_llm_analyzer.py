@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import llm_analyzer
+from fake_model import FakeGenerativeModel
+from llm_analyzer import AnalyzerSession, create_generative_model, process_individual_prompts
+from response_schema import PROMPT_CATEGORIES
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS_DIR = os.path.join(PROJECT_DIR, "prompts")
+PROMPT_NUMBER = 1
+CATEGORY = PROMPT_CATEGORIES[PROMPT_NUMBER]
+REPAIR_MARKER = "CUSTOM REPAIR PROMPT"
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    # responses are saved to ./responses, and the prompts in ./prompts must not be the ones used
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def get_client_key(model):
+    return model._client._transport._credentials.token
+
+
+def test_every_api_key_gets_its_own_client():
+    first = create_generative_model("key-a", "gemini-test")
+    second = create_generative_model("key-b", "gemini-test")
+
+    assert first._client is not second._client
+    assert get_client_key(first) == "key-a"
+    assert get_client_key(second) == "key-b"
+    assert first.model_name.endswith("gemini-test")
+
+
+def test_unsupported_sdk_fails_instead_of_using_the_global_key(monkeypatch):
+    monkeypatch.delattr(llm_analyzer.genai_client, "_ClientManager")
+
+    with pytest.raises(RuntimeError, match="client per API key"):
+        create_generative_model("key-a")
+
+
+def test_repair_prompt_is_read_from_the_session_prompts_dir(work_dir):
+    prompts_dir = work_dir / "custom_prompts"
+    prompts_dir.mkdir()
+    shutil.copy(os.path.join(PROMPTS_DIR, f"prompt_{PROMPT_NUMBER}.txt"), prompts_dir)
+    (prompts_dir / "repair_response.txt").write_text(REPAIR_MARKER, encoding="utf-8")
+    repaired = {CATEGORY: {"positive_points": [{"point": "Gute Kollegen", "count": 1,
+                                                "references": [{"review_id": "r_1"}]}],
+                           "critical_points": []}}
+
+    def response_fn(prompt):
+        if prompt.startswith(REPAIR_MARKER):
+            return json.dumps(repaired)
+        return "this is not JSON " * 50
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn)
+    session = AnalyzerSession(model=model, prompts_dir=str(prompts_dir))
+    input_data = {"https://www.kununu.com/de/test/kommentare": [{"review_id": "r_1", "title": "Gut"}]}
+
+    result = process_individual_prompts(input_data, PROMPT_NUMBER, "analyzertest", "x", None, session=session,
+                                        prefilter=False)
+
+    assert result == {"response": repaired}
+    assert model.calls == 2
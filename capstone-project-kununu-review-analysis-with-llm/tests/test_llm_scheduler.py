@@ -0,0 +1,203 @@
+import glob
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import rate_limiting
+import retry_policy
+from fake_model import FakeGenerativeModel, build_fake_response_text
+from llm_analyzer import AnalyzerSession, generate_response_text, process_prompts_and_generate_responses
+from llm_scheduler import LLMRateLimiter, run_prompts_concurrently
+from retry_policy import CircuitBreaker, RetryPolicy
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS_DIR = os.path.join(PROJECT_DIR, "prompts")
+
+
+@pytest.fixture
+def input_data():
+    data_file = sorted(glob.glob(os.path.join(PROJECT_DIR, "data", "*.json")))[0]
+    with open(data_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    url = next(iter(data))
+    return {url: data[url][:20]}
+
+
+@pytest.fixture
+def work_dir(tmp_path, monkeypatch):
+    # responses are saved to ./responses
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+class FakeClock:
+    # replaces the time module of the limiters, sleeping only moves the clock forward
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiting, "time", clock)
+    monkeypatch.setattr(retry_policy, "time", clock)
+    return clock
+
+
+class ApiError(Exception):
+    # like the google.api_core errors, which carry the HTTP status as code
+    def __init__(self, code, message="", retry_after=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+
+class ConcurrencyCounter:
+    def __init__(self, latency):
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.latency)
+            return build_fake_response_text(prompt)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def analyze(input_data, model, max_workers, rate_limiter=None):
+    session = AnalyzerSession(model=model, prompts_dir=PROMPTS_DIR)
+    return process_prompts_and_generate_responses(
+        input_data, "schedtest", "x", None, max_workers=max_workers, requests_per_minute=0, tokens_per_minute=0,
+        batch_token_budget=1500, prefilter=False, session=session, prompt_numbers=[1, 2, 3, 4],
+        rate_limiter=rate_limiter,
+    )
+
+
+def test_batches_share_the_request_cap_of_the_prompts(work_dir, input_data):
+    counter = ConcurrencyCounter(latency=0.05)
+    model = FakeGenerativeModel(latency=0, response_fn=counter)
+
+    results = analyze(input_data, model, max_workers=2)
+
+    assert all(isinstance(result, dict) for result in results.values())
+    # 4 prompts with several batches each, without the shared cap up to 2 * 2 requests run at once
+    assert model.calls > 4
+    assert counter.peak == 2
+
+
+def test_shared_limiter_gets_the_cap_of_the_analysis(work_dir, input_data):
+    counter = ConcurrencyCounter(latency=0.05)
+    model = FakeGenerativeModel(latency=0, response_fn=counter)
+    rate_limiter = LLMRateLimiter(0, 0)
+
+    analyze(input_data, model, max_workers=3, rate_limiter=rate_limiter)
+
+    assert counter.peak <= 3
+    # the limiter passed in stays uncapped for the other analyses sharing it
+    assert rate_limiter._slots is None
+
+
+def test_requests_per_minute_window(clock):
+    rate_limiter = LLMRateLimiter(requests_per_minute=3, tokens_per_minute=0)
+    started = []
+    for _ in range(7):
+        rate_limiter.acquire(100)
+        started.append(clock.now)
+
+    # three requests per window of 60 s, the window slides from the first request in it
+    assert started == [0, 0, 0, 60, 60, 60, 120]
+
+
+def test_tokens_per_minute_window(clock):
+    rate_limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=1000)
+    started = []
+    for tokens in (600, 300, 200, 5000):
+        rate_limiter.acquire(tokens)
+        started.append(clock.now)
+
+    # 600 + 300 fit, 200 more waits for the first 600 to leave the window, a request larger than the whole budget
+    # waits until the window is empty instead of forever
+    assert started == [0, 0, 60, 120]
+
+
+def test_prompt_workers_are_limited():
+    counter = ConcurrencyCounter(latency=0.02)
+
+    def process(prompt_number):
+        if prompt_number == 3:
+            raise RuntimeError("broken prompt")
+        return counter("prompt")
+
+    results = dict(run_prompts_concurrently(process, range(1, 9), max_workers=3))
+
+    assert sorted(results) == list(range(1, 9))
+    assert results[3] is None
+    assert counter.peak == 3
+
+
+def test_retries_back_off_in_order(clock):
+    errors = [ApiError(503, "unavailable"), ApiError(500, "internal"), ApiError(503, "unavailable")]
+
+    def response_fn(prompt):
+        if errors:
+            raise errors.pop(0)
+        return build_fake_response_text(prompt)
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn)
+    policy = RetryPolicy(max_attempts=5, base_delay=1.0, jitter=0)
+
+    text = generate_response_text(model, "prompt", "1", rate_limiter=LLMRateLimiter(0, 0), min_response_chars=0,
+                                  retry_policy=policy)
+
+    assert text is not None
+    assert model.calls == 4
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+
+
+def test_fatal_errors_are_not_retried(clock):
+    def response_fn(prompt):
+        raise ApiError(400, "bad request")
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn)
+
+    text = generate_response_text(model, "prompt", "1", min_response_chars=0,
+                                  retry_policy=RetryPolicy(base_delay=1.0, jitter=0))
+
+    assert text is None
+    assert model.calls == 1
+    assert clock.sleeps == []
+
+
+def test_quota_error_pauses_before_the_next_request(clock):
+    calls = []
+
+    def response_fn(prompt):
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise ApiError(429, "quota", retry_after=30)
+        return build_fake_response_text(prompt)
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn)
+    policy = RetryPolicy(base_delay=0, circuit_breaker=CircuitBreaker(max_pause=600))
+
+    assert generate_response_text(model, "prompt", "1", min_response_chars=0, retry_policy=policy) is not None
+    # the retry waits for the pause named by the API, not for the exponential backoff
+    assert calls[0] == 0 and calls[1] >= 30
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from fake_model import FakeGenerativeModel, build_fake_response_text
+from llm_analyzer import AnalyzerSession, parse_response_text, process_individual_prompts
+from response_schema import (
+    PROMPT_CATEGORIES,
+    get_generation_config,
+    load_json_fragment,
+    repair_category_response,
+    validate_category_response,
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS_DIR = os.path.join(PROJECT_DIR, "prompts")
+CATEGORY = PROMPT_CATEGORIES[1]
+VALID_POINT = {"point": "Gute Kollegen", "count": 1, "references": [{"review_id": "a_1"}]}
+
+
+class ConfigRecordingModel(FakeGenerativeModel):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.generation_configs = []
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.generation_configs.append(kwargs.get("generation_config"))
+        return super().generate_content(prompt, stream, **kwargs)
+
+
+@pytest.mark.parametrize("prompt_number", sorted(PROMPT_CATEGORIES))
+def test_generation_config_constrains_the_category(prompt_number):
+    config = get_generation_config(prompt_number)
+    category = PROMPT_CATEGORIES[prompt_number]
+    category_schema = config["response_schema"]["properties"][category]
+
+    assert config["response_mime_type"] == "application/json"
+    assert config["response_schema"]["required"] == [category]
+    assert category_schema["required"] == ["positive_points", "critical_points"]
+    assert category_schema["properties"]["positive_points"]["items"]["required"] == ["point", "count", "references"]
+
+
+def test_prompts_without_a_category_get_no_config():
+    assert get_generation_config(99) is None
+
+
+def test_analysis_sends_the_schema_of_its_prompt(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = ConfigRecordingModel(latency=0, response_fn=lambda prompt: build_fake_response_text(prompt) + " " * 500)
+    session = AnalyzerSession(model=model, prompts_dir=PROMPTS_DIR)
+    input_data = {"https://www.kununu.com/de/test/kommentare": [{"review_id": "a_1", "title": "Gut"}]}
+
+    result = process_individual_prompts(input_data, 1, "schematest", "x", None, session=session, prefilter=False)
+
+    assert result is not None
+    assert model.generation_configs == [get_generation_config(1)]
+
+
+@pytest.mark.parametrize("text", [
+    # trailing commas and unquoted review ids copied from the prompt examples
+    '{"%s": {"positive_points": [{"point": "Gute Kollegen", "count": 1, "references": [{"review_id": a_1,},],},],'
+    ' "critical_points": [],}}' % CATEGORY,
+    # cut off in the middle of the second point
+    '{"%s": {"positive_points": [{"point": "Gute Kollegen", "count": 1, "references": [{"review_id": "a_1"}]},'
+    ' {"point": "Offene' % CATEGORY,
+])
+def test_malformed_json_is_repaired_locally(text):
+    parsed = load_json_fragment(text)
+
+    assert parsed[CATEGORY]["positive_points"] == [VALID_POINT]
+
+
+def test_text_without_a_complete_point_is_left_to_the_model():
+    assert load_json_fragment('{"%s": {"positive_points": [{"point": "Gute' % CATEGORY) is None
+    assert load_json_fragment("Leider kann ich das nicht beantworten.") is None
+
+
+def test_schema_errors_are_repaired():
+    response = {CATEGORY: {
+        "positive_points": [
+            {"point": "Gute Kollegen", "count": "1", "references": ["a_1"]},
+            {"point": "", "count": 2, "references": []},
+        ],
+        "critical_points": {"point": "Zeitdruck"},
+    }}
+    assert validate_category_response(response, CATEGORY)
+
+    repaired = repair_category_response(response, CATEGORY)
+
+    assert validate_category_response(repaired, CATEGORY) == []
+    assert repaired == {CATEGORY: {"positive_points": [VALID_POINT], "critical_points": []}}
+
+
+def test_category_object_without_its_name_is_wrapped():
+    repaired = repair_category_response({"positive_points": [VALID_POINT], "critical_points": []}, CATEGORY)
+
+    assert repaired == {CATEGORY: {"positive_points": [VALID_POINT], "critical_points": []}}
+
+
+def test_parse_repairs_a_fenced_malformed_response():
+    text = "```json\n" + json.dumps({CATEGORY: {"positive_points": [dict(VALID_POINT, count=0)]}}) + "\n```"
+
+    assert parse_response_text(text, "1", CATEGORY) == {CATEGORY: {"positive_points": [VALID_POINT],
+                                                                    "critical_points": []}}
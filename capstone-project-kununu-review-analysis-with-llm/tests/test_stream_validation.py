@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from fake_model import FakeGenerativeModel
+from llm_analyzer import generate_response_text
+from retry_policy import RetryPolicy
+from stream_validation import InvalidStreamError, StreamingJsonValidator
+
+VALID_RESPONSE = json.dumps({
+    "arbeitsatmosphaere": {
+        "positive_points": [
+            {"point": "Gute Kollegen", "count": 2, "references": [{"review_id": "a_1"}, {"review_id": "a_2"}]},
+            {"point": "Offene Tür", "count": 1, "references": [{"review_id": "a_3"}]},
+        ],
+        "critical_points": [
+            {"point": "Zeitdruck", "count": 1, "references": [{"review_id": "a_4"}]},
+        ],
+    }
+}, ensure_ascii=False, indent=2)
+FILLER = " Die Kollegen sind sehr nett und hilfsbereit." * 40
+
+
+def feed_in_chunks(validator, text, chunk_chars=7):
+    for i in range(0, len(text), chunk_chars):
+        validator.feed(text[i:i + chunk_chars])
+
+
+class StreamRecorder:
+    # the longest text seen by the stream callback, i.e. how far a stream was read before it was aborted
+    def __init__(self):
+        self.longest = 0
+
+    def __call__(self, label, validator):
+        if validator is not None:
+            self.longest = max(self.longest, len(validator.text))
+
+
+def test_valid_stream_is_complete():
+    validator = StreamingJsonValidator()
+    feed_in_chunks(validator, "```json\n" + VALID_RESPONSE + "\n```")
+    validator.finish()
+
+    assert validator.complete
+    assert validator.points == 3
+
+
+@pytest.mark.parametrize("text, message", [
+    ("Gerne, hier ist meine Analyse der Bewertungen:" + FILLER, "does not start with a JSON object"),
+    ("Hier ist die Analyse: {\"arbeitsatmosphaere\": {}}" + FILLER, "Unexpected text before the JSON object"),
+    ('{"arbeitsatmosphaere": {"summary": "' + FILLER + '"}}', "Unexpected key 'summary'"),
+    ('{"arbeitsatmosphaere": {"positive_points": {"point": "' + FILLER + '"}}}', "Point list is not a list"),
+    ('{"arbeitsatmosphaere": ["' + FILLER + '"]}', "Category is not an object"),
+])
+def test_invalid_stream_is_detected_before_its_end(text, message):
+    validator = StreamingJsonValidator()
+
+    with pytest.raises(InvalidStreamError, match=message):
+        feed_in_chunks(validator, text)
+    assert len(validator.text) < len(text) / 2
+
+
+def test_truncated_stream_fails_at_the_end():
+    validator = StreamingJsonValidator()
+    feed_in_chunks(validator, VALID_RESPONSE[:len(VALID_RESPONSE) // 2])
+
+    with pytest.raises(InvalidStreamError, match="ended inside the JSON"):
+        validator.finish()
+
+
+def stream_with_first_response(first_response):
+    responses = [first_response, VALID_RESPONSE]
+
+    def response_fn(prompt):
+        return responses.pop(0)
+
+    model = FakeGenerativeModel(latency=0, response_fn=response_fn, stream_chunk_chars=20)
+    recorder = StreamRecorder()
+    text = generate_response_text(model, "prompt", "1", min_response_chars=0, stream=True, stream_callback=recorder,
+                                  retry_policy=RetryPolicy(base_delay=0))
+    return text, model, recorder
+
+
+def test_invalid_stream_is_aborted_early_and_retried():
+    invalid_response = "Gerne, hier ist meine Analyse der Bewertungen:" + FILLER
+
+    text, model, recorder = stream_with_first_response(invalid_response)
+
+    assert text == VALID_RESPONSE
+    assert model.calls == 2
+    # the first response was dropped after a few chunks, the retried one was read to its end
+    assert recorder.longest == len(VALID_RESPONSE)
+    assert len(VALID_RESPONSE) < len(invalid_response)
+
+
+def test_truncated_stream_is_retried():
+    text, model, _ = stream_with_first_response(VALID_RESPONSE[:len(VALID_RESPONSE) // 2])
+
+    assert text == VALID_RESPONSE
+    assert model.calls == 2